@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import BalanceSheet, FinancialData, PDFChunk
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import BalanceSheet, FinancialData, PDFChunk, EmbeddingCacheEntry, IngestionJob, BackfillCheckpoint, StagedChunkEmbedding
+from .fulltext import fulltext_index
 
 
 @admin.register(BalanceSheet)
@@ -17,6 +20,43 @@ class FinancialDataAdmin(admin.ModelAdmin):
 
 @admin.register(PDFChunk)
 class PDFChunkAdmin(admin.ModelAdmin):
-    list_display = ['balance_sheet', 'section_type', 'page_range', 'period', 'confidence', 'created_at']
-    list_filter = ['section_type', 'balance_sheet__company']
+    list_display = ['balance_sheet', 'section_type', 'page_range', 'period', 'confidence', 'embedding_model', 'created_at']
+    list_filter = ['section_type', 'embedding_model', 'balance_sheet__company']
     search_fields = ['content', 'balance_sheet__company__name']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Match content through the FTS5 index rather than a LIKE scan of every chunk
+        matching_ids = fulltext_index.matching_ids_sql(search_term)
+        if matching_ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        queryset = queryset.filter(
+            Q(pk__in=RawSQL(*matching_ids)) | Q(balance_sheet__company__name__icontains=search_term.strip())
+        )
+        return queryset, False
+
+
+@admin.register(EmbeddingCacheEntry)
+class EmbeddingCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['content_hash', 'model', 'hit_count', 'created_at', 'last_used_at']
+    list_filter = ['model']
+    search_fields = ['content_hash']
+
+
+@admin.register(IngestionJob)
+class IngestionJobAdmin(admin.ModelAdmin):
+    list_display = ['balance_sheet', 'kind', 'status', 'attempts', 'worker', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status']
+    search_fields = ['balance_sheet__company__name']
+
+
+@admin.register(BackfillCheckpoint)
+class BackfillCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['name', 'last_pk', 'processed', 'failed', 'updated_at']
+    search_fields = ['name']
+
+
+@admin.register(StagedChunkEmbedding)
+class StagedChunkEmbeddingAdmin(admin.ModelAdmin):
+    list_display = ['chunk', 'model', 'embedding_dim', 'created_at']
+    list_filter = ['model']
+    list_select_related = ['chunk__balance_sheet__company']
@@ -0,0 +1,257 @@
+"""Columnar financial analytics: ratios, growth and CAGR for many periods at once with NumPy."""
+from collections import namedtuple
+from collections.abc import Mapping
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FINANCIAL_FIELDS = (
+    'total_assets', 'current_assets', 'non_current_assets',
+    'total_liabilities', 'current_liabilities', 'non_current_liabilities',
+    'total_equity', 'revenue', 'sales',
+    'operating_cash_flow', 'investing_cash_flow', 'financing_cash_flow', 'net_cash_flow',
+    'current_ratio', 'debt_to_equity', 'roe',
+)
+
+GROWTH_FIELDS = {'assets': 'total_assets', 'revenue': 'revenue', 'equity': 'total_equity'}
+
+# Stand-in for a BalanceSheet when a period is not a single sheet (e.g. consolidated rows).
+Period = namedtuple('Period', ['id', 'year', 'quarter'])
+
+
+def _field_value(record, name):
+    if record is None:
+        return None
+    if isinstance(record, Mapping):
+        return record.get(name)
+    return getattr(record, name, None)
+
+
+def _to_list(values: np.ndarray) -> list:
+    """Array to Python floats, with NaN (a missing value) as None."""
+    return [None if value != value else value for value in values.tolist()]
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray, where: np.ndarray) -> np.ndarray:
+    result = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=result, where=where)
+    return result
+
+
+def ratio_status(ratios: np.ndarray, ratio_type: str) -> List[str]:
+    """Status label for every ratio in an array; NaN ratios are 'unknown'."""
+    known = ~np.isnan(ratios)
+    if ratio_type == 'current':
+        conditions = [known & (ratios >= 1.5), known & (ratios >= 1.0), known]
+        choices = ['good', 'attention', 'bad']
+    elif ratio_type == 'debt':
+        conditions = [known & (ratios <= 0.5), known & (ratios <= 1.0), known]
+        choices = ['good', 'moderate', 'high']
+    else:
+        return ['unknown'] * len(ratios)
+    return np.select(conditions, choices, default='unknown').tolist()
+
+
+class FinancialFrame:
+    """
+    FinancialData for N periods as float64 columns.
+
+    Missing values load as 0 and `present` flags the truthy ones, which is
+    exactly the `float(x or 0)` / `if x` / `> 0` guarding of the per-row
+    code this replaces. Rows may hold several series (e.g. one per company)
+    labelled by `groups`; rows must be ordered by series, then period, and
+    growth and CAGR never cross a series boundary.
+    """
+
+    def __init__(self, values: Dict[str, np.ndarray], groups: Optional[Sequence[Hashable]] = None):
+        self.values = values
+        self.size = len(next(iter(values.values()))) if values else 0
+        self.present = {name: column != 0 for name, column in values.items()}
+
+        labels = list(groups) if groups is not None else [None] * self.size
+        self.starts = np.ones(self.size, dtype=bool)
+        if self.size > 1:
+            self.starts[1:] = [current != previous for previous, current in zip(labels, labels[1:])]
+        self.group_labels = [label for label, start in zip(labels, self.starts) if start]
+
+        # Effective revenue falls back to sales, as in `fd.revenue or fd.sales or 0`.
+        self.values['revenue'] = np.where(self.present['revenue'], values['revenue'], values['sales'])
+        self.present['revenue'] = self.values['revenue'] != 0
+
+    @classmethod
+    def from_records(cls, records: Iterable, groups: Optional[Sequence[Hashable]] = None) -> 'FinancialFrame':
+        """Build a frame from FinancialData instances or dicts with the same keys."""
+        records = list(records)
+        values = {
+            name: np.fromiter(
+                (float(_field_value(record, name) or 0) for record in records),
+                dtype=np.float64, count=len(records)
+            )
+            for name in FINANCIAL_FIELDS
+        }
+        return cls(values, groups)
+
+    def __len__(self):
+        return self.size
+
+    def ratios(self) -> Dict[str, np.ndarray]:
+        """Derived ratios per row; NaN where the original code returned None."""
+        values = self.values
+        current_assets, current_liab = values['current_assets'], values['current_liabilities']
+        total_assets, total_equity = values['total_assets'], values['total_equity']
+
+        return {
+            'current_ratio': _safe_divide(current_assets, current_liab, current_liab > 0),
+            'debt_to_equity': _safe_divide(values['total_liabilities'], total_equity, total_equity > 0),
+            'working_capital': current_assets - current_liab,
+            'asset_turnover': _safe_divide(values['revenue'], total_assets, total_assets > 0),
+        }
+
+    def reported_ratio(self, computed: np.ndarray, stored_field: str) -> np.ndarray:
+        """
+        The ratio shown for each row: only when the stored ratio is set, and
+        then the computed value unless it is missing or zero.
+        """
+        computed_truthy = ~np.isnan(computed) & (computed != 0)
+        chosen = np.where(computed_truthy, computed, self.values[stored_field])
+        return np.where(self.present[stored_field], chosen, np.nan)
+
+    def stored_ratio(self, stored_field: str) -> np.ndarray:
+        return np.where(self.present[stored_field], self.values[stored_field], np.nan)
+
+    def growth(self, field: str) -> np.ndarray:
+        """Percentage change from the previous row of the same series; NaN if the previous value is not > 0."""
+        column = self.values[field]
+        result = np.full(self.size, np.nan)
+        if self.size < 2:
+            return result
+
+        previous = column[:-1]
+        valid = ~self.starts[1:] & (previous > 0)
+        result[1:] = _safe_divide(column[1:] - previous, previous, valid) * 100
+        return result
+
+    def group_bounds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Index of the first and last row of every series."""
+        first = np.flatnonzero(self.starts)
+        last = np.append(first[1:] - 1, self.size - 1) if len(first) else first
+        return first, last
+
+    def cagr(self, field: str) -> np.ndarray:
+        """Compound growth rate from the first to the last row of every series; NaN if undefined."""
+        first, last = self.group_bounds()
+        column = self.values[field]
+        periods = (last - first).astype(np.float64)
+        start, end = column[first], column[last]
+
+        result = np.full(len(first), np.nan)
+        valid = (periods > 0) & (start > 0)
+        with np.errstate(invalid='ignore'):
+            result[valid] = ((end[valid] / start[valid]) ** (1 / periods[valid]) - 1) * 100
+        return result
+
+
+def _period_label(balance_sheet) -> str:
+    return f"{balance_sheet.year}{' Q' + balance_sheet.quarter if balance_sheet.quarter else ''}"
+
+
+def analyze_series(series: Mapping) -> Dict[Hashable, Tuple[List[Dict], Dict]]:
+    """
+    Compute period analytics and KPIs for several series in one pass.
+
+    `series` maps a key (e.g. company id) to an ordered list of
+    (balance_sheet, financial_data) pairs. Returns key -> (analytics, kpis),
+    where the shapes match what `analytics_summary` has always returned.
+    """
+    keys, periods, records = [], [], []
+    for key, pairs in series.items():
+        for balance_sheet, financial_data in pairs:
+            keys.append(key)
+            periods.append(balance_sheet)
+            records.append(financial_data)
+
+    results = {key: ([], {}) for key in series}
+    if not records:
+        return results
+
+    frame = FinancialFrame.from_records(records, groups=keys)
+    ratios = frame.ratios()
+    columns = {name: frame.values[name].tolist() for name in FINANCIAL_FIELDS}
+    computed = {name: _to_list(values) for name, values in ratios.items()}
+    current_ratio = _to_list(frame.reported_ratio(ratios['current_ratio'], 'current_ratio'))
+    debt_to_equity = _to_list(frame.reported_ratio(ratios['debt_to_equity'], 'debt_to_equity'))
+    roe = _to_list(frame.stored_ratio('roe'))
+    growth = {label: _to_list(frame.growth(field)) for label, field in GROWTH_FIELDS.items()}
+    current_status = ratio_status(ratios['current_ratio'], 'current')
+    debt_status = ratio_status(ratios['debt_to_equity'], 'debt')
+
+    for row, balance_sheet in enumerate(periods):
+        results[keys[row]][0].append({
+            'id': balance_sheet.id,
+            'year': balance_sheet.year,
+            'quarter': balance_sheet.quarter,
+            'period': _period_label(balance_sheet),
+            'total_assets': columns['total_assets'][row],
+            'current_assets': columns['current_assets'][row],
+            'non_current_assets': columns['non_current_assets'][row],
+            'total_liabilities': columns['total_liabilities'][row],
+            'current_liabilities': columns['current_liabilities'][row],
+            'non_current_liabilities': columns['non_current_liabilities'][row],
+            'total_equity': columns['total_equity'][row],
+            'revenue': columns['revenue'][row],
+            'sales': columns['sales'][row],
+            'operating_cash_flow': columns['operating_cash_flow'][row],
+            'investing_cash_flow': columns['investing_cash_flow'][row],
+            'financing_cash_flow': columns['financing_cash_flow'][row],
+            'net_cash_flow': columns['net_cash_flow'][row],
+            'current_ratio': current_ratio[row],
+            'debt_to_equity': debt_to_equity[row],
+            'roe': roe[row],
+            'working_capital': computed['working_capital'][row],
+            'asset_turnover': computed['asset_turnover'][row],
+            'growth': {label: values[row] for label, values in growth.items() if values[row] is not None},
+            'current_ratio_status': current_status[row],
+            'debt_to_equity_status': debt_status[row],
+        })
+
+    first_rows, _ = frame.group_bounds()
+    assets_cagr = _to_list(frame.cagr('total_assets'))
+    revenue_cagr = _to_list(frame.cagr('revenue'))
+
+    for index, label in enumerate(frame.group_labels):
+        analytics = results[label][0]
+        first_row = first_rows[index]
+        results[label] = (analytics, _kpis(
+            analytics, columns, first_row, assets_cagr[index], revenue_cagr[index]
+        ))
+
+    return results
+
+
+def _kpis(analytics: List[Dict], columns: Dict[str, list], first_row: int,
+          assets_cagr: Optional[float], revenue_cagr: Optional[float]) -> Dict:
+    latest = analytics[-1]
+    kpis = {
+        'total_assets': latest['total_assets'],
+        'revenue': latest['revenue'],
+        'current_ratio': latest['current_ratio'],
+        'debt_to_equity': latest['debt_to_equity'],
+        'working_capital': latest['working_capital'],
+        'roe': latest['roe'],
+        'asset_turnover': latest['asset_turnover'],
+    }
+
+    if len(analytics) > 1:
+        kpis['assets_growth'] = latest['growth'].get('assets')
+        kpis['revenue_growth'] = latest['growth'].get('revenue')
+        if columns['total_assets'][first_row] > 0:
+            kpis['total_assets_cagr'] = assets_cagr
+        if columns['revenue'][first_row] > 0:
+            kpis['revenue_cagr'] = revenue_cagr
+
+    return kpis
+
+
+def analyze_periods(pairs: Sequence) -> Tuple[List[Dict], Dict]:
+    """Analytics and KPIs for one ordered list of (balance_sheet, financial_data) pairs."""
+    return analyze_series({None: pairs})[None]
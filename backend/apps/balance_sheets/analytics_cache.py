@@ -0,0 +1,80 @@
+"""Versioned cache of analytics_summary payloads, invalidated per company."""
+import hashlib
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def normalize_ids(selected_ids: Iterable) -> Tuple[int, ...]:
+    """Sorted, de-duplicated ids; () when any id is invalid, matching the view's 'ignore the filter' rule."""
+    try:
+        return tuple(sorted({int(selected_id) for selected_id in selected_ids}))
+    except (TypeError, ValueError):
+        return ()
+
+
+class AnalyticsCache:
+    """
+    analytics_summary results in a Django cache, keyed by
+    (company, selected ids, company visibility, company version).
+
+    Each company has a version stamp (an increasing Unix timestamp) that
+    signals bump whenever its balance sheets or financial data change;
+    bumping orphans every cached payload for the company.
+    The version doubles as the response's Last-Modified time.
+
+    ANALYTICS_CACHE_ALIAS must name a cache shared by the web and
+    ingestion worker processes, or worker writes will not invalidate.
+    """
+
+    def __init__(self, cache_alias: Optional[str] = None, timeout: Optional[int] = None):
+        self._cache_alias = cache_alias
+        self._timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self._cache_alias or getattr(settings, 'ANALYTICS_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self) -> int:
+        if self._timeout is not None:
+            return self._timeout
+        return getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 3600)
+
+    def _version_key(self, company_id) -> str:
+        return f'analytics-summary-version:{company_id}'
+
+    def version(self, company_id) -> int:
+        key = self._version_key(company_id)
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, int(time.time()), None)
+            version = self.cache.get(key)
+        return version
+
+    def bump(self, company_id) -> None:
+        """Invalidate every cached payload of a company."""
+        key = self._version_key(company_id)
+        previous = self.cache.get(key) or 0
+        # Strictly increasing, so Last-Modified moves even for bumps within one second.
+        self.cache.set(key, max(int(time.time()), previous + 1), None)
+
+    def key(self, company_id, selected_ids, scope) -> Tuple[str, int]:
+        """Cache key for a request and the company version it was built from."""
+        version = self.version(company_id)
+        ids = ','.join(str(selected_id) for selected_id in normalize_ids(selected_ids))
+        # The payload only depends on whether the company is visible, so users share entries
+        visibility = 'allowed' if scope.can_access(company_id) else 'denied'
+        digest = hashlib.sha256(f'{ids}|{visibility}'.encode('utf-8')).hexdigest()
+        return f'analytics-summary:{company_id}:{version}:{digest}', version
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.cache.get(key)
+
+    def set(self, key: str, payload: Dict) -> None:
+        self.cache.set(key, payload, self.timeout)
+
+
+analytics_cache = AnalyticsCache()
@@ -0,0 +1,147 @@
+"""BM25 keyword search over PDF chunks through the ChunkTerm inverted index."""
+import math
+import re
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Avg, Case, Count, FloatField, Sum, Value, When
+from django.db.models.functions import Cast
+
+from .models import ChunkTerm, PDFChunk
+
+# Standard BM25 parameters: term-frequency saturation and document-length normalization
+K1 = 1.2
+B = 0.75
+
+MAX_TERM_LENGTH = 64
+
+_TOKEN = re.compile(r'[a-z0-9]+(?:&[a-z0-9]+)?')
+
+STOPWORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'in', 'is', 'it',
+    'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'were', 'what', 'which', 'with',
+    'how', 'much', 'did', 'does', 'do', 'show', 'me', 'tell', 'give', 'about',
+))
+
+
+def _normalize_term(token: str) -> str:
+    """Fold simple plurals so 'assets' matches 'asset' and 'liabilities' matches 'liability'."""
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Index terms of a text, in order: lowercased words and numbers without stopwords."""
+    return [
+        _normalize_term(token)[:MAX_TERM_LENGTH]
+        for token in _TOKEN.findall((text or '').lower())
+        if token not in STOPWORDS
+    ]
+
+
+def index_chunks(chunks: Iterable[PDFChunk]) -> int:
+    """
+    (Re)build the postings and token_count of saved chunks.
+
+    Returns the number of postings written. Chunks must have a primary key.
+    """
+    chunks = [chunk for chunk in chunks if chunk.pk is not None]
+    if not chunks:
+        return 0
+
+    postings = []
+    for chunk in chunks:
+        term_counts = Counter(tokenize(chunk.content))
+        chunk.token_count = sum(term_counts.values())
+        postings.extend((term, chunk.pk, chunk.balance_sheet_id, tf) for term, tf in term_counts.items())
+
+    # A chunk has a posting per distinct term, so skip model instances and insert plain rows
+    meta = ChunkTerm._meta
+    columns = ', '.join(
+        connection.ops.quote_name(meta.get_field(name).column) for name in ('term', 'chunk', 'balance_sheet', 'tf')
+    )
+    insert = f'INSERT INTO {connection.ops.quote_name(meta.db_table)} ({columns}) VALUES (%s, %s, %s, %s)'
+
+    with transaction.atomic():
+        ChunkTerm.objects.filter(chunk_id__in=[chunk.pk for chunk in chunks]).delete()
+        with connection.cursor() as cursor:
+            cursor.executemany(insert, postings)
+        PDFChunk.objects.bulk_update(chunks, ['token_count'], batch_size=500)
+
+    return len(postings)
+
+
+class BM25Index:
+    """
+    Ranks a set of balance sheets' chunks for a query with BM25.
+
+    Corpus statistics (chunk count, average length, document frequencies)
+    are taken over the searched balance sheets, and scoring is one
+    aggregate query over the postings of the query terms, so the cost
+    depends on how often the query terms occur, not on corpus size.
+    """
+
+    def __init__(self, k1: float = K1, b: float = B):
+        self.k1 = k1
+        self.b = b
+
+    def search(self, query: str, balance_sheet_ids: List[int], top_k: int = 8) -> Optional[List[Tuple[int, float]]]:
+        """
+        Up to top_k (chunk_id, score) pairs, best first.
+
+        Returns None when the balance sheets' chunks have not been indexed
+        yet (see `build_bm25_index`), so callers can fall back to a scan.
+        """
+        terms = sorted(set(tokenize(query)))
+        if not balance_sheet_ids:
+            return []
+
+        stats = PDFChunk.objects.filter(balance_sheet_id__in=balance_sheet_ids).aggregate(
+            chunk_count=Count('id'), total_tokens=Sum('token_count'), average_length=Avg('token_count')
+        )
+        chunk_count = stats['chunk_count']
+        if not chunk_count:
+            return []
+        if not stats['total_tokens']:
+            return None
+        if not terms:
+            return []
+
+        document_frequencies = dict(
+            ChunkTerm.objects.filter(term__in=terms, balance_sheet_id__in=balance_sheet_ids)
+            .order_by().values('term').annotate(df=Count('id')).values_list('term', 'df')
+        )
+        if not document_frequencies:
+            return []
+
+        idf = Case(
+            *[When(term=term, then=Value(self._idf(df, chunk_count))) for term, df in document_frequencies.items()],
+            output_field=FloatField(),
+        )
+        tf = Cast('tf', FloatField())
+        length_ratio = Cast('chunk__token_count', FloatField()) / Value(float(stats['average_length']))
+        score = idf * tf * Value(self.k1 + 1) / (
+            tf + Value(self.k1) * (Value(1 - self.b) + Value(self.b) * length_ratio)
+        )
+
+        rows = (
+            ChunkTerm.objects.filter(term__in=list(document_frequencies), balance_sheet_id__in=balance_sheet_ids)
+            .order_by()
+            .values('chunk_id')
+            .annotate(score=Sum(score, output_field=FloatField()))
+            .order_by('-score', 'chunk_id')
+            .values_list('chunk_id', 'score')[:top_k]
+        )
+        return list(rows)
+
+    @staticmethod
+    def _idf(document_frequency: int, chunk_count: int) -> float:
+        # Lucene's idf variant, which stays positive for terms found in most chunks
+        return math.log(1 + (chunk_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+bm25_index = BM25Index()
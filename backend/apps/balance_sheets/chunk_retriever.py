@@ -1,14 +1,30 @@
-import json
-from typing import List, Set, Tuple
+from typing import List, Optional, Set, Tuple
+from asgiref.sync import sync_to_async
 from .models import PDFChunk
-from .embedding_service import EmbeddingService, cosine_similarity
+from .embedding_service import EmbeddingService
+from .query_cache import query_embedding_cache
+from .bm25 import bm25_index
+from .fulltext import fulltext_index
+from .vector_index import vector_index
 
 
 class ChunkRetriever:
     """Smart chunk retrieval using RAG with vector similarity search."""
     
+    # Raw-similarity candidates pulled from the index before title/section boosts re-rank them
+    # (also the BM25 hits taken into fusion)
+    VECTOR_CANDIDATES = 32
+    # Chunks returned as context
+    TOP_K = 8
+    # Reciprocal-rank fusion constant: score = sum of 1 / (RRF_K + rank) over the rankings
+    RRF_K = 60
+    
     def __init__(self):
         self.embedding_service = EmbeddingService()
+        self.vector_index = vector_index
+        self.bm25_index = bm25_index
+        self.fulltext_index = fulltext_index
+        self.query_cache = query_embedding_cache
     
     SECTION_KEYWORDS = {
         'BALANCE_SHEET': [
@@ -35,89 +51,165 @@ class ChunkRetriever:
     }
     
     def get_relevant_chunks(self, query: str, balance_sheets: List, use_vector_search: bool = True) -> List[PDFChunk]:
-        """Retrieve relevant chunks using RAG with vector similarity search."""
-        all_chunks = self._get_chunks_for_query(query, balance_sheets)
+        """
+        Retrieve relevant chunks with hybrid search: vector similarity and
+        keyword rankings (FTS5 on SQLite, else BM25 postings) fused by
+        reciprocal rank.
+        """
+        balance_sheet_ids = [getattr(bs, 'pk', bs) for bs in balance_sheets]
         
-        if not all_chunks:
+        if not balance_sheet_ids:
             return []
         
-        # Try vector-based retrieval first
+        vector_chunks = []
         if use_vector_search and self.embedding_service.client:
             try:
-                query_embedding = self.embedding_service.create_embedding(query)
+                query_embedding = self.query_cache.get_or_create(
+                    query, self.embedding_service.model, self.embedding_service.create_embedding
+                )
                 
-                if query_embedding:
-                    top_chunks = self._vector_similarity_search(query_embedding, all_chunks, query)
-                    if top_chunks:
-                        return top_chunks
+                if query_embedding is not None:
+                    vector_chunks = self._vector_similarity_search(query_embedding, balance_sheet_ids, query)
             except Exception:
                 pass
         
-        # Fallback to keyword-based search
-        return self._keyword_search(query, all_chunks)
+        keyword_ids = self.keyword_chunk_ids(query, balance_sheet_ids)
+        
+        if keyword_ids is None:
+            # No FTS5 table and chunks not in the BM25 postings yet (run build_bm25_index): scan them instead
+            if vector_chunks:
+                return vector_chunks[:self.TOP_K]
+            all_chunks = self._get_chunks_for_query(query, balance_sheet_ids)
+            return self._keyword_search(query, all_chunks)
+        
+        chunks_by_id = {chunk.pk: chunk for chunk in vector_chunks}
+        fused_ids = self._fuse_rankings([chunk.pk for chunk in vector_chunks], keyword_ids)
+        missing_ids = [chunk_id for chunk_id in fused_ids if chunk_id not in chunks_by_id]
+        if missing_ids:
+            chunks_by_id.update(PDFChunk.objects.defer('embedding', 'vector').in_bulk(missing_ids))
+        return [chunks_by_id[chunk_id] for chunk_id in fused_ids if chunk_id in chunks_by_id]
     
-    def _get_chunks_for_query(self, query: str, balance_sheets: List) -> List[PDFChunk]:
+    async def aget_relevant_chunks(self, query: str, balance_sheets: List, use_vector_search: bool = True) -> List[PDFChunk]:
+        """
+        Async get_relevant_chunks: the query embedding and chunk loads are
+        awaited, so the event loop serves other requests meanwhile.
+        """
+        balance_sheet_ids = [getattr(bs, 'pk', bs) for bs in balance_sheets]
+        
+        if not balance_sheet_ids:
+            return []
+        
+        vector_chunks = []
+        if use_vector_search and self.embedding_service.client:
+            try:
+                query_embedding = await self.query_cache.aget_or_create(
+                    query, self.embedding_service.model, self.embedding_service.acreate_embedding
+                )
+                
+                if query_embedding is not None:
+                    vector_chunks = await self._avector_similarity_search(query_embedding, balance_sheet_ids, query)
+            except Exception:
+                pass
+        
+        keyword_ids = await sync_to_async(self.keyword_chunk_ids)(query, balance_sheet_ids)
+        
+        if keyword_ids is None:
+            if vector_chunks:
+                return vector_chunks[:self.TOP_K]
+            all_chunks = []
+            for queryset in self._chunk_querysets(query, balance_sheet_ids):
+                all_chunks.extend([chunk async for chunk in queryset])
+            return self._keyword_search(query, all_chunks)
+        
+        chunks_by_id = {chunk.pk: chunk for chunk in vector_chunks}
+        fused_ids = self._fuse_rankings([chunk.pk for chunk in vector_chunks], keyword_ids)
+        missing_ids = [chunk_id for chunk_id in fused_ids if chunk_id not in chunks_by_id]
+        if missing_ids:
+            chunks_by_id.update(await PDFChunk.objects.defer('embedding', 'vector').ain_bulk(missing_ids))
+        return [chunks_by_id[chunk_id] for chunk_id in fused_ids if chunk_id in chunks_by_id]
+    
+    def keyword_chunk_ids(self, query: str, balance_sheet_ids: List[int], top_k: int = None) -> Optional[List[int]]:
+        """
+        Ids of the best keyword matches, best first, ranked in the database:
+        through the FTS5 table on SQLite, else the BM25 postings. None when
+        neither covers these balance sheets yet.
+        """
+        top_k = top_k or self.VECTOR_CANDIDATES
+        hits = self.fulltext_index.search(query, balance_sheet_ids, top_k=top_k)
+        if hits is None:
+            hits = self.bm25_index.search(query, balance_sheet_ids, top_k=top_k)
+        if hits is None:
+            return None
+        return [chunk_id for chunk_id, _ in hits]
+    
+    def _fuse_rankings(self, *rankings: List[int]) -> List[int]:
+        """Reciprocal-rank fusion of ranked chunk id lists; returns the top TOP_K ids."""
+        scores = {}
+        for ranking in rankings:
+            for rank, chunk_id in enumerate(ranking, start=1):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (self.RRF_K + rank)
+        return sorted(scores, key=lambda chunk_id: scores[chunk_id], reverse=True)[:self.TOP_K]
+    
+    def _get_chunks_for_query(self, query: str, balance_sheet_ids: List[int]) -> List[PDFChunk]:
         """Get chunks filtered by query type."""
+        all_chunks = []
+        for queryset in self._chunk_querysets(query, balance_sheet_ids):
+            all_chunks.extend(queryset)
+        return all_chunks
+    
+    def _chunk_querysets(self, query: str, balance_sheet_ids: List[int]) -> List:
+        """Querysets whose concatenated results are the keyword-search candidates, balance sheet sections first when relevant."""
         query_lower = query.lower()
         balance_sheet_keywords = ['asset', 'liability', 'equity', 'current assets', 'total assets', 'balance sheet']
         is_balance_sheet_query = any(keyword in query_lower for keyword in balance_sheet_keywords)
         
+        chunks = PDFChunk.objects.filter(balance_sheet_id__in=balance_sheet_ids).defer('embedding', 'vector')
         if is_balance_sheet_query:
-            balance_sheet_chunks = list(PDFChunk.objects.filter(
-                balance_sheet__in=balance_sheets,
-                section_type='BALANCE_SHEET'
-            ))
-            other_chunks = list(PDFChunk.objects.filter(
-                balance_sheet__in=balance_sheets
-            ).exclude(section_type='BALANCE_SHEET'))
-            return balance_sheet_chunks + other_chunks
-        
-        return list(PDFChunk.objects.filter(balance_sheet__in=balance_sheets))
-    
-    def _vector_similarity_search(self, query_embedding: list, all_chunks: List[PDFChunk], query: str) -> List[PDFChunk]:
-        """Perform vector similarity search on chunks."""
-        scored_chunks = []
-        query_lower = query.lower()
-        balance_sheet_keywords = ['asset', 'liability', 'equity', 'current assets', 'total assets', 'balance sheet']
-        is_balance_sheet_query = any(keyword in query_lower for keyword in balance_sheet_keywords)
+            return [
+                chunks.filter(section_type='BALANCE_SHEET'),
+                chunks.exclude(section_type='BALANCE_SHEET'),
+            ]
         
-        for chunk in all_chunks:
-            chunk_vector = self._process_embedding(chunk.embedding)
-            
-            if chunk_vector and len(chunk_vector) > 0:
-                if len(chunk_vector) != len(query_embedding):
-                    continue
-                
-                similarity = cosine_similarity(query_embedding, chunk_vector)
-                final_score = self._calculate_chunk_score(similarity, chunk, query_lower, is_balance_sheet_query)
-                scored_chunks.append((final_score, chunk))
+        return [chunks]
+    
+    def _vector_similarity_search(self, query_embedding: list, balance_sheet_ids: List[int], query: str) -> List[PDFChunk]:
+        """Perform vector similarity search against the per-balance-sheet index."""
+        candidates = self.vector_index.search(
+            query_embedding, balance_sheet_ids, top_k=self.VECTOR_CANDIDATES, model=self.embedding_service.model
+        )
+        if not candidates:
+            return []
         
-        if scored_chunks:
-            scored_chunks.sort(key=lambda x: x[0], reverse=True)
-            top_k = min(8, len(scored_chunks))
-            return [chunk for score, chunk in scored_chunks[:top_k]]
+        chunks_by_id = PDFChunk.objects.defer('embedding', 'vector').in_bulk([chunk_id for chunk_id, _ in candidates])
+        return self._rank_candidates(candidates, chunks_by_id, query)
+    
+    async def _avector_similarity_search(self, query_embedding: list, balance_sheet_ids: List[int], query: str) -> List[PDFChunk]:
+        """Async _vector_similarity_search; the index lookup may load shards from the DB, so it runs off the event loop."""
+        candidates = await sync_to_async(self.vector_index.search)(
+            query_embedding, balance_sheet_ids, top_k=self.VECTOR_CANDIDATES, model=self.embedding_service.model
+        )
+        if not candidates:
+            return []
         
-        return []
+        chunks_by_id = await PDFChunk.objects.defer('embedding', 'vector').ain_bulk([chunk_id for chunk_id, _ in candidates])
+        return self._rank_candidates(candidates, chunks_by_id, query)
     
-    def _process_embedding(self, raw_embedding) -> list:
-        """Process embedding from database into float list."""
-        if raw_embedding is None:
-            return None
+    def _rank_candidates(self, candidates: List[Tuple[int, float]], chunks_by_id: dict, query: str) -> List[PDFChunk]:
+        """Re-rank index candidates with title/content/section boosts, best first."""
+        query_lower = query.lower()
+        balance_sheet_keywords = ['asset', 'liability', 'equity', 'current assets', 'total assets', 'balance sheet']
+        is_balance_sheet_query = any(keyword in query_lower for keyword in balance_sheet_keywords)
         
-        if isinstance(raw_embedding, (list, tuple)) and raw_embedding:
-            first_elem = raw_embedding[0]
-            
-            if isinstance(first_elem, (int, float)):
-                return [float(x) for x in raw_embedding]
-            elif isinstance(first_elem, (list, tuple)):
-                return [float(x) for sublist in raw_embedding for x in sublist]
-            else:
-                try:
-                    return [float(x) for x in raw_embedding]
-                except (TypeError, ValueError):
-                    return None
-        
-        return None
+        scored_chunks = []
+        for chunk_id, similarity in candidates:
+            chunk = chunks_by_id.get(chunk_id)
+            if chunk is None:
+                continue
+            final_score = self._calculate_chunk_score(similarity, chunk, query_lower, is_balance_sheet_query)
+            scored_chunks.append((final_score, chunk))
+        
+        scored_chunks.sort(key=lambda x: x[0], reverse=True)
+        return [chunk for score, chunk in scored_chunks]
     
     def _calculate_chunk_score(self, similarity: float, chunk: PDFChunk, query_lower: str, is_balance_sheet_query: bool) -> float:
         """Calculate final score for chunk with boosts."""
@@ -131,7 +223,7 @@ class ChunkRetriever:
         return similarity + title_boost + content_boost + section_boost
     
     def _keyword_search(self, query: str, all_chunks: List[PDFChunk]) -> List[PDFChunk]:
-        """Fallback keyword-based search."""
+        """Substring keyword scan over loaded chunks; only used for chunks not yet in the BM25 index."""
         query_lower = query.lower()
         query_keywords = query_lower.split()
         
@@ -0,0 +1,146 @@
+"""Persistent embedding cache keyed by normalized-content hash and embedding model."""
+import hashlib
+import logging
+import re
+import unicodedata
+from typing import Dict, List
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .embedding_service import active_embedding_model
+from .models import EmbeddingCacheEntry
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_content(text: str) -> str:
+    """Canonical form of chunk text: NFKC, collapsed whitespace, stripped."""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text or '')).strip()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_content(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    DB-backed LRU cache of chunk embeddings.
+
+    `embed_texts` is the entry point: cached vectors are served from the
+    EmbeddingCacheEntry table and only misses reach EmbeddingService.
+    Hit/miss counters accumulate per instance so callers can report them.
+    """
+
+    def __init__(self, model: str = None, max_entries: int = None):
+        self.model = model or active_embedding_model()
+        self.max_entries = max_entries if max_entries is not None else getattr(
+            settings, 'EMBEDDING_CACHE_MAX_ENTRIES', 50000
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict:
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hit_rate, 4)}
+
+    def get_many(self, hashes: List[str]) -> Dict[str, object]:
+        """Look up vectors for content hashes and mark the hits as recently used."""
+        hashes = list(set(hashes))
+        if not hashes:
+            return {}
+
+        entries = list(
+            EmbeddingCacheEntry.objects.filter(model=self.model, content_hash__in=hashes)
+            .values_list('id', 'content_hash', 'vector')
+        )
+        if entries:
+            EmbeddingCacheEntry.objects.filter(id__in=[entry_id for entry_id, _, _ in entries]).update(
+                last_used_at=timezone.now(), hit_count=F('hit_count') + 1
+            )
+
+        return {entry_hash: vector for _, entry_hash, vector in entries if vector is not None}
+
+    def set_many(self, vectors_by_hash: Dict[str, object]) -> None:
+        """Store new vectors, then evict least recently used entries over the size cap."""
+        entries = [
+            EmbeddingCacheEntry(content_hash=entry_hash, model=self.model, vector=vector)
+            for entry_hash, vector in vectors_by_hash.items()
+            if vector is not None and len(vector)
+        ]
+        if not entries:
+            return
+
+        EmbeddingCacheEntry.objects.bulk_create(entries, ignore_conflicts=True, batch_size=500)
+        self.evict()
+
+    def evict(self) -> int:
+        """Delete the least recently used entries beyond max_entries."""
+        if self.max_entries is None or self.max_entries <= 0:
+            return 0
+
+        # Counting is cheap next to sorting the table, and most stores leave it under the cap
+        excess = EmbeddingCacheEntry.objects.count() - self.max_entries
+        if excess <= 0:
+            return 0
+
+        # Oldest first through the last_used_at index, so only the excess rows are read
+        stale_ids = list(
+            EmbeddingCacheEntry.objects.order_by('last_used_at', 'id')
+            .values_list('id', flat=True)[:excess]
+        )
+        deleted = 0
+        for start in range(0, len(stale_ids), 500):
+            deleted += EmbeddingCacheEntry.objects.filter(id__in=stale_ids[start:start + 500]).delete()[0]
+        return deleted
+
+    def embed_texts(self, texts: List[str], embedding_service, **batch_options) -> list:
+        """
+        Embed texts, consulting the cache first.
+
+        Returns vectors aligned with `texts` ([] for empty or failed texts).
+        Identical texts within one call are embedded once.
+        """
+        hashes = [content_hash(text) if text and text.strip() else None for text in texts]
+        cached = self.get_many([h for h in hashes if h])
+
+        embeddings = [[] for _ in texts]
+        pending = {}
+        for index, entry_hash in enumerate(hashes):
+            if entry_hash is None:
+                continue
+            if entry_hash in cached:
+                embeddings[index] = cached[entry_hash]
+                self.hits += 1
+            else:
+                pending.setdefault(entry_hash, []).append(index)
+                self.misses += 1
+
+        if pending:
+            miss_hashes = list(pending)
+            vectors = embedding_service.create_embeddings_batch(
+                [texts[pending[entry_hash][0]] for entry_hash in miss_hashes],
+                **batch_options
+            )
+
+            new_vectors = {}
+            for entry_hash, vector in zip(miss_hashes, vectors):
+                for index in pending[entry_hash]:
+                    embeddings[index] = vector
+                if vector:
+                    new_vectors[entry_hash] = vector
+
+            self.set_many(new_vectors)
+
+        logger.info(
+            "Embedding cache (%s): %d hits, %d misses, hit rate %.1f%%",
+            self.model, self.hits, self.misses, self.hit_rate * 100
+        )
+        return embeddings
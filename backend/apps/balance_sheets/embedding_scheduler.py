@@ -0,0 +1,165 @@
+"""Concurrent, rate-limited embedding requests with backoff on quota errors."""
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses the Gemini API uses for quota exhaustion and overload
+RETRYABLE_STATUS_CODES = (429, 503)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`.
+
+    `acquire` blocks until a token is available, so callers sharing a
+    bucket never exceed the configured request rate between them.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_quota_error(error: Exception) -> bool:
+    """True for rate-limit / overload errors worth retrying after a pause."""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if code in RETRYABLE_STATUS_CODES:
+        return True
+    return 'RESOURCE_EXHAUSTED' in str(error)
+
+
+_rate_limiter = None
+_rate_limiter_lock = Lock()
+
+
+def shared_rate_limiter() -> TokenBucket:
+    """Process-wide bucket sized by EMBEDDING_REQUESTS_PER_MINUTE, shared by every ingestion in the process."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            per_minute = getattr(settings, 'EMBEDDING_REQUESTS_PER_MINUTE', 300)
+            burst = getattr(settings, 'EMBEDDING_RATE_LIMIT_BURST', None)
+            _rate_limiter = TokenBucket(per_minute / 60.0, burst)
+        return _rate_limiter
+
+
+class EmbeddingScheduler:
+    """
+    Keeps up to `max_workers` embedding requests in flight.
+
+    Texts are planned into request batches exactly as
+    EmbeddingService.create_embeddings_batch does; each batch runs on a
+    thread pool, takes a token from the rate limiter before every request
+    and backs off exponentially (with jitter) on quota errors. Results are
+    written back by text index, so the output is aligned with the input
+    whatever order the requests complete in.
+    """
+
+    def __init__(self, embedding_service, max_workers: Optional[int] = None,
+                 rate_limiter: Optional[TokenBucket] = None, max_retries: Optional[int] = None,
+                 backoff_base: Optional[float] = None, backoff_max: Optional[float] = None):
+        self.embedding_service = embedding_service
+        self.max_workers = max(1, max_workers if max_workers is not None else getattr(
+            settings, 'EMBEDDING_MAX_CONCURRENCY', 4
+        ))
+        self.rate_limiter = rate_limiter or shared_rate_limiter()
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'EMBEDDING_MAX_RETRIES', 5)
+        self.backoff_base = backoff_base if backoff_base is not None else getattr(settings, 'EMBEDDING_BACKOFF_BASE', 1.0)
+        self.backoff_max = backoff_max if backoff_max is not None else getattr(settings, 'EMBEDDING_BACKOFF_MAX', 60.0)
+
+    def embed(self, texts: List[str], batch_size: int = None, token_budget: int = None) -> list:
+        """Vectors aligned with `texts`; empty or failed texts map to []."""
+        embeddings = [[] for _ in texts]
+        batches = self.embedding_service.plan_batches(texts, batch_size, token_budget)
+        if not batches:
+            return embeddings
+
+        def run(batch):
+            return batch, self._embed_batch([texts[i] for i in batch])
+
+        if self.max_workers == 1 or len(batches) == 1:
+            results = map(run, batches)
+        else:
+            executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches)),
+                                          thread_name_prefix='embedding')
+            with executor:
+                results = list(executor.map(run, batches))
+
+        for batch, vectors in results:
+            for index, vector in zip(batch, vectors):
+                embeddings[index] = vector
+
+        return embeddings
+
+    def _request(self, texts: List[str]) -> Optional[list]:
+        """
+        One embed_batch_request, rate limited and retried with backoff on
+        quota errors; the quota error is re-raised once retries run out.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                return self.embedding_service.embed_batch_request(texts)
+            except Exception as e:
+                if is_quota_error(e) and attempt < self.max_retries:
+                    self._sleep_before_retry(attempt, e)
+                    continue
+                raise
+
+    def _embed_batch(self, batch_texts: List[str]) -> list:
+        """One batch request with retries; falls back to one request per text if the batch call fails otherwise."""
+        try:
+            vectors = self._request(batch_texts)
+        except Exception as e:
+            if is_quota_error(e):
+                logger.warning("Embedding quota still exhausted after %d retries; skipping %d texts",
+                               self.max_retries, len(batch_texts))
+                return [[] for _ in batch_texts]
+            vectors = None
+
+        if vectors is not None and len(vectors) == len(batch_texts):
+            return vectors
+
+        return [self._embed_one(text) for text in batch_texts]
+
+    def _embed_one(self, text: str) -> list:
+        """A single-text request with the same quota backoff; [] if it fails."""
+        try:
+            vectors = self._request([text])
+        except Exception as e:
+            if is_quota_error(e):
+                logger.warning("Embedding quota still exhausted after %d retries; skipping 1 text", self.max_retries)
+            else:
+                logger.warning("Embedding request failed: %s", e)
+            return []
+        return vectors[0] if vectors else []
+
+    def _sleep_before_retry(self, attempt: int, error: Exception) -> None:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay *= random.uniform(0.5, 1.0)
+        logger.info("Embedding quota error (%s); retrying in %.1fs", error, delay)
+        time.sleep(delay)
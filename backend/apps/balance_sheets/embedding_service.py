@@ -1,7 +1,9 @@
 """Embedding service for RAG using Gemini text-embedding-004 model."""
 from django.conf import settings
-from typing import List, Tuple
-import math
+from typing import List, Optional, Tuple
+import numpy as np
+from .embedding_scheduler import EmbeddingScheduler
+from .fields import VECTOR_DTYPE, to_vector
 
 # Try new google-genai library first, fallback to old one
 try:
@@ -16,13 +18,24 @@ except ImportError:
         google_genai = None
         USE_NEW_GENAI = None
 
-EMBEDDING_MODEL = "text-embedding-004"
+# Model used when settings.EMBEDDING_MODEL is unset; stored vectors record the model that made them
+DEFAULT_EMBEDDING_MODEL = "text-embedding-004"
+
+# Rough chars-per-token ratio used to keep batch requests under the token budget
+CHARS_PER_TOKEN = 4
+
+
+def active_embedding_model() -> str:
+    """The embedding model retrieval and new chunks use (settings.EMBEDDING_MODEL)."""
+    return getattr(settings, 'EMBEDDING_MODEL', None) or DEFAULT_EMBEDDING_MODEL
 
 
 class EmbeddingService:
-    """Service for creating embeddings using Gemini text-embedding-004."""
+    """Service for creating embeddings using Gemini embedding models (the active one by default)."""
     
-    def __init__(self):
+    def __init__(self, model: str = None):
+        self.model = model or active_embedding_model()
+        
         if not settings.GEMINI_API_KEY:
             self.client = None
             self.use_new_api = False
@@ -45,7 +58,7 @@ class EmbeddingService:
                 self.use_new_api = False
     
     def create_embedding(self, text: str) -> list:
-        """Create embedding for text using text-embedding-004."""
+        """Create embedding for text using this service's model."""
         if not self.client and not self.use_new_api:
             return []
         
@@ -55,26 +68,10 @@ class EmbeddingService:
         try:
             if self.use_new_api and self.client:
                 response = self.client.models.embed_content(
-                    model=EMBEDDING_MODEL,
+                    model=self.model,
                     contents=text
                 )
-                
-                if hasattr(response, 'embeddings') and response.embeddings:
-                    raw_embedding = response.embeddings[0]
-                    embedding_vector = self._extract_embedding_vector(raw_embedding)
-                    
-                    if embedding_vector:
-                        return [float(x) for x in embedding_vector]
-                    return []
-                    
-                elif hasattr(response, 'embedding'):
-                    raw_embedding = response.embedding
-                    if isinstance(raw_embedding, (list, tuple)):
-                        return [float(x) for x in raw_embedding]
-                    else:
-                        return [float(x) for x in list(raw_embedding)]
-                else:
-                    return []
+                return self._parse_embedding_response(response)
             else:
                 return []
                 
@@ -83,6 +80,42 @@ class EmbeddingService:
         except Exception:
             return []
     
+    async def acreate_embedding(self, text: str) -> list:
+        """Async create_embedding through the google-genai aio client (no thread is held while waiting)."""
+        if not (self.use_new_api and self.client):
+            return []
+        
+        if not text or not text.strip():
+            return []
+        
+        try:
+            response = await self.client.aio.models.embed_content(
+                model=self.model,
+                contents=text
+            )
+            return self._parse_embedding_response(response)
+        except Exception:
+            return []
+    
+    def _parse_embedding_response(self, response) -> list:
+        """Single embedding vector from an embed_content response, or []."""
+        if hasattr(response, 'embeddings') and response.embeddings:
+            raw_embedding = response.embeddings[0]
+            embedding_vector = self._extract_embedding_vector(raw_embedding)
+            
+            if embedding_vector:
+                return [float(x) for x in embedding_vector]
+            return []
+            
+        elif hasattr(response, 'embedding'):
+            raw_embedding = response.embedding
+            if isinstance(raw_embedding, (list, tuple)):
+                return [float(x) for x in raw_embedding]
+            else:
+                return [float(x) for x in list(raw_embedding)]
+        else:
+            return []
+    
     def _extract_embedding_vector(self, raw_embedding):
         """Extract embedding vector from various response structures."""
         if hasattr(raw_embedding, 'values'):
@@ -121,32 +154,159 @@ class EmbeddingService:
             except (TypeError, ValueError, AttributeError):
                 return []
     
-    def create_embeddings_batch(self, texts: list) -> list:
-        """Create embeddings for multiple texts (batch processing)."""
-        embeddings = []
-        for text in texts:
-            embedding = self.create_embedding(text)
-            embeddings.append(embedding)
-        return embeddings
+    def create_embeddings_batch(self, texts: list, batch_size: int = None, token_budget: int = None,
+                                max_workers: int = None) -> list:
+        """
+        Create embeddings for multiple texts using batched API requests.
+        
+        Texts are grouped into requests of at most `batch_size` texts and
+        roughly `token_budget` tokens, sent EMBEDDING_MAX_CONCURRENCY at a
+        time under the shared rate limit (see EmbeddingScheduler). The result
+        is aligned with `texts`; empty or failed texts map to []. A failed
+        request is retried one text at a time so a single bad batch never
+        drops the whole document.
+        """
+        if not self.client and not self.use_new_api:
+            return [[] for _ in texts]
+        
+        return EmbeddingScheduler(self, max_workers=max_workers).embed(texts, batch_size, token_budget)
+    
+    def plan_batches(self, texts: list, batch_size: int = None, token_budget: int = None) -> List[List[int]]:
+        """Group indices of non-empty texts into request-sized batches, preserving order."""
+        if batch_size is None:
+            batch_size = getattr(settings, 'EMBEDDING_BATCH_SIZE', 100)
+        if token_budget is None:
+            token_budget = getattr(settings, 'EMBEDDING_BATCH_TOKEN_BUDGET', 20000)
+        batch_size = max(1, batch_size)
+        
+        batches = []
+        current = []
+        current_tokens = 0
+        
+        for index, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            
+            tokens = len(text) // CHARS_PER_TOKEN + 1
+            if current and (len(current) >= batch_size or current_tokens + tokens > token_budget):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            
+            current.append(index)
+            current_tokens += tokens
+        
+        if current:
+            batches.append(current)
+        
+        return batches
+    
+    def embed_batch_request(self, texts: List[str]) -> list:
+        """
+        Send one embed_content request for several texts; raises on API errors.
+        
+        Returns None when the client has no batch endpoint (legacy API), so
+        callers embed the texts one at a time instead.
+        """
+        if not (self.use_new_api and self.client):
+            return None
+        
+        response = self.client.models.embed_content(
+            model=self.model,
+            contents=texts
+        )
+        
+        raw_embeddings = getattr(response, 'embeddings', None) or []
+        return [self._extract_embedding_vector(raw_embedding) or [] for raw_embedding in raw_embeddings]
+
+
+def vector_norms(matrix: np.ndarray) -> np.ndarray:
+    """L2 norm of every row of an N×D matrix (or of a single 1-D vector)."""
+    return np.linalg.norm(matrix, axis=-1)
+
+
+def l2_normalize(matrix: np.ndarray, norms: Optional[np.ndarray] = None) -> np.ndarray:
+    """Scale rows to unit length; zero rows stay zero instead of becoming NaN."""
+    matrix = np.asarray(matrix, dtype=VECTOR_DTYPE)
+    if norms is None:
+        norms = vector_norms(matrix)
+    norms = np.asarray(norms, dtype=VECTOR_DTYPE)
+    safe = np.where(norms > 0, norms, 1).astype(VECTOR_DTYPE)
+    return matrix / safe[..., None] if matrix.ndim > 1 else matrix / safe
+
+
+def cosine_similarity_batch(queries, matrix, matrix_norms: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Cosine similarity of one or several queries against N chunk vectors in one call.
+
+    `queries` is a 1-D vector (returns shape N) or a Q×D matrix (returns Q×N).
+    Pass `matrix_norms` to reuse norms cached alongside the chunk matrix.
+    """
+    queries = np.asarray(queries, dtype=VECTOR_DTYPE)
+    matrix = np.asarray(matrix, dtype=VECTOR_DTYPE)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+
+    if queries.shape[-1] != matrix.shape[-1]:
+        raise ValueError(f"Dimension mismatch: query {queries.shape[-1]} vs matrix {matrix.shape[-1]}")
+
+    if matrix_norms is None:
+        matrix_norms = vector_norms(matrix)
+
+    scores = queries @ matrix.T
+    denominator = vector_norms(queries)[..., None] * matrix_norms
+    return np.divide(scores, denominator, out=np.zeros_like(scores), where=denominator > 0)
+
+
+class EmbeddingMatrix:
+    """N×D float32 chunk matrix with its row norms computed once and cached."""
+    
+    def __init__(self, matrix):
+        matrix = np.ascontiguousarray(matrix, dtype=VECTOR_DTYPE)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+        self.matrix = matrix
+        self._norms = None
+        self._normalized = None
+    
+    def __len__(self):
+        return self.matrix.shape[0]
+    
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1]
+    
+    @property
+    def norms(self) -> np.ndarray:
+        if self._norms is None:
+            self._norms = vector_norms(self.matrix)
+        return self._norms
+    
+    @property
+    def normalized(self) -> np.ndarray:
+        return self.prepare()._normalized
+    
+    def prepare(self) -> 'EmbeddingMatrix':
+        """Compute norms and the normalized matrix now rather than on the first search."""
+        if self._normalized is None:
+            self._normalized = l2_normalize(self.matrix, self.norms)
+        return self
+    
+    def similarities(self, queries) -> np.ndarray:
+        """Cosine similarity of one query (N,) or several queries (Q×N) against every row."""
+        queries = np.asarray(queries, dtype=VECTOR_DTYPE)
+        return l2_normalize(queries) @ self.normalized.T
 
 
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     """Calculate cosine similarity between two vectors."""
-    if not vec1 or not vec2:
-        return 0.0
+    vec1 = to_vector(vec1)
+    vec2 = to_vector(vec2)
     
-    if len(vec1) != len(vec2):
+    if vec1 is None or vec2 is None:
         return 0.0
     
-    try:
-        dot_product = sum(float(a) * float(b) for a, b in zip(vec1, vec2))
-        magnitude1 = math.sqrt(sum(float(a) * float(a) for a in vec1))
-        magnitude2 = math.sqrt(sum(float(b) * float(b) for b in vec2))
-        
-        if magnitude1 == 0 or magnitude2 == 0:
-            return 0.0
-        
-        return dot_product / (magnitude1 * magnitude2)
-    
-    except (TypeError, ValueError):
+    if vec1.shape != vec2.shape:
         return 0.0
+    
+    return float(cosine_similarity_batch(vec1, vec2)[0])
@@ -0,0 +1,60 @@
+"""Custom model fields for storing embedding vectors."""
+from base64 import b64decode, b64encode
+
+import numpy as np
+from django.db import models
+
+VECTOR_DTYPE = np.dtype('<f4')
+
+
+def to_vector(value):
+    """Coerce a list/tuple/array/bytes embedding into a 1-D float32 array (or None)."""
+    if value is None:
+        return None
+
+    if isinstance(value, np.ndarray):
+        vector = value.astype(VECTOR_DTYPE, copy=False).reshape(-1)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        vector = np.frombuffer(value, dtype=VECTOR_DTYPE)
+    elif isinstance(value, (list, tuple)):
+        if value and isinstance(value[0], (list, tuple)):
+            value = [x for sublist in value for x in sublist]
+        try:
+            vector = np.asarray(value, dtype=VECTOR_DTYPE)
+        except (TypeError, ValueError):
+            return None
+    else:
+        return None
+
+    return vector if vector.size else None
+
+
+class VectorField(models.BinaryField):
+    """
+    Stores an embedding as raw little-endian float32 bytes.
+
+    Values are read back as read-only NumPy arrays straight from the
+    database buffer, so retrieval never goes through Python float lists.
+    """
+
+    description = "Float32 embedding vector"
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return to_vector(value)
+
+    def to_python(self, value):
+        if isinstance(value, str):
+            value = b64decode(value.encode('ascii'))
+        return to_vector(value)
+
+    def get_prep_value(self, value):
+        vector = to_vector(value)
+        if vector is None:
+            return None
+        return vector.astype(VECTOR_DTYPE, copy=False).tobytes()
+
+    def value_to_string(self, obj):
+        value = self.get_prep_value(self.value_from_object(obj))
+        return b64encode(value).decode('ascii') if value is not None else None
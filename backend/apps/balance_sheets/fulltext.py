@@ -0,0 +1,170 @@
+"""
+SQLite FTS5 full-text search over PDF chunks.
+
+An external-content FTS5 table mirrors PDFChunk.content, source_title and
+section_type; triggers on the chunk table keep it in sync for every
+write, including bulk_create/bulk_update and raw SQL. Matching, balance
+sheet filtering and bm25() ranking all run inside SQLite, so a search
+returns only the top ids. On other databases the table is never created
+and `FullTextIndex.available()` is False.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from .bm25 import STOPWORDS
+
+FTS_TABLE = 'balance_sheets_pdfchunk_fts'
+CHUNK_TABLE = 'balance_sheets_pdfchunk'
+COLUMNS = ('content', 'source_title', 'section_type')
+
+# bm25() column weights, in COLUMNS order: a hit in the title counts double, as in the legacy keyword scan
+COLUMN_WEIGHTS = (1.0, 2.0, 0.5)
+
+_TOKEN = re.compile(r'\w+')
+
+_columns = ', '.join(COLUMNS)
+_new_values = ', '.join(f'new.{column}' for column in COLUMNS)
+_old_values = ', '.join(f'old.{column}' for column in COLUMNS)
+
+CREATE_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{_columns}, content='{CHUNK_TABLE}', content_rowid='id', tokenize='porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {CHUNK_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {CHUNK_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_columns} ON {CHUNK_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values}); "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values}); END",
+]
+
+# Migration that creates the table; post_migrate re-installs it from then on
+FULLTEXT_MIGRATION = '0014_pdfchunk_fts'
+
+TRIGGERS = [f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au']
+
+
+def install(connection) -> bool:
+    """
+    Create the FTS table and its triggers if missing, rebuilding the index
+    when anything had to be created. Idempotent; a no-op off SQLite.
+
+    Returns True when the index was (re)built.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+            [FTS_TABLE, *TRIGGERS],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if len(existing) == len(TRIGGERS) + 1:
+            return False
+
+        # Django's SQLite schema editor rebuilds a table to alter it, which drops
+        # its triggers, so writes since then may be missing from the index
+        for statement in CREATE_STATEMENTS:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def uninstall(connection) -> None:
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for trigger in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def match_expression(query: str, operator: str = 'OR') -> Optional[str]:
+    """
+    FTS5 query for the words of a free-text query, or None if it has none.
+
+    Every word is quoted, so user input cannot inject FTS5 syntax
+    (column filters, NEAR, prefix stars).
+    """
+    terms = []
+    for token in _TOKEN.findall((query or '').lower()):
+        if token not in STOPWORDS and token not in terms:
+            terms.append(token)
+    if not terms:
+        return None
+    return f' {operator} '.join(f'"{term}"' for term in terms)
+
+
+class FullTextIndex:
+    """Top-k chunk search through the FTS5 table."""
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.using = using
+        self._available = None
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def available(self) -> bool:
+        """True when the database is SQLite and the FTS table exists (checked once per process once found)."""
+        if self._available:
+            return True
+        if self.connection.vendor != 'sqlite':
+            return False
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            self._available = cursor.fetchone() is not None
+        return self._available
+
+    def search(self, query: str, balance_sheet_ids: List[int], top_k: int = 8) -> Optional[List[Tuple[int, float]]]:
+        """
+        Up to top_k (chunk_id, score) pairs for chunks of these balance
+        sheets matching any query word, best first (score = -bm25()).
+
+        Returns None when full-text search is unavailable, so callers can
+        use another keyword path.
+        """
+        if not self.available():
+            return None
+
+        expression = match_expression(query)
+        if expression is None or not balance_sheet_ids:
+            return []
+
+        placeholders = ', '.join(['%s'] * len(balance_sheet_ids))
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        sql = (
+            f"SELECT {FTS_TABLE}.rowid, bm25({FTS_TABLE}, {weights}) AS score "
+            f"FROM {FTS_TABLE} JOIN {CHUNK_TABLE} ON {CHUNK_TABLE}.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND {CHUNK_TABLE}.balance_sheet_id IN ({placeholders}) "
+            f"ORDER BY score, {FTS_TABLE}.rowid LIMIT %s"
+        )
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(sql, [expression, *balance_sheet_ids, top_k])
+                rows = cursor.fetchall()
+        except OperationalError:
+            # e.g. the table was dropped under us; let the caller fall back
+            self._available = None
+            return None
+        return [(chunk_id, -score) for chunk_id, score in rows]
+
+    def matching_ids_sql(self, query: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        (sql, params) of a subquery selecting the ids of chunks containing
+        every word of the query, for `pk__in=RawSQL(...)` filters; None when
+        unavailable or the query has no words.
+        """
+        if not self.available():
+            return None
+        expression = match_expression(query, operator='AND')
+        if expression is None:
+            return None
+        return f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression]
+
+
+fulltext_index = FullTextIndex()
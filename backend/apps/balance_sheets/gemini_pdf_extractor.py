@@ -1,8 +1,8 @@
 import google.generativeai as genai
 from django.conf import settings
-from io import BytesIO
 import json
 import re
+from .pdf_document import ParsedDocument
 
 
 class GeminiPDFExtractor:
@@ -15,7 +15,7 @@ class GeminiPDFExtractor:
         else:
             self.model = None
     
-    def extract_financial_data(self, pdf_file):
+    def extract_financial_data(self, pdf_file, document=None):
         """Extract financial data from balance sheet PDF using Gemini 2.5 Flash."""
         if not self.model:
             return self._get_default_error_response()
@@ -24,7 +24,7 @@ class GeminiPDFExtractor:
             pdf_file.seek(0)
             
             # Pass 1: Extract structured data
-            result = self._extract_pass1(pdf_file)
+            result = self._extract_pass1(pdf_file, document)
             
             if result['confidence']['overall'] >= 0.90:
                 return result
@@ -40,12 +40,12 @@ class GeminiPDFExtractor:
         except Exception:
             return self._get_error_response("Extraction failed")
     
-    def _extract_pass1(self, pdf_file):
+    def _extract_pass1(self, pdf_file, document=None):
         """First pass: Initial extraction with Gemini 2.5 Flash."""
         pdf_file.seek(0)
         
         # Extract text from PDF
-        extracted_text = self._extract_pdf_text(pdf_file)
+        extracted_text = self._extract_pdf_text(pdf_file, document)
         
         # Create extraction prompt
         prompt = self._create_extraction_prompt(extracted_text)
@@ -71,19 +71,20 @@ class GeminiPDFExtractor:
         except Exception:
             return self._get_default_error_response()
     
-    def _extract_pdf_text(self, pdf_file):
-        """Extract text from PDF using pdfplumber."""
+    def _extract_pdf_text(self, pdf_file, document=None):
+        """Extract text from PDF using pdfplumber (reusing a ParsedDocument if given)."""
         pdf_file.seek(0)
         
         try:
-            import pdfplumber
+            if document is None:
+                with ParsedDocument.from_file(pdf_file) as own_document:
+                    return self._extract_pdf_text(pdf_file, own_document)
             
-            with pdfplumber.open(BytesIO(pdf_file.read())) as pdf:
-                extracted_text = ""
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if text:
-                        extracted_text += f"\n--- Page {page.page_number} ---\n{text}\n"
+            extracted_text = ""
+            for page_num in document.page_numbers:
+                text = document.page_text(page_num)
+                if text:
+                    extracted_text += f"\n--- Page {page_num} ---\n{text}\n"
             
             pdf_file.seek(0)
             
@@ -0,0 +1,119 @@
+"""Per-company and consolidated analytics for a company and all of its subsidiaries."""
+from decimal import Decimal
+from typing import Dict, Iterable, List
+
+from django.db.models import Case, Count, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, NullIf
+
+from .analytics import FINANCIAL_FIELDS, Period, analyze_series
+from .models import FinancialData
+
+# Summable amounts; stored ratios are never added across companies.
+AMOUNT_FIELDS = [
+    name for name in FINANCIAL_FIELDS
+    if name not in ('revenue', 'current_ratio', 'debt_to_equity', 'roe')
+]
+
+
+def latest_financial_data(company_ids: Iterable[int]):
+    """The latest FinancialData of every balance sheet of the given companies."""
+    latest_id = Subquery(
+        FinancialData.objects.filter(balance_sheet=OuterRef('balance_sheet'))
+        .order_by('-created_at', '-id')
+        .values('id')[:1]
+    )
+    return FinancialData.objects.filter(balance_sheet__company_id__in=list(company_ids), id=latest_id)
+
+
+def _ratio(numerator: str, denominator: str) -> Case:
+    return Case(
+        When(**{f'{denominator}__gt': 0}, then=F(numerator) * 1.0 / F(denominator)),
+        default=None,
+        output_field=FloatField(),
+    )
+
+
+def consolidated_periods(company_ids: Iterable[int]) -> List[Dict]:
+    """
+    Sum every company's latest figures per (year, quarter) in the database.
+
+    Revenue falls back to sales per company before summing, as it does for
+    a single company. Consolidated current and debt-to-equity ratios are
+    recomputed from the summed amounts.
+    """
+    # Aggregates may not reuse model field names, hence the prefix.
+    sums = {f'sum_{name}': Sum(name) for name in AMOUNT_FIELDS}
+    sums['sum_revenue'] = Sum(Coalesce(NullIf('revenue', Value(Decimal('0'))), 'sales'))
+
+    rows = (
+        latest_financial_data(company_ids)
+        .values(year=F('balance_sheet__year'), quarter=F('balance_sheet__quarter'))
+        .annotate(companies_count=Count('balance_sheet__company_id', distinct=True), **sums)
+        .annotate(
+            consolidated_current_ratio=_ratio('sum_current_assets', 'sum_current_liabilities'),
+            consolidated_debt_to_equity=_ratio('sum_total_liabilities', 'sum_total_equity'),
+        )
+        .order_by('year', 'quarter')
+    )
+
+    periods = []
+    for row in rows:
+        period = {key[len('sum_'):]: row[key] for key in sums}
+        period.update(
+            year=row['year'],
+            quarter=row['quarter'],
+            companies_count=row['companies_count'],
+            current_ratio=row['consolidated_current_ratio'],
+            debt_to_equity=row['consolidated_debt_to_equity'],
+        )
+        periods.append(period)
+    return periods
+
+
+def group_analytics(companies: List) -> Dict:
+    """
+    Analytics for every company in a group plus the consolidated group series.
+
+    Runs two queries however many companies and periods there are: one for
+    per-company rows and one for the per-period aggregate.
+    """
+    company_ids = [company.pk for company in companies]
+
+    rows = (
+        latest_financial_data(company_ids)
+        .select_related('balance_sheet')
+        .order_by('balance_sheet__company_id', 'balance_sheet__year', 'balance_sheet__quarter')
+    )
+    series = {company_id: [] for company_id in company_ids}
+    for financial_data in rows:
+        series[financial_data.balance_sheet.company_id].append((financial_data.balance_sheet, financial_data))
+
+    consolidated = consolidated_periods(company_ids)
+    series['consolidated'] = [
+        (Period(None, row['year'], row['quarter']), row) for row in consolidated
+    ]
+
+    results = analyze_series(series)
+
+    consolidated_analytics, consolidated_kpis = results.pop('consolidated')
+    for period, row in zip(consolidated_analytics, consolidated):
+        period['companies_count'] = row['companies_count']
+
+    return {
+        'companies': [
+            {
+                'id': company.pk,
+                'name': company.name,
+                'parent_company': company.parent_company_id,
+                'analytics': results[company.pk][0],
+                'kpis': results[company.pk][1],
+                'periods_count': len(results[company.pk][0]),
+            }
+            for company in companies
+        ],
+        'consolidated': {
+            'analytics': consolidated_analytics,
+            'kpis': consolidated_kpis,
+            'periods_count': len(consolidated_analytics),
+        },
+    }
@@ -0,0 +1,467 @@
+"""Background ingestion pipeline: extraction, financial data records and RAG indexing."""
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ChunkTerm, FinancialData, PDFChunk, IngestionJob, StagedChunkEmbedding
+from .pdf_processor import PDFProcessor
+from .gemini_pdf_extractor import GeminiPDFExtractor
+from .pdf_chunker import PDFChunker
+from .embedding_service import EmbeddingService
+from .embedding_cache import EmbeddingCache
+from .pdf_document import ParsedDocument
+from .bm25 import index_chunks
+from .fulltext import fulltext_index
+from .signals import chunks_changed
+
+logger = logging.getLogger(__name__)
+
+
+class BalanceSheetIngestor:
+    """Runs the extraction → financial data → chunking → embedding pipeline for one balance sheet."""
+    
+    def ingest(self, balance_sheet):
+        """
+        Process an uploaded balance sheet and advance its extraction_status.
+        
+        Extraction, chunking and embedding write nothing; their results then
+        replace the sheet's FinancialData, PDFChunk and ChunkTerm rows in one
+        transaction, so re-running a job (after a crash or a requeue) never
+        leaves duplicates or a half-written sheet.
+        """
+        balance_sheet.extraction_status = 'PROCESSING'
+        balance_sheet.save(update_fields=['extraction_status'])
+        
+        try:
+            pdf_file = balance_sheet.pdf_file
+            pdf_file.open()
+            
+            # Parse the PDF once; every stage below reuses it
+            with ParsedDocument.from_file(pdf_file) as document:
+                # Extract financial data
+                financial_data, additional_data = self._extract_financial_data(pdf_file, document)
+                
+                # Process PDF chunks for RAG
+                chunks, chunk_errors = self._process_pdf_chunks(balance_sheet, pdf_file, document)
+            
+            pdf_file.close()
+            
+            if chunk_errors:
+                # Keep rejected chunks visible next to the extraction results, not only in the logs
+                additional_data = {
+                    **additional_data,
+                    'rejected_chunks': [{'index': idx, 'errors': messages} for idx, messages in chunk_errors],
+                }
+            
+            self._replace_records(balance_sheet, financial_data, additional_data, chunks)
+            
+            balance_sheet.extraction_status = 'COMPLETED'
+            balance_sheet.extracted_at = timezone.now()
+            balance_sheet.save(update_fields=['extraction_status', 'extracted_at'])
+            
+        except Exception:
+            balance_sheet.extraction_status = 'FAILED'
+            balance_sheet.save(update_fields=['extraction_status'])
+            raise
+    
+    def _replace_records(self, balance_sheet, financial_data, additional_data, chunks):
+        """
+        Swap in the sheet's new FinancialData and chunks atomically.
+        
+        `chunks` is None when RAG indexing failed; the sheet's existing
+        chunks are then kept.
+        """
+        batch_size = getattr(settings, 'CHUNK_BULK_CREATE_BATCH_SIZE', 500)
+        with transaction.atomic():
+            FinancialData.objects.filter(balance_sheet=balance_sheet).delete()
+            self._create_financial_data_record(balance_sheet, financial_data, additional_data)
+            
+            if chunks is not None:
+                # Postings first, so the chunk delete has nothing left to cascade to
+                ChunkTerm.objects.filter(balance_sheet=balance_sheet).delete()
+                PDFChunk.objects.filter(balance_sheet=balance_sheet).delete()
+                PDFChunk.objects.bulk_create(chunks, batch_size=batch_size)
+                # Keyword search reads the FTS5 table when there is one; its triggers already indexed the rows
+                if not fulltext_index.available():
+                    index_chunks(chunks)
+        
+        if chunks is not None:
+            # bulk_create does not send post_save, so announce the new chunks ourselves
+            chunks_changed.send(sender=PDFChunk, balance_sheet_id=balance_sheet.id)
+    
+    def _extract_financial_data(self, pdf_file, document=None):
+        """Extract financial data from PDF using Gemini or fallback processor."""
+        try:
+            gemini_extractor = GeminiPDFExtractor()
+            result = gemini_extractor.extract_financial_data(pdf_file, document)
+            
+            if result['confidence']['overall'] >= 0.5:
+                financial_data = result['data']
+                additional_data = {
+                    'confidence': result['confidence'],
+                    'validation': result['validation'],
+                    'metadata': result['metadata']
+                }
+                return financial_data, additional_data
+            else:
+                raise Exception("Low confidence")
+                
+        except Exception:
+            # Fallback to old PDFProcessor
+            processor = PDFProcessor()
+            pdf_file.seek(0)
+            financial_data = processor.extract_financial_data(pdf_file, document)
+            return financial_data, {}
+    
+    def _create_financial_data_record(self, balance_sheet, financial_data, additional_data):
+        """Create FinancialData record from extracted data."""
+        FinancialData.objects.create(
+            balance_sheet=balance_sheet,
+            # Assets
+            total_assets=financial_data.get('total_assets'),
+            current_assets=financial_data.get('current_assets'),
+            non_current_assets=financial_data.get('non_current_assets'),
+            # Liabilities
+            total_liabilities=financial_data.get('total_liabilities'),
+            current_liabilities=financial_data.get('current_liabilities'),
+            non_current_liabilities=financial_data.get('non_current_liabilities'),
+            # Equity
+            total_equity=financial_data.get('total_equity'),
+            # Income
+            revenue=financial_data.get('revenue'),
+            sales=financial_data.get('sales'),
+            # Cash flows
+            operating_cash_flow=financial_data.get('operating_cash_flow'),
+            investing_cash_flow=financial_data.get('investing_cash_flow'),
+            financing_cash_flow=financial_data.get('financing_cash_flow'),
+            net_cash_flow=financial_data.get('net_cash_flow'),
+            # Ratios
+            current_ratio=financial_data.get('current_ratio'),
+            debt_to_equity=financial_data.get('debt_to_equity'),
+            roe=financial_data.get('roe'),
+            # Additional flexible fields
+            additional_data=additional_data
+        )
+
+    
+    def _process_pdf_chunks(self, balance_sheet, pdf_file, document=None):
+        """
+        Chunk the PDF and embed the chunks for RAG.
+        
+        Returns (unsaved PDFChunks, rejected rows) as _create_chunks_with_embeddings
+        does; the chunks are None if indexing failed.
+        """
+        try:
+            chunker = PDFChunker()
+            chunks_data = chunker.process_pdf(pdf_file, balance_sheet, document=document)
+            
+            if not chunks_data:
+                return [], []
+            
+            return self._create_chunks_with_embeddings(balance_sheet, chunks_data)
+            
+        except Exception:
+            logger.exception("RAG indexing failed for balance sheet %s", balance_sheet.id)
+            return None, []
+    
+    def _create_chunks_with_embeddings(self, balance_sheet, chunks_data):
+        """
+        Build PDFChunk instances with embeddings for RAG indexing.
+        
+        Rows are built and validated in memory; nothing is written here.
+        Returns (chunks, errors) where errors lists (chunk index, validation
+        messages) for rows that were rejected.
+        """
+        embedding_service = EmbeddingService()
+        
+        # Create embeddings for RAG, reusing cached vectors for repeated boilerplate
+        embedding_vectors = [[] for _ in chunks_data]
+        if embedding_service.client:
+            try:
+                embedding_vectors = EmbeddingCache().embed_texts(
+                    [chunk_data.get('content', '') for chunk_data in chunks_data],
+                    embedding_service
+                )
+            except Exception:
+                logger.exception("Embedding failed for balance sheet %s", balance_sheet.id)
+        
+        chunks, errors = self._build_chunks(balance_sheet, chunks_data, embedding_vectors, embedding_service.model)
+        
+        for idx, messages in errors:
+            logger.warning("Skipping chunk %d of balance sheet %s: %s", idx, balance_sheet.id, messages)
+        
+        return chunks, errors
+    
+    def _build_chunks(self, balance_sheet, chunks_data, embedding_vectors, embedding_model):
+        """Build unsaved PDFChunk instances, collecting per-row validation errors."""
+        chunks = []
+        errors = []
+        
+        for idx, chunk_data in enumerate(chunks_data):
+            page_num = chunk_data.get('page_num', chunk_data.get('start_page', idx+1))
+            
+            chunk = PDFChunk(
+                balance_sheet=balance_sheet,
+                section_type=chunk_data.get('section_type', 'OTHER'),
+                chunk_type=chunk_data.get('chunk_type', 'Narrative_General'),
+                start_page=chunk_data.get('start_page', chunk_data.get('page_num', 1)),
+                end_page=chunk_data.get('end_page', chunk_data.get('page_num', 1)),
+                page_num=page_num,
+                source_title=chunk_data.get('source_title', ''),
+                content=chunk_data.get('content', ''),
+                extracted_data={},
+                confidence=0.85,
+            )
+            if len(embedding_vectors[idx]):
+                chunk.set_vector(embedding_vectors[idx], embedding_model)
+            chunk.fill_page_defaults()
+            
+            # chunk_type is free-form for detected statements (e.g. CONSOLIDATED_BALANCE_SHEET),
+            # so it is not checked against CHUNK_TYPES here.
+            try:
+                chunk.full_clean(exclude=['balance_sheet', 'chunk_type', 'vector', 'embedding'], validate_unique=False)
+            except ValidationError as e:
+                errors.append((idx, e.message_dict))
+                continue
+            
+            chunks.append(chunk)
+        
+        return chunks, errors
+
+
+class ChunkReembedder:
+    """
+    Incrementally embeds chunks with another model, staging the vectors.
+    
+    Chunks whose vector is not from `model` and that have no staged
+    `model` vector yet are embedded page by page into
+    StagedChunkEmbedding, so retrieval keeps using the current vectors
+    until settings.EMBEDDING_MODEL is switched, and an interrupted run
+    simply continues with the chunks that are still missing.
+    """
+    
+    def __init__(self, model, page_size=None):
+        self.model = model
+        self.page_size = page_size or getattr(settings, 'EMBEDDING_BATCH_SIZE', 100) * getattr(
+            settings, 'EMBEDDING_MAX_CONCURRENCY', 4
+        )
+    
+    def stale_chunks(self, balance_sheet_id=None):
+        queryset = (
+            PDFChunk.objects.exclude(content='')
+            .exclude(embedding_model=self.model, vector__isnull=False)
+            .exclude(staged_embeddings__model=self.model)
+        )
+        if balance_sheet_id is not None:
+            queryset = queryset.filter(balance_sheet_id=balance_sheet_id)
+        return queryset
+    
+    def run(self, balance_sheet_id):
+        """Stage `model` vectors for a balance sheet's stale chunks; returns (staged, failed)."""
+        embedding_service = EmbeddingService(model=self.model)
+        if not embedding_service.client:
+            raise RuntimeError('Embedding service not available. Check GEMINI_API_KEY.')
+        embedding_cache = EmbeddingCache(model=self.model)
+        
+        staged = failed = 0
+        last_pk = 0
+        while True:
+            page = list(
+                self.stale_chunks(balance_sheet_id).filter(pk__gt=last_pk)
+                .order_by('pk').only('id', 'content')[:self.page_size]
+            )
+            if not page:
+                break
+            last_pk = page[-1].pk
+            
+            vectors = embedding_cache.embed_texts([chunk.content for chunk in page], embedding_service)
+            rows = [
+                StagedChunkEmbedding(chunk=chunk, model=self.model, embedding_dim=len(vector), vector=vector)
+                for chunk, vector in zip(page, vectors) if len(vector)
+            ]
+            StagedChunkEmbedding.objects.bulk_create(rows, ignore_conflicts=True)
+            staged += len(rows)
+            failed += len(page) - len(rows)
+        
+        if staged:
+            chunks_changed.send(sender=PDFChunk, balance_sheet_id=balance_sheet_id)
+        return staged, failed
+
+
+def promote_staged_embeddings(model, balance_sheet_id=None, page_size=500):
+    """
+    Move staged `model` vectors onto their chunks and drop the staging rows.
+    
+    Only meant for the active model: retrieval already reads these vectors
+    from the staging table, so promoting them changes nothing it returns.
+    Returns the number of chunks updated.
+    """
+    queryset = StagedChunkEmbedding.objects.filter(model=model)
+    if balance_sheet_id is not None:
+        queryset = queryset.filter(chunk__balance_sheet_id=balance_sheet_id)
+    
+    promoted = 0
+    while True:
+        page = list(queryset.order_by('pk').values_list('id', 'chunk_id', 'chunk__balance_sheet_id', 'vector')[:page_size])
+        if not page:
+            break
+        
+        chunks = []
+        for _, chunk_id, _, vector in page:
+            chunk = PDFChunk(id=chunk_id)
+            chunk.set_vector(vector, model)
+            chunks.append(chunk)
+        
+        with transaction.atomic():
+            PDFChunk.objects.bulk_update(chunks, PDFChunk.VECTOR_FIELDS)
+            StagedChunkEmbedding.objects.filter(id__in=[staged_id for staged_id, _, _, _ in page]).delete()
+        promoted += len(chunks)
+        
+        for changed_id in {changed_id for _, _, changed_id, _ in page}:
+            chunks_changed.send(sender=PDFChunk, balance_sheet_id=changed_id)
+    
+    return promoted
+
+
+def enqueue_ingestion(balance_sheet):
+    """Queue a balance sheet for processing by `run_ingestion_worker`."""
+    return IngestionJob.objects.create(balance_sheet=balance_sheet)
+
+
+def enqueue_reembedding(model, balance_sheet_id=None):
+    """Queue a REEMBED job for every balance sheet with stale chunks that has none pending for `model`."""
+    balance_sheet_ids = set(
+        ChunkReembedder(model).stale_chunks(balance_sheet_id)
+        .order_by().values_list('balance_sheet_id', flat=True).distinct()
+    )
+    pending = set(
+        IngestionJob.objects.filter(kind='REEMBED', embedding_model=model, status__in=['QUEUED', 'RUNNING'])
+        .values_list('balance_sheet_id', flat=True)
+    )
+    return IngestionJob.objects.bulk_create([
+        IngestionJob(balance_sheet_id=stale_id, kind='REEMBED', embedding_model=model)
+        for stale_id in sorted(balance_sheet_ids - pending)
+    ])
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def requeue_stale_jobs():
+    """Return RUNNING jobs whose worker died to the queue (or fail them after too many attempts)."""
+    timeout = getattr(settings, 'INGESTION_JOB_TIMEOUT', 3600)
+    max_attempts = getattr(settings, 'INGESTION_MAX_ATTEMPTS', 3)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    
+    stale = IngestionJob.objects.filter(status='RUNNING', started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='FAILED', finished_at=timezone.now(), error='Worker timed out'
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(status='QUEUED', worker='')
+    return requeued, failed
+
+
+def claim_next_job(worker_id):
+    """
+    Atomically claim the oldest queued job.
+    
+    Uses a conditional UPDATE rather than SELECT ... FOR UPDATE so it also
+    works on SQLite; a worker that loses the race simply tries the next row.
+    """
+    for job_id in IngestionJob.objects.filter(status='QUEUED').values_list('id', flat=True)[:10]:
+        claimed = IngestionJob.objects.filter(id=job_id, status='QUEUED').update(
+            status='RUNNING', worker=worker_id, started_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return IngestionJob.objects.select_related('balance_sheet__company').get(id=job_id)
+    return None
+
+
+def owned_job(job):
+    """
+    The job's row, as long as this claim still holds it.
+    
+    requeue_stale_jobs may hand a job to another worker while the first is
+    still running; its claim then no longer matches, so the first worker's
+    writes to the job become no-ops.
+    """
+    return IngestionJob.objects.filter(id=job.id, worker=job.worker, attempts=job.attempts, status='RUNNING')
+
+
+class JobHeartbeat:
+    """
+    Refreshes a running job's started_at from a background thread.
+    
+    requeue_stale_jobs treats started_at older than INGESTION_JOB_TIMEOUT
+    as a dead worker, so without a heartbeat a healthy job that runs
+    longer than that would be claimed a second time.
+    """
+    
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = interval if interval is not None else getattr(settings, 'INGESTION_HEARTBEAT_INTERVAL', 60)
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def __enter__(self):
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name=f'ingestion-heartbeat-{self.job.id}', daemon=True)
+            self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def beat(self):
+        """Refresh started_at; returns False once the job is no longer ours."""
+        return bool(owned_job(self.job).update(started_at=timezone.now()))
+    
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                try:
+                    if not self.beat():
+                        logger.warning("Job %s was reclaimed by another worker", self.job.id)
+                        return
+                except DatabaseError:
+                    # e.g. SQLite busy while the job commits its results; try again next interval
+                    logger.warning("Heartbeat for job %s failed", self.job.id, exc_info=True)
+        finally:
+            # Connections are per thread; don't leak this one
+            connection.close()
+
+
+def _finish_job(job, status, error=''):
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    if not owned_job(job).update(status=status, error=error, finished_at=job.finished_at):
+        logger.warning("Job %s was reclaimed by another worker; not recording its %s outcome", job.id, status)
+
+
+def run_job(job, ingestor=None):
+    """Run one claimed job and record its outcome; returns True on success."""
+    try:
+        with JobHeartbeat(job):
+            if job.kind == 'REEMBED':
+                ChunkReembedder(job.embedding_model).run(job.balance_sheet_id)
+            else:
+                (ingestor or BalanceSheetIngestor()).ingest(job.balance_sheet)
+    except Exception as e:
+        logger.exception("%s job failed for balance sheet %s", job.get_kind_display(), job.balance_sheet_id)
+        _finish_job(job, 'FAILED', str(e))
+        return False
+    
+    _finish_job(job, 'DONE')
+    return True
@@ -0,0 +1,89 @@
+"""
+Management command to convert legacy JSON embeddings into binary float32 vectors.
+Useful for rows written by older code after the data migration has run.
+"""
+from django.core.management.base import BaseCommand
+from apps.balance_sheets.models import PDFChunk
+from apps.balance_sheets.embedding_service import DEFAULT_EMBEDDING_MODEL
+from apps.balance_sheets.fields import to_vector
+from apps.balance_sheets.signals import chunks_changed
+
+
+class Command(BaseCommand):
+    help = 'Convert JSON list embeddings on PDF chunks into the binary vector field'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--balance-sheet-id',
+            type=int,
+            help='Only process chunks for a specific balance sheet',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of chunks to update per query',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Overwrite vectors that already exist',
+        )
+        parser.add_argument(
+            '--clear-json',
+            action='store_true',
+            help='Empty the legacy JSON column once a chunk has been converted',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        update_fields = list(PDFChunk.VECTOR_FIELDS)
+        if options['clear_json']:
+            update_fields.append('embedding')
+
+        queryset = PDFChunk.objects.exclude(embedding=[]).only('id', 'balance_sheet_id', 'embedding')
+
+        if options['balance_sheet_id']:
+            queryset = queryset.filter(balance_sheet_id=options['balance_sheet_id'])
+
+        if not options['force']:
+            queryset = queryset.filter(vector__isnull=True)
+
+        converted_count = 0
+        skipped_count = 0
+        last_pk = 0
+        changed_balance_sheet_ids = set()
+
+        # Page by primary key rather than streaming a cursor, since we write to
+        # the same table while walking it.
+        while True:
+            page = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not page:
+                break
+            last_pk = page[-1].pk
+
+            batch = []
+            for chunk in page:
+                vector = to_vector(chunk.embedding)
+                if vector is None:
+                    skipped_count += 1
+                    continue
+
+                # Legacy JSON vectors predate model switching, so they all came from the default model
+                chunk.set_vector(vector, DEFAULT_EMBEDDING_MODEL)
+                if options['clear_json']:
+                    chunk.embedding = []
+                batch.append(chunk)
+
+            if batch:
+                PDFChunk.objects.bulk_update(batch, update_fields)
+                converted_count += len(batch)
+                changed_balance_sheet_ids.update(chunk.balance_sheet_id for chunk in batch)
+
+        # bulk_update skips post_save; new vectors change what retrieval returns
+        for balance_sheet_id in changed_balance_sheet_ids:
+            chunks_changed.send(sender=PDFChunk, balance_sheet_id=balance_sheet_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Converted {converted_count} embeddings, skipped {skipped_count} unparseable rows'
+        ))
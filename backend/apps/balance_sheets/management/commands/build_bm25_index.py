@@ -0,0 +1,79 @@
+"""
+Management command to build the BM25 inverted index (ChunkTerm postings) for existing PDF chunks.
+New chunks are indexed at ingestion; run this once for chunks created before that.
+Only needed on databases without the SQLite FTS5 table (see fulltext.py).
+Progress is checkpointed per page, so an interrupted run resumes where it stopped.
+"""
+from django.core.management.base import BaseCommand
+from apps.balance_sheets.bm25 import index_chunks
+from apps.balance_sheets.fulltext import fulltext_index
+from apps.balance_sheets.models import BackfillCheckpoint, PDFChunk
+
+
+class Command(BaseCommand):
+    help = 'Build BM25 keyword index postings for PDF chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--balance-sheet-id',
+            type=int,
+            help='Only process chunks for a specific balance sheet',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of chunks to index per transaction',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Reindex every chunk, not only chunks without postings',
+        )
+
+    def handle(self, *args, **options):
+        if fulltext_index.available():
+            self.stdout.write('Keyword search uses the SQLite FTS5 table on this database; no BM25 postings needed.')
+            return
+
+        queryset = PDFChunk.objects.only('id', 'balance_sheet_id', 'content')
+
+        if options['balance_sheet_id']:
+            queryset = queryset.filter(balance_sheet_id=options['balance_sheet_id'])
+
+        if not options['rebuild']:
+            queryset = queryset.filter(token_count=0).exclude(content='')
+
+        checkpoint_name = 'build_bm25_index'
+        if options['balance_sheet_id']:
+            checkpoint_name += f":balance_sheet={options['balance_sheet_id']}"
+        if options['rebuild']:
+            checkpoint_name += ':rebuild'
+
+        checkpoint, _ = BackfillCheckpoint.objects.get_or_create(name=checkpoint_name)
+        last_pk = checkpoint.last_pk
+        if last_pk:
+            self.stdout.write(f'Resuming after chunk {last_pk}')
+
+        indexed_count = 0
+        posting_count = 0
+
+        while True:
+            page = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:options['batch_size']])
+            if not page:
+                break
+            last_pk = page[-1].pk
+
+            posting_count += index_chunks(page)
+            indexed_count += len(page)
+
+            checkpoint.last_pk = last_pk
+            checkpoint.processed += len(page)
+            checkpoint.save(update_fields=['last_pk', 'processed', 'updated_at'])
+
+        # A finished run leaves no checkpoint, so the next one picks up chunks added since
+        checkpoint.delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed_count} chunks ({posting_count} postings)'
+        ))
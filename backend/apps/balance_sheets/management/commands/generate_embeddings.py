@@ -1,10 +1,20 @@
 """
 Management command to generate embeddings for existing PDF chunks.
 Useful for backfilling embeddings after adding RAG support.
+
+Chunks are walked in primary-key pages, so memory stays bounded on any
+table size, and progress is checkpointed after every page: an
+interrupted run resumes where it stopped (use --restart to start over).
 """
+import math
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from apps.balance_sheets.models import PDFChunk
+from django.db import transaction
+from apps.balance_sheets.models import BackfillCheckpoint, PDFChunk
 from apps.balance_sheets.embedding_service import EmbeddingService
+from apps.balance_sheets.embedding_cache import EmbeddingCache
+from apps.balance_sheets.signals import chunks_changed
 from tqdm import tqdm
 
 
@@ -17,61 +27,166 @@ class Command(BaseCommand):
             type=int,
             help='Only process chunks for a specific balance sheet',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Texts per embedding request (defaults to EMBEDDING_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Embedding requests in flight at once (defaults to EMBEDDING_MAX_CONCURRENCY)',
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Bypass the content-hash embedding cache',
+        )
         parser.add_argument(
             '--force',
             action='store_true',
             help='Regenerate embeddings even if they already exist',
         )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the saved checkpoint and start from the first chunk',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many chunks would be embedded without calling the API or writing',
+        )
 
     def handle(self, *args, **options):
-        embedding_service = EmbeddingService()
-        
-        if not embedding_service.client:
-            self.stdout.write(self.style.ERROR('Embedding service not available. Check GEMINI_API_KEY.'))
-            return
-        
-        # Get chunks without embeddings
+        batch_size = options['batch_size'] or getattr(settings, 'EMBEDDING_BATCH_SIZE', 100)
+        workers = options['workers'] or getattr(settings, 'EMBEDDING_MAX_CONCURRENCY', 4)
+        # One page keeps every worker busy with a full request
+        page_size = batch_size * workers
+
         queryset = PDFChunk.objects.all()
-        
+
         if options['balance_sheet_id']:
             queryset = queryset.filter(balance_sheet_id=options['balance_sheet_id'])
-        
+
         if not options['force']:
             # Only chunks without embeddings
-            queryset = queryset.filter(embedding__isnull=True) | queryset.filter(embedding=[])
-        
-        chunks = list(queryset)
-        
-        if not chunks:
+            queryset = queryset.filter(vector__isnull=True)
+
+        checkpoint_name = self._checkpoint_name(options)
+        if options['restart'] and not options['dry_run']:
+            BackfillCheckpoint.objects.filter(name=checkpoint_name).delete()
+        checkpoint = BackfillCheckpoint.objects.filter(name=checkpoint_name).first()
+        last_pk = checkpoint.last_pk if checkpoint and not options['restart'] else 0
+
+        pending = queryset.filter(pk__gt=last_pk)
+        total = pending.count()
+
+        if options['dry_run']:
+            empty = pending.filter(content='').count()
+            resume = f', resuming after chunk {last_pk}' if last_pk else ''
+            self.stdout.write(
+                f'Would embed {total - empty} chunks ({empty} without content skipped) '
+                f'in about {math.ceil((total - empty) / batch_size)} requests, {workers} at a time{resume}.'
+            )
+            return
+
+        embedding_service = EmbeddingService()
+
+        if not embedding_service.client:
+            self.stdout.write(self.style.ERROR('Embedding service not available. Check GEMINI_API_KEY.'))
+            return
+
+        if not total:
+            BackfillCheckpoint.objects.filter(name=checkpoint_name).delete()
             self.stdout.write(self.style.SUCCESS('No chunks need embeddings.'))
             return
-        
-        self.stdout.write(f'Generating embeddings for {len(chunks)} chunks...')
-        
+
+        if last_pk:
+            self.stdout.write(f'Resuming after chunk {last_pk} ({checkpoint.processed} done before)')
+        self.stdout.write(f'Generating embeddings for {total} chunks...')
+
         success_count = 0
         error_count = 0
-        
-        for chunk in tqdm(chunks, desc="Generating embeddings"):
-            try:
+        embedding_cache = None if options['no_cache'] else EmbeddingCache()
+        progress = tqdm(total=total, desc="Generating embeddings")
+
+        while True:
+            # Page by primary key rather than streaming a cursor, since we write to the same table
+            page = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk')
+                .only('id', 'balance_sheet_id', 'content')[:page_size]
+            )
+            if not page:
+                break
+            last_pk = page[-1].pk
+
+            chunks = [chunk for chunk in page if chunk.content]
+            for chunk in page:
                 if not chunk.content:
                     self.stdout.write(self.style.WARNING(f'Chunk {chunk.id} has no content, skipping'))
-                    continue
-                
-                embedding = embedding_service.create_embedding(chunk.content)
-                
-                if embedding:
-                    chunk.embedding = embedding
-                    chunk.save(update_fields=['embedding'])
-                    success_count += 1
+
+            try:
+                embeddings = self._embed([chunk.content for chunk in chunks], embedding_service,
+                                         embedding_cache, batch_size, workers)
+            except Exception as e:
+                embeddings = [[] for _ in chunks]
+                self.stdout.write(self.style.ERROR(f'Error processing chunks {page[0].id}-{page[-1].id}: {str(e)}'))
+
+            embedded = []
+            for chunk, embedding in zip(chunks, embeddings):
+                if len(embedding):
+                    chunk.set_vector(embedding, embedding_service.model)
+                    embedded.append(chunk)
                 else:
-                    error_count += 1
                     self.stdout.write(self.style.WARNING(f'Failed to generate embedding for chunk {chunk.id}'))
-                    
-            except Exception as e:
-                error_count += 1
-                self.stdout.write(self.style.ERROR(f'Error processing chunk {chunk.id}: {str(e)}'))
-        
+
+            page_errors = len(chunks) - len(embedded)
+            with transaction.atomic():
+                PDFChunk.objects.bulk_update(embedded, PDFChunk.VECTOR_FIELDS)
+                self._save_checkpoint(checkpoint_name, last_pk, len(embedded), page_errors)
+
+            # bulk_update skips post_save, so announce the new vectors ourselves
+            for balance_sheet_id in {chunk.balance_sheet_id for chunk in embedded}:
+                chunks_changed.send(sender=PDFChunk, balance_sheet_id=balance_sheet_id)
+
+            success_count += len(embedded)
+            error_count += page_errors
+            progress.update(len(page))
+
+        progress.close()
+        # A finished run leaves no checkpoint, so the next one picks up newly added chunks
+        BackfillCheckpoint.objects.filter(name=checkpoint_name).delete()
+
         self.stdout.write(self.style.SUCCESS(
             f'\nComplete! Generated {success_count} embeddings, {error_count} errors'
         ))
 
+        if embedding_cache:
+            self.stdout.write(
+                f'Embedding cache: {embedding_cache.hits} hits, {embedding_cache.misses} misses '
+                f'({embedding_cache.hit_rate:.1%} hit rate)'
+            )
+
+    def _embed(self, texts, embedding_service, embedding_cache, batch_size, workers):
+        if embedding_cache:
+            return embedding_cache.embed_texts(texts, embedding_service, batch_size=batch_size, max_workers=workers)
+        return embedding_service.create_embeddings_batch(texts, batch_size=batch_size, max_workers=workers)
+
+    def _checkpoint_name(self, options):
+        """Runs with different filters walk different chunk sets, so each keeps its own checkpoint."""
+        name = 'generate_embeddings'
+        if options['balance_sheet_id']:
+            name += f":balance_sheet={options['balance_sheet_id']}"
+        if options['force']:
+            name += ':force'
+        return name
+
+    def _save_checkpoint(self, name, last_pk, processed, failed):
+        checkpoint, _ = BackfillCheckpoint.objects.get_or_create(name=name)
+        checkpoint.last_pk = last_pk
+        checkpoint.processed += processed
+        checkpoint.failed += failed
+        checkpoint.save()
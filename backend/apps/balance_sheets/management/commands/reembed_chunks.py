@@ -0,0 +1,72 @@
+"""
+Management command to move PDF chunks to another embedding model without downtime.
+
+1. `reembed_chunks --model NEW` queues background jobs (processed by
+   run_ingestion_worker) that stage NEW vectors for every chunk; rerun it
+   until no stale chunks remain. Retrieval keeps using the current model.
+2. Set EMBEDDING_MODEL=NEW and restart: that is the cutover, since the
+   vector index already reads staged vectors of the active model.
+3. `reembed_chunks --promote` moves the staged vectors onto the chunks.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.balance_sheets.embedding_service import active_embedding_model
+from apps.balance_sheets.ingestion import ChunkReembedder, enqueue_reembedding, promote_staged_embeddings
+from apps.balance_sheets.models import StagedChunkEmbedding
+
+
+class Command(BaseCommand):
+    help = 'Re-embed PDF chunks with another embedding model in the background, then promote the vectors'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            default=None,
+            help='Target embedding model (defaults to the active EMBEDDING_MODEL)',
+        )
+        parser.add_argument(
+            '--balance-sheet-id',
+            type=int,
+            help='Only process chunks for a specific balance sheet',
+        )
+        parser.add_argument(
+            '--now',
+            action='store_true',
+            help='Embed in this process instead of queueing jobs for run_ingestion_worker',
+        )
+        parser.add_argument(
+            '--promote',
+            action='store_true',
+            help='Move staged vectors of the active model onto their chunks',
+        )
+
+    def handle(self, *args, **options):
+        active_model = active_embedding_model()
+        model = options['model'] or active_model
+        balance_sheet_id = options['balance_sheet_id']
+
+        if options['promote']:
+            if model != active_model:
+                raise CommandError(
+                    f'Only the active model ({active_model}) can be promoted; switch EMBEDDING_MODEL to {model} first.'
+                )
+            promoted = promote_staged_embeddings(model, balance_sheet_id)
+            self.stdout.write(self.style.SUCCESS(f'Promoted {promoted} staged {model} vectors'))
+            return
+
+        reembedder = ChunkReembedder(model)
+        stale = reembedder.stale_chunks(balance_sheet_id)
+        staged = StagedChunkEmbedding.objects.filter(model=model)
+        if balance_sheet_id:
+            staged = staged.filter(chunk__balance_sheet_id=balance_sheet_id)
+        self.stdout.write(f'{model}: {stale.count()} chunks stale, {staged.count()} staged (active model: {active_model})')
+
+        if options['now']:
+            balance_sheet_ids = stale.order_by().values_list('balance_sheet_id', flat=True).distinct()
+            for stale_id in list(balance_sheet_ids):
+                staged_count, failed_count = reembedder.run(stale_id)
+                self.stdout.write(f'Balance sheet {stale_id}: staged {staged_count}, failed {failed_count}')
+            self.stdout.write(self.style.SUCCESS('Re-embedding complete'))
+            return
+
+        jobs = enqueue_reembedding(model, balance_sheet_id)
+        self.stdout.write(self.style.SUCCESS(f'Queued {len(jobs)} re-embedding jobs for run_ingestion_worker'))
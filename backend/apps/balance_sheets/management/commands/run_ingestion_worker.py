@@ -0,0 +1,64 @@
+"""
+Management command that processes queued balance sheet uploads.
+Run one or more of these alongside the web server; no external broker is needed.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.balance_sheets.ingestion import claim_next_job, default_worker_id, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued balance sheet ingestion and re-embedding jobs (extraction, chunking, embeddings)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit instead of polling forever',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'INGESTION_POLL_INTERVAL', 5),
+            help='Seconds to sleep when the queue is empty',
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            default=None,
+            help='Exit after processing this many jobs',
+        )
+
+    def handle(self, *args, **options):
+        worker_id = default_worker_id()
+        processed = 0
+
+        self.stdout.write(f'Ingestion worker {worker_id} started')
+
+        while True:
+            requeued, failed = requeue_stale_jobs()
+            if requeued or failed:
+                self.stdout.write(self.style.WARNING(f'Recovered stale jobs: {requeued} requeued, {failed} failed'))
+
+            job = claim_next_job(worker_id)
+
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'{job.get_kind_display()}: balance sheet {job.balance_sheet_id} (attempt {job.attempts})')
+
+            if run_job(job):
+                self.stdout.write(self.style.SUCCESS(f'Balance sheet {job.balance_sheet_id} completed'))
+            else:
+                self.stdout.write(self.style.ERROR(f'Balance sheet {job.balance_sheet_id} failed: {job.error}'))
+
+            processed += 1
+            if options['max_jobs'] and processed >= options['max_jobs']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs'))
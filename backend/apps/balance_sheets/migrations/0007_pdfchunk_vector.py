@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:12
+
+import apps.balance_sheets.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('balance_sheets', '0006_pdfchunk_embedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='vector',
+            field=apps.balance_sheets.fields.VectorField(blank=True, help_text='Float32 embedding vector for semantic search (RAG)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='pdfchunk',
+            name='embedding',
+            field=models.JSONField(blank=True, default=list, help_text="Legacy JSON embedding (superseded by 'vector')"),
+        ),
+    ]
@@ -0,0 +1,53 @@
+import numpy as np
+from django.db import migrations
+
+
+def json_embedding_to_bytes(value):
+    """
+    Little-endian float32 bytes of a JSON embedding (flat or nested list),
+    or None. A frozen copy of the conversion at the time of this migration,
+    so later changes to apps.balance_sheets.fields cannot change its output.
+    """
+    if not isinstance(value, (list, tuple)) or not value:
+        return None
+    if isinstance(value[0], (list, tuple)):
+        value = [x for sublist in value for x in sublist]
+    try:
+        vector = np.asarray(value, dtype='<f4')
+    except (TypeError, ValueError):
+        return None
+    return vector.tobytes() if vector.size else None
+
+
+def convert_json_embeddings(apps, schema_editor):
+    """Copy legacy JSON embeddings into the binary float32 vector column."""
+    PDFChunk = apps.get_model('balance_sheets', 'PDFChunk')
+    queryset = PDFChunk.objects.filter(vector__isnull=True).exclude(embedding=[]).only('id', 'embedding')
+
+    last_pk = 0
+    while True:
+        page = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:500])
+        if not page:
+            break
+        last_pk = page[-1].pk
+
+        batch = []
+        for chunk in page:
+            vector = json_embedding_to_bytes(chunk.embedding)
+            if vector is not None:
+                chunk.vector = vector
+                batch.append(chunk)
+
+        if batch:
+            PDFChunk.objects.bulk_update(batch, ['vector'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('balance_sheets', '0007_pdfchunk_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_json_embeddings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:15
+
+import apps.balance_sheets.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('balance_sheets', '0008_convert_json_embeddings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the normalized chunk text', max_length=64)),
+                ('model', models.CharField(help_text='Embedding model that produced the vector', max_length=100)),
+                ('vector', apps.balance_sheets.fields.VectorField()),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Embedding Cache Entries',
+                'unique_together': {('content_hash', 'model')},
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:41
+
+import apps.balance_sheets.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def label_existing_vectors(apps, schema_editor):
+    """Every vector stored so far came from text-embedding-004; record it with its dimension."""
+    PDFChunk = apps.get_model('balance_sheets', 'PDFChunk')
+    queryset = PDFChunk.objects.filter(vector__isnull=False).only('id', 'vector')
+
+    last_pk = 0
+    while True:
+        page = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:500])
+        if not page:
+            break
+        last_pk = page[-1].pk
+
+        for chunk in page:
+            chunk.embedding_model = 'text-embedding-004'
+            chunk.embedding_dim = len(chunk.vector)
+        PDFChunk.objects.bulk_update(page, ['embedding_model', 'embedding_dim'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('balance_sheets', '0011_backfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StagedChunkEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('embedding_dim', models.PositiveIntegerField()),
+                ('vector', apps.balance_sheets.fields.VectorField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='embedding_model',
+            field=models.CharField(blank=True, help_text='Target model of a REEMBED job', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='kind',
+            field=models.CharField(choices=[('INGEST', 'Ingest upload'), ('REEMBED', 'Re-embed chunks')], default='INGEST', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='embedding_dim',
+            field=models.PositiveIntegerField(blank=True, help_text="Dimension of 'vector'", null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='embedding_model',
+            field=models.CharField(blank=True, default='', help_text="Embedding model that produced 'vector'", max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='pdfchunk',
+            index=models.Index(fields=['balance_sheet', 'embedding_model'], name='balance_she_balance_0ffaf7_idx'),
+        ),
+        migrations.AddField(
+            model_name='stagedchunkembedding',
+            name='chunk',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='staged_embeddings', to='balance_sheets.pdfchunk'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='stagedchunkembedding',
+            unique_together={('chunk', 'model')},
+        ),
+        migrations.RunPython(label_existing_vectors, migrations.RunPython.noop),
+    ]
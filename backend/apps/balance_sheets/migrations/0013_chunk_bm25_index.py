@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('balance_sheets', '0012_embedding_model_versioning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='token_count',
+            field=models.PositiveIntegerField(default=0, help_text="Indexed terms in 'content' (BM25 document length)"),
+        ),
+        migrations.CreateModel(
+            name='ChunkTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('tf', models.PositiveIntegerField(help_text='Occurrences of the term in the chunk')),
+                ('balance_sheet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunk_terms', to='balance_sheets.balancesheet')),
+                ('chunk', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='balance_sheets.pdfchunk')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'balance_sheet'], name='balance_she_term_d909d1_idx')],
+            },
+        ),
+    ]
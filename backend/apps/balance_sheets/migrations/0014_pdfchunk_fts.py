@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from apps.balance_sheets.fulltext import install, uninstall
+
+
+def create_fts_index(apps, schema_editor):
+    """FTS5 mirror of PDFChunk text, kept in sync by triggers. SQLite only; a no-op elsewhere."""
+    install(schema_editor.connection)
+
+
+def drop_fts_index(apps, schema_editor):
+    uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('balance_sheets', '0013_chunk_bm25_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
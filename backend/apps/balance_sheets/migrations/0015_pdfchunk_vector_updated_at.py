@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('balance_sheets', '0014_pdfchunk_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='vector_updated_at',
+            field=models.DateTimeField(blank=True, help_text="When 'vector' was last written", null=True),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from .fields import VectorField
 # NOTE: Ensure 'apps.companies' exists and has a 'Company' model.
 
 
@@ -132,7 +134,12 @@ class PDFChunk(models.Model):
     content_summary = models.TextField(blank=True, help_text="Brief summary of chunk content")
     
     # ⭐ NEW FIELD FOR RAG: Storing the embedding vector
-    embedding = models.JSONField(default=list, blank=True, help_text="Vector embedding for semantic search (RAG)") 
+    embedding = models.JSONField(default=list, blank=True, help_text="Legacy JSON embedding (superseded by 'vector')") 
+    vector = VectorField(null=True, blank=True, help_text="Float32 embedding vector for semantic search (RAG)")
+    embedding_model = models.CharField(max_length=100, blank=True, default='', help_text="Embedding model that produced 'vector'")
+    embedding_dim = models.PositiveIntegerField(null=True, blank=True, help_text="Dimension of 'vector'")
+    vector_updated_at = models.DateTimeField(null=True, blank=True, help_text="When 'vector' was last written")
+    token_count = models.PositiveIntegerField(default=0, help_text="Indexed terms in 'content' (BM25 document length)")
     
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -142,13 +149,15 @@ class PDFChunk(models.Model):
         indexes = [
             models.Index(fields=['balance_sheet', 'section_type']),
             models.Index(fields=['balance_sheet', 'start_page']),
+            models.Index(fields=['balance_sheet', 'embedding_model']),
         ]
     
     def __str__(self):
         title = self.source_title[:30] if self.source_title else self.section_type
         return f"{self.balance_sheet.company.name} - {title} (Page {self.page_num})"
     
-    def save(self, *args, **kwargs):
+    def fill_page_defaults(self):
+        """Derive page_range and page_num from start/end pages (bulk_create skips save())."""
         # Auto-generate page_range if not provided
         if not self.page_range:
             if self.start_page == self.end_page:
@@ -158,4 +167,141 @@ class PDFChunk(models.Model):
         # Ensure page_num is set
         if not self.page_num:
             self.page_num = self.start_page
-        super().save(*args, **kwargs)
\ No newline at end of file
+    
+    # Written together by set_vector; pass to bulk_update after set_vector
+    VECTOR_FIELDS = ['vector', 'embedding_model', 'embedding_dim', 'vector_updated_at']
+    
+    def set_vector(self, vector, model):
+        """Store an embedding together with the model and dimension that describe it."""
+        self.vector = vector
+        self.embedding_model = model
+        self.embedding_dim = len(vector)
+        # Vector index fingerprints include the latest of these, so in-place rewrites reach other processes
+        self.vector_updated_at = timezone.now()
+    
+    def save(self, *args, **kwargs):
+        self.fill_page_defaults()
+        super().save(*args, **kwargs)
+
+
+class ChunkTerm(models.Model):
+    """BM25 inverted index posting: how often a term occurs in a chunk"""
+    
+    term = models.CharField(max_length=64)
+    chunk = models.ForeignKey(
+        PDFChunk,
+        on_delete=models.CASCADE,
+        related_name='terms'
+    )
+    # Denormalized from the chunk so postings can be filtered without a join
+    balance_sheet = models.ForeignKey(
+        BalanceSheet,
+        on_delete=models.CASCADE,
+        related_name='chunk_terms'
+    )
+    tf = models.PositiveIntegerField(help_text="Occurrences of the term in the chunk")
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'balance_sheet']),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} in chunk {self.chunk_id} ({self.tf})"
+
+
+class StagedChunkEmbedding(models.Model):
+    """
+    A chunk's vector from an embedding model that is not (yet) the active one.
+    
+    Re-embedding jobs fill this table while retrieval keeps serving the
+    chunks' current vectors; the vector index reads the active model's
+    vectors from both places, so switching settings.EMBEDDING_MODEL is the
+    whole cutover. `reembed_chunks --promote` later moves them into PDFChunk.
+    """
+    
+    chunk = models.ForeignKey(
+        PDFChunk,
+        on_delete=models.CASCADE,
+        related_name='staged_embeddings'
+    )
+    model = models.CharField(max_length=100)
+    embedding_dim = models.PositiveIntegerField()
+    vector = VectorField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['chunk', 'model']
+    
+    def __str__(self):
+        return f"{self.model} - chunk {self.chunk_id}"
+
+class EmbeddingCacheEntry(models.Model):
+    """Embedding vectors cached by normalized-content hash so identical text is embedded once"""
+    
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 of the normalized chunk text")
+    model = models.CharField(max_length=100, help_text="Embedding model that produced the vector")
+    vector = VectorField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name_plural = "Embedding Cache Entries"
+        unique_together = ['content_hash', 'model']
+    
+    def __str__(self):
+        return f"{self.model} - {self.content_hash[:12]}"
+
+
+class IngestionJob(models.Model):
+    """DB-backed queue entry for background balance sheet extraction and RAG indexing"""
+    
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    KIND_CHOICES = [
+        ('INGEST', 'Ingest upload'),
+        ('REEMBED', 'Re-embed chunks'),
+    ]
+    
+    balance_sheet = models.ForeignKey(
+        BalanceSheet,
+        on_delete=models.CASCADE,
+        related_name='ingestion_jobs'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='INGEST')
+    embedding_model = models.CharField(max_length=100, blank=True, help_text="Target model of a REEMBED job")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, help_text="Identifier of the worker holding the job")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.balance_sheet} - {self.status}"
+
+
+class BackfillCheckpoint(models.Model):
+    """Progress of a resumable backfill command: the last primary key it finished"""
+    
+    name = models.CharField(max_length=200, unique=True, help_text="Command and options the progress belongs to")
+    last_pk = models.BigIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_pk}"
@@ -216,11 +216,12 @@
 
 
 """PDF Chunking system matching the working hello.py approach."""
+from concurrent.futures import ProcessPoolExecutor
 from django.conf import settings
-from io import BytesIO
 import json
 import re
 import os
+from .pdf_document import ParsedDocument, open_fitz_source
 
 # Use PyMuPDF (fitz) for better table extraction
 try:
@@ -277,53 +278,69 @@ class PDFChunker:
         # Strategy1: Strict note splitting - only numbered notes
         self.note_pattern = r'\n+(?:Note|Notes)\s+(\d+)[:\.\-\s]'
 
-    def extract_tables_and_text(self, pdf_file):
-        """Extracts content (tables as Markdown, and text) with page numbers using PyMuPDF."""
-        pdf_file.seek(0)
+    def extract_tables_and_text(self, pdf_file, workers=None, document=None):
+        """
+        Extracts content (tables as Markdown, and text) with page numbers using PyMuPDF.
+
+        Large documents are split into contiguous page ranges extracted by a
+        process pool (see PDF_EXTRACTION_WORKERS); the ordered
+        (content, page_num, block_type) list is identical to a serial run.
+        Pass a ParsedDocument to reuse its bytes and cache the blocks on it.
+        """
+        if document is None:
+            with ParsedDocument.from_file(pdf_file) as document:
+                return self.extract_tables_and_text(pdf_file, workers, document)
+
+        if document.content_blocks is None:
+            document.content_blocks = self._extract_content_blocks(document, workers)
+        return document.content_blocks
+
+    def _extract_content_blocks(self, document, workers=None):
         content_list = []
 
         # Use PyMuPDF if available, otherwise fallback to pdfplumber
         if fitz:
             try:
-                pdf_bytes = pdf_file.read()
-                doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-
-                for page_num, page in enumerate(doc, 1):
-                    text = page.get_text()
-                    table_match = re.search(r"The following table:\n", text, re.IGNORECASE)
-
-                    if table_match:
-                        narrative_content = text[:table_match.start()]
-                        if narrative_content.strip():
-                            content_list.append((narrative_content, page_num, 'Narrative_Text'))
-
-                        table_content = text[table_match.start():]
-                        content_list.append((table_content, page_num, 'Raw_Table'))
-                    else:
-                        if text.strip():
-                            content_list.append((text, page_num, 'Narrative_Text'))
-
-                doc.close()
-                pdf_file.seek(0)
+                doc = document.open_fitz()
+                page_count = doc.page_count
+
+                workers = self._extraction_workers(page_count, workers)
+                if workers > 1:
+                    doc.close()
+                    content_list = _extract_pages_parallel(document.source, page_count, workers)
+                else:
+                    for page_num, page in enumerate(doc, 1):
+                        content_list.extend(_page_blocks(page.get_text(), page_num))
+                    doc.close()
+
                 return content_list
 
             except Exception:
-                pass
+                content_list = []
 
-        # Fallback to pdfplumber
+        # Fallback to pdfplumber (text already parsed for the extractor is reused)
         try:
-            import pdfplumber
-            pdf_file.seek(0)
-            with pdfplumber.open(BytesIO(pdf_file.read())) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    text = page.extract_text()
-                    if text:
-                        content_list.append((text, page_num, 'Narrative_Text'))
-            pdf_file.seek(0)
+            for page_num in document.page_numbers:
+                text = document.page_text(page_num)
+                if text:
+                    content_list.append((text, page_num, 'Narrative_Text'))
             return content_list
         except Exception:
             return []
 
+    def _extraction_workers(self, page_count, workers=None):
+        """Number of extraction processes to use for a document of page_count pages."""
+        min_pages = getattr(settings, 'PDF_PARALLEL_MIN_PAGES', 50)
+        if page_count < min_pages:
+            return 1
+
+        if workers is None:
+            workers = getattr(settings, 'PDF_EXTRACTION_WORKERS', 0)
+        if not workers:
+            workers = os.cpu_count() or 1
+
+        return max(1, min(workers, page_count))
+
     def create_intelligent_chunks(self, content_blocks, company_id, balance_sheet_id):
         """
         Strategy1: Enhanced Regex chunking with smart splitting and grouping.
@@ -497,9 +514,9 @@ class PDFChunker:
 
         return chunks
 
-    def process_pdf(self, pdf_file, balance_sheet):
+    def process_pdf(self, pdf_file, balance_sheet, document=None):
         """Main processing function: Extract → Chunk."""
-        content_blocks = self.extract_tables_and_text(pdf_file)
+        content_blocks = self.extract_tables_and_text(pdf_file, document=document)
 
         if not content_blocks:
             return []
@@ -520,4 +537,62 @@ class PDFChunker:
 
     def extract_structured_data_from_chunk(self, chunk_content, section_type):
         """Placeholder for structured data extraction"""
-        return {}
\ No newline at end of file
+        return {}
+
+
+def _page_blocks(text, page_num):
+    """Split one page's text into narrative and raw-table blocks."""
+    blocks = []
+    table_match = re.search(r"The following table:\n", text, re.IGNORECASE)
+
+    if table_match:
+        narrative_content = text[:table_match.start()]
+        if narrative_content.strip():
+            blocks.append((narrative_content, page_num, 'Narrative_Text'))
+
+        table_content = text[table_match.start():]
+        blocks.append((table_content, page_num, 'Raw_Table'))
+    else:
+        if text.strip():
+            blocks.append((text, page_num, 'Narrative_Text'))
+
+    return blocks
+
+
+# Per-process state for the extraction pool: each worker opens the document once.
+_worker_doc = None
+
+
+def _init_extraction_worker(source):
+    global _worker_doc
+    _worker_doc = open_fitz_source(source)
+
+
+def _extract_page_range(page_range):
+    """Extract blocks for pages [start, end) of the worker's document (0-based indices)."""
+    start, end = page_range
+    blocks = []
+    for index in range(start, end):
+        blocks.extend(_page_blocks(_worker_doc.load_page(index).get_text(), index + 1))
+    return blocks
+
+
+def _extract_pages_parallel(source, page_count, workers):
+    """
+    Extract all pages with a process pool, reassembling blocks in page order.
+
+    `source` is a file path (each worker pages it from disk) or PDF bytes.
+    """
+    slice_size = -(-page_count // workers)
+    ranges = [(start, min(start + slice_size, page_count)) for start in range(0, page_count, slice_size)]
+
+    content_list = []
+    with ProcessPoolExecutor(
+        max_workers=len(ranges),
+        initializer=_init_extraction_worker,
+        initargs=(source,),
+    ) as executor:
+        for blocks in executor.map(_extract_page_range, ranges):
+            content_list.extend(blocks)
+
+    return content_list
@@ -0,0 +1,141 @@
+"""Parsed PDF shared by the extractor, fallback processor and chunker for one upload."""
+import mmap
+import os
+from io import BytesIO
+
+import pdfplumber
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+
+def local_path(pdf_file):
+    """
+    Filesystem path behind a FieldFile or open file, or None.
+
+    Storage backends without local files (S3 etc.) raise NotImplementedError
+    from `.path`; those uploads are streamed into memory instead.
+    """
+    try:
+        path = pdf_file.path
+    except (AttributeError, NotImplementedError, ValueError):
+        path = getattr(pdf_file, 'name', None)
+        if not (isinstance(path, str) and os.path.isabs(path)):
+            return None
+    return path if path and os.path.isfile(path) else None
+
+
+class ParsedDocument:
+    """
+    A PDF opened once and parsed lazily, with per-page results cached.
+
+    pdfplumber page text and tables are extracted at most once and shared
+    by GeminiPDFExtractor and PDFProcessor; PDFChunker stores its PyMuPDF
+    content blocks in `content_blocks`. Pass the same instance to every
+    stage of an ingestion so the file is never re-read or re-parsed.
+
+    Files on local disk are never loaded whole: pdfplumber reads pages
+    on demand from a read-only mmap and PyMuPDF opens the path directly.
+    Only non-local storage falls back to reading the upload into memory.
+    """
+
+    def __init__(self, pdf_bytes=None, path=None):
+        if pdf_bytes is None and path is None:
+            raise ValueError("ParsedDocument needs either pdf_bytes or path")
+        self.path = path
+        self._pdf_bytes = pdf_bytes
+        self.content_blocks = None
+        self._file = None
+        self._mmap = None
+        self._plumber = None
+        self._texts = {}
+        self._tables = {}
+
+    @classmethod
+    def from_file(cls, pdf_file):
+        path = local_path(pdf_file)
+        if path:
+            return cls(path=path)
+
+        pdf_file.seek(0)
+        pdf_bytes = pdf_file.read()
+        pdf_file.seek(0)
+        return cls(pdf_bytes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def buffer(self):
+        """Read-only view of the PDF: an mmap for local files, otherwise the in-memory bytes."""
+        if self._pdf_bytes is not None:
+            return self._pdf_bytes
+        if self._mmap is None:
+            self._file = open(self.path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    @property
+    def pdf_bytes(self):
+        """The PDF as bytes; copies local files into memory, so prefer `buffer`/`open_fitz`."""
+        if self._pdf_bytes is not None:
+            return self._pdf_bytes
+        return bytes(self.buffer)
+
+    @property
+    def source(self):
+        """What a separate process needs to reopen the document: its path, or its bytes."""
+        return self.path if self.path else self._pdf_bytes
+
+    def open_fitz(self):
+        return open_fitz_source(self.source)
+
+    @property
+    def plumber(self):
+        if self._plumber is None:
+            buffer = self.buffer
+            self._plumber = pdfplumber.open(buffer if isinstance(buffer, mmap.mmap) else BytesIO(buffer))
+        return self._plumber
+
+    @property
+    def page_count(self):
+        return len(self.plumber.pages)
+
+    @property
+    def page_numbers(self):
+        return range(1, self.page_count + 1)
+
+    def page_text(self, page_num):
+        """pdfplumber text of a 1-based page (None if the page has no text)."""
+        if page_num not in self._texts:
+            self._texts[page_num] = self.plumber.pages[page_num - 1].extract_text()
+        return self._texts[page_num]
+
+    def page_tables(self, page_num):
+        """pdfplumber tables of a 1-based page."""
+        if page_num not in self._tables:
+            self._tables[page_num] = self.plumber.pages[page_num - 1].extract_tables() or []
+        return self._tables[page_num]
+
+
+def open_fitz_source(source):
+    """Open a PyMuPDF document from a path (paged from disk) or from bytes."""
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
@@ -1,8 +1,7 @@
-import pdfplumber
 import google.generativeai as genai
 from django.conf import settings
-from io import BytesIO
 import json
+from .pdf_document import ParsedDocument
 
 
 class PDFProcessor:
@@ -13,33 +12,36 @@ class PDFProcessor:
         else:
             self.model = None
     
-    def extract_text_and_tables(self, pdf_file):
-        """Extract text and tables from PDF using pdfplumber"""
+    def extract_text_and_tables(self, pdf_file, document=None):
+        """Extract text and tables from PDF using pdfplumber (reusing a ParsedDocument if given)"""
         text_content = []
         tables_content = []
         
-        with pdfplumber.open(BytesIO(pdf_file.read())) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                # Extract text
-                text = page.extract_text()
-                if text:
-                    text_content.append(f"Page {page_num}:\n{text}\n")
-                
-                # Extract tables
-                tables = page.extract_tables()
-                if tables:
-                    for table_num, table in enumerate(tables, 1):
-                        tables_content.append({
-                            'page': page_num,
-                            'table': table_num,
-                            'data': table
-                        })
+        if document is None:
+            with ParsedDocument.from_file(pdf_file) as document:
+                return self.extract_text_and_tables(pdf_file, document)
+        
+        for page_num in document.page_numbers:
+            # Extract text
+            text = document.page_text(page_num)
+            if text:
+                text_content.append(f"Page {page_num}:\n{text}\n")
+            
+            # Extract tables
+            tables = document.page_tables(page_num)
+            if tables:
+                for table_num, table in enumerate(tables, 1):
+                    tables_content.append({
+                        'page': page_num,
+                        'table': table_num,
+                        'data': table
+                    })
         
         return '\n'.join(text_content), tables_content
     
-    def extract_financial_data(self, pdf_file):
+    def extract_financial_data(self, pdf_file, document=None):
         """Extract financial data from balance sheet, P&L, and cash flow PDF"""
-        text, tables = self.extract_text_and_tables(pdf_file)
+        text, tables = self.extract_text_and_tables(pdf_file, document)
         
         # Initialize full set of financial fields
         financial_data = {
@@ -0,0 +1,141 @@
+"""Process-wide TTL/LRU cache of query embeddings, optionally backed by Django's cache."""
+import hashlib
+import re
+from threading import Lock
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import caches
+
+from .fields import VECTOR_DTYPE, to_vector
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(query: str) -> str:
+    return _WHITESPACE.sub(' ', (query or '').lower()).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded, TTL-aware cache of query vectors keyed by (model, normalized query).
+
+    The in-process TTLCache is shared by every request in a worker. When
+    QUERY_EMBEDDING_CACHE_ALIAS names a Django cache (e.g. Redis/Memcached),
+    vectors are also stored there so all gunicorn workers share them.
+    """
+
+    def __init__(self, maxsize: int = None, ttl: int = None, cache_alias: Optional[str] = None):
+        self.maxsize = maxsize or getattr(settings, 'QUERY_EMBEDDING_CACHE_SIZE', 1024)
+        self.ttl = ttl or getattr(settings, 'QUERY_EMBEDDING_CACHE_TTL', 3600)
+        self.cache_alias = cache_alias if cache_alias is not None else getattr(
+            settings, 'QUERY_EMBEDDING_CACHE_ALIAS', None
+        )
+        self._local = TTLCache(maxsize=self.maxsize, ttl=self.ttl)
+        self._lock = Lock()
+
+    def _key(self, query: str, model: str) -> str:
+        digest = hashlib.sha256(normalize_query(query).encode('utf-8')).hexdigest()
+        return f"query-embedding:{model}:{digest}"
+
+    @property
+    def _shared(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def get(self, query: str, model: str) -> Optional[np.ndarray]:
+        key = self._key(query, model)
+
+        with self._lock:
+            vector = self._local.get(key)
+        if vector is not None:
+            return vector
+
+        shared = self._shared
+        if shared is not None:
+            raw = shared.get(key)
+            vector = to_vector(raw) if raw else None
+            if vector is not None:
+                with self._lock:
+                    self._local[key] = vector
+                return vector
+
+        return None
+
+    def set(self, query: str, model: str, vector) -> None:
+        vector = to_vector(vector)
+        if vector is None:
+            return
+
+        key = self._key(query, model)
+        with self._lock:
+            self._local[key] = vector
+
+        shared = self._shared
+        if shared is not None:
+            shared.set(key, vector.astype(VECTOR_DTYPE, copy=False).tobytes(), timeout=self.ttl)
+
+    def get_or_create(self, query: str, model: str, embed: Callable[[str], list]) -> Optional[np.ndarray]:
+        """Return the cached vector for a query, embedding and caching it on a miss."""
+        vector = self.get(query, model)
+        if vector is not None:
+            return vector
+
+        vector = to_vector(embed(query))
+        if vector is not None:
+            self.set(query, model, vector)
+        return vector
+
+    async def aget(self, query: str, model: str) -> Optional[np.ndarray]:
+        """Async get: the shared cache is read with the cache backend's async API."""
+        key = self._key(query, model)
+
+        with self._lock:
+            vector = self._local.get(key)
+        if vector is not None:
+            return vector
+
+        shared = self._shared
+        if shared is not None:
+            raw = await shared.aget(key)
+            vector = to_vector(raw) if raw else None
+            if vector is not None:
+                with self._lock:
+                    self._local[key] = vector
+                return vector
+
+        return None
+
+    async def aset(self, query: str, model: str, vector) -> None:
+        vector = to_vector(vector)
+        if vector is None:
+            return
+
+        key = self._key(query, model)
+        with self._lock:
+            self._local[key] = vector
+
+        shared = self._shared
+        if shared is not None:
+            await shared.aset(key, vector.astype(VECTOR_DTYPE, copy=False).tobytes(), timeout=self.ttl)
+
+    async def aget_or_create(self, query: str, model: str,
+                             aembed: Callable[[str], Awaitable[list]]) -> Optional[np.ndarray]:
+        """Async get_or_create; `aembed` is a coroutine function such as EmbeddingService.acreate_embedding."""
+        vector = await self.aget(query, model)
+        if vector is not None:
+            return vector
+
+        vector = to_vector(await aembed(query))
+        if vector is not None:
+            await self.aset(query, model, vector)
+        return vector
+
+    def clear(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+
+# Shared by every ChunkRetriever in this worker process.
+query_embedding_cache = QueryEmbeddingCache()
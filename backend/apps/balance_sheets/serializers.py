@@ -38,5 +38,6 @@ class BalanceSheetUploadSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = BalanceSheet
-        fields = ['company_id', 'pdf_file', 'year', 'quarter']
+        fields = ['id', 'company_id', 'pdf_file', 'year', 'quarter', 'extraction_status']
+        read_only_fields = ['extraction_status']
 
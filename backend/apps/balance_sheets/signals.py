@@ -0,0 +1,63 @@
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import Signal, receiver
+from .analytics_cache import analytics_cache
+from .bm25 import index_chunks
+from .fulltext import FULLTEXT_MIGRATION, fulltext_index, install as install_fulltext_index
+from .models import BalanceSheet, FinancialData, PDFChunk
+from .vector_index import vector_index
+
+# Sent with balance_sheet_id after bulk chunk writes, which skip post_save/post_delete.
+chunks_changed = Signal()
+
+
+@receiver(post_save, sender=PDFChunk)
+@receiver(post_delete, sender=PDFChunk)
+def invalidate_vector_index(sender, instance, **kwargs):
+    """Drop the in-memory vector shard of a balance sheet whose chunks changed."""
+    vector_index.invalidate(instance.balance_sheet_id)
+
+
+@receiver(post_save, sender=PDFChunk)
+def reindex_chunk_terms(sender, instance, update_fields=None, **kwargs):
+    """Keep the BM25 postings of a chunk saved one at a time (e.g. in the admin) in step with its content."""
+    if update_fields is not None and 'content' not in update_fields:
+        return
+    # With an FTS5 table its triggers keep keyword search current and the postings are never read
+    if not fulltext_index.available():
+        index_chunks([instance])
+
+
+@receiver(post_migrate)
+def restore_fulltext_index(sender, app_config, using, **kwargs):
+    """Re-create the FTS triggers after a migration rebuilt the chunk table, which drops them on SQLite."""
+    if app_config.label != 'balance_sheets':
+        return
+    connection = connections[using]
+    if ('balance_sheets', FULLTEXT_MIGRATION) in MigrationRecorder(connection).applied_migrations():
+        install_fulltext_index(connection)
+
+
+@receiver(chunks_changed)
+def invalidate_vector_index_after_bulk_write(sender, balance_sheet_id, **kwargs):
+    vector_index.invalidate(balance_sheet_id)
+
+
+@receiver(post_save, sender=BalanceSheet)
+@receiver(post_delete, sender=BalanceSheet)
+def invalidate_company_analytics(sender, instance, **kwargs):
+    """Expire cached analytics summaries of the company whose sheets changed."""
+    analytics_cache.bump(instance.company_id)
+
+
+@receiver(post_save, sender=FinancialData)
+@receiver(post_delete, sender=FinancialData)
+def invalidate_financial_data_analytics(sender, instance, **kwargs):
+    """Expire cached analytics summaries of the company owning this financial data."""
+    try:
+        company_id = instance.balance_sheet.company_id
+    except BalanceSheet.DoesNotExist:
+        # Cascade-deleted with its balance sheet, whose own signal already bumped.
+        return
+    analytics_cache.bump(company_id)
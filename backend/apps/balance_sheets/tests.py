@@ -1,3 +1,600 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from importlib import import_module
+from datetime import timedelta
+from io import StringIO
+from threading import Lock
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.companies.models import Company, CompanyAccess
+from apps.users.models import User
+from .analytics import FinancialFrame, Period, analyze_periods
+from .embedding_cache import EmbeddingCache
+from .embedding_scheduler import EmbeddingScheduler, TokenBucket
+from .bm25 import bm25_index, index_chunks
+from .embedding_service import EmbeddingService
+from .fulltext import fulltext_index
+from .ingestion import (
+    BalanceSheetIngestor, ChunkReembedder, claim_next_job, enqueue_ingestion, promote_staged_embeddings,
+    requeue_stale_jobs, run_job,
+)
+from .models import BackfillCheckpoint, BalanceSheet, ChunkTerm, EmbeddingCacheEntry, FinancialData, IngestionJob, PDFChunk, StagedChunkEmbedding
+from .vector_index import VectorIndex
+
+
+class AnalyticsSummaryQueryCountTests(TestCase):
+    """analytics_summary must not issue one query per period."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Reliance Industries Limited")
+        self.client = APIClient()
+
+    def _add_periods(self, years):
+        for year in years:
+            balance_sheet = BalanceSheet.objects.create(company=self.company, pdf_file='balance_sheets/test.pdf', year=year)
+            FinancialData.objects.create(
+                balance_sheet=balance_sheet,
+                total_assets=1000 + year,
+                current_assets=400,
+                current_liabilities=200,
+                total_liabilities=500,
+                total_equity=500,
+                revenue=800,
+            )
+
+    def _summary_query_count(self, user):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/balance-sheets/analytics_summary/', {'company': self.company.id})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_query_count_is_constant_as_periods_grow(self):
+        analyst = User.objects.create_user('analyst', password='pw', role='ANALYST')
+
+        self._add_periods(range(2000, 2002))
+        small_count, small_data = self._summary_query_count(analyst)
+
+        self._add_periods(range(2002, 2042))
+        large_count, large_data = self._summary_query_count(analyst)
+
+        self.assertEqual(small_data['periods_count'], 2)
+        self.assertEqual(large_data['periods_count'], 42)
+        self.assertEqual(small_count, large_count)
+
+    def test_ceo_access_filter_does_not_add_queries(self):
+        ceo = User.objects.create_user('ceo', password='pw', role='CEO')
+        CompanyAccess.objects.create(user=ceo, company=self.company)
+
+        self._add_periods(range(2000, 2002))
+        small_count, _ = self._summary_query_count(ceo)
+
+        self._add_periods(range(2002, 2042))
+        large_count, large_data = self._summary_query_count(ceo)
+
+        self.assertEqual(large_data['periods_count'], 42)
+        self.assertEqual(small_count, large_count)
+
+    def test_uses_latest_financial_data_per_period(self):
+        analyst = User.objects.create_user('analyst', password='pw', role='ANALYST')
+        self._add_periods([2020])
+        balance_sheet = BalanceSheet.objects.get()
+        FinancialData.objects.create(balance_sheet=balance_sheet, total_assets=9999, total_equity=1)
+
+        _, data = self._summary_query_count(analyst)
+
+        self.assertEqual(data['analytics'][0]['total_assets'], 9999.0)
+
+
+class AnalyticsSummaryCacheTests(TestCase):
+    """analytics_summary is served from cache until the company's data changes."""
+
+    url = '/api/balance-sheets/analytics_summary/'
+
+    def setUp(self):
+        caches['analytics'].clear()
+
+        self.company = Company.objects.create(name="Reliance Industries Limited")
+        self.balance_sheet = BalanceSheet.objects.create(company=self.company, pdf_file='balance_sheets/test.pdf', year=2023)
+        FinancialData.objects.create(balance_sheet=self.balance_sheet, total_assets=1000, total_equity=400)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('analyst', password='pw', role='ANALYST'))
+
+    def _get(self, **headers):
+        return self.client.get(self.url, {'company': self.company.id}, headers=headers)
+
+    def test_repeat_request_is_served_from_cache(self):
+        first = self._get()
+        with CaptureQueriesContext(connection) as queries:
+            second = self._get()
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertFalse([q for q in queries.captured_queries if 'balance_sheets_' in q['sql']])
+
+    def test_conditional_get_returns_not_modified(self):
+        first = self._get()
+
+        self.assertEqual(self._get(if_none_match=first['ETag']).status_code, 304)
+        self.assertEqual(self._get(if_modified_since=first['Last-Modified']).status_code, 304)
+
+    def test_financial_data_change_invalidates(self):
+        first = self._get()
+
+        FinancialData.objects.create(balance_sheet=self.balance_sheet, total_assets=2500, total_equity=400)
+        second = self._get(if_none_match=first['ETag'])
+
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.data['kpis']['total_assets'], 2500.0)
+
+    def test_balance_sheet_delete_invalidates(self):
+        self._get()
+
+        self.balance_sheet.delete()
+
+        self.assertEqual(self._get().data['periods_count'], 0)
+
+
+class AnalyticsSeriesTests(SimpleTestCase):
+    """Edge cases the NumPy analytics must keep from the per-row code they replaced."""
+
+    def _analyze(self, *records):
+        pairs = [(Period(index, 2020 + index, None), record) for index, record in enumerate(records)]
+        return analyze_periods(pairs)
+
+    def test_revenue_falls_back_to_sales(self):
+        analytics, kpis = self._analyze({'revenue': 0, 'sales': 80}, {'revenue': None, 'sales': 100}, {'revenue': 120, 'sales': 10})
+        self.assertEqual([period['revenue'] for period in analytics], [80.0, 100.0, 120.0])
+        self.assertEqual(analytics[-1]['sales'], 10.0)
+        self.assertAlmostEqual(analytics[1]['growth']['revenue'], 25.0)
+        self.assertAlmostEqual(kpis['revenue_cagr'], ((120 / 80) ** 0.5 - 1) * 100)
+
+    def test_reported_ratio_needs_a_stored_ratio(self):
+        analytics, _ = self._analyze(
+            # Computed 2.0 but nothing stored: not reported
+            {'current_assets': 200, 'current_liabilities': 100},
+            # Stored and computable: the computed value wins
+            {'current_assets': 300, 'current_liabilities': 200, 'current_ratio': 9},
+            # Stored but not computable: the stored value
+            {'current_assets': 300, 'current_liabilities': 0, 'current_ratio': 9},
+            # Computed 0 is falsy, so the stored value again
+            {'current_assets': 0, 'current_liabilities': 50, 'current_ratio': 9},
+        )
+        self.assertEqual([period['current_ratio'] for period in analytics], [None, 1.5, 9.0, 9.0])
+        self.assertEqual([period['current_ratio_status'] for period in analytics], ['good', 'good', 'unknown', 'bad'])
+
+    def test_growth_skipped_unless_previous_is_positive(self):
+        analytics, kpis = self._analyze({'total_assets': 0}, {'total_assets': -50}, {'total_assets': 100}, {'total_assets': 150})
+        self.assertEqual([period['growth'].get('assets') for period in analytics], [None, None, None, 50.0])
+        self.assertEqual(kpis['assets_growth'], 50.0)
+
+    def test_cagr_undefined_for_non_positive_values(self):
+        frame = FinancialFrame.from_records(
+            [{'total_assets': 0}, {'total_assets': 100}, {'total_assets': -10}, {'total_assets': 100},
+             {'total_assets': 100}, {'total_assets': 20}, {'total_assets': -50}],
+            groups=['zero', 'zero', 'negative', 'negative', 'sign-flip', 'sign-flip', 'sign-flip'],
+        )
+        cagr = frame.cagr('total_assets')
+        self.assertEqual(cagr.dtype.kind, 'f')
+        self.assertTrue(np.isnan(cagr).all())
+
+        _, kpis = self._analyze({'total_assets': -10}, {'total_assets': 100})
+        self.assertNotIn('total_assets_cagr', kpis)
+        _, kpis = self._analyze({'total_assets': 100}, {'total_assets': 20}, {'total_assets': -50})
+        self.assertIsNone(kpis['total_assets_cagr'])
+
+
+class QuotaExceeded(Exception):
+    code = 429
+
+
+class FakeEmbeddingService(EmbeddingService):
+    """
+    Embeds 'text N' as [N]; the first `quota_failures` requests hit the
+    quota, and with `reject_batches` any multi-text request fails.
+    """
+
+    def __init__(self, quota_failures=0, reject_batches=False):
+        self.client = object()
+        self.use_new_api = True
+        self.requests = 0
+        self.quota_failures = quota_failures
+        self.reject_batches = reject_batches
+        self._lock = Lock()
+
+    def embed_batch_request(self, texts):
+        with self._lock:
+            self.requests += 1
+            if self.reject_batches and len(texts) > 1:
+                raise ValueError('batch rejected')
+            if self.quota_failures:
+                self.quota_failures -= 1
+                raise QuotaExceeded('RESOURCE_EXHAUSTED')
+        return [[float(text.split()[1])] for text in texts]
+
+
+class EmbeddingSchedulerTests(TestCase):
+    """Concurrent batch requests keep every vector with its text."""
+
+    def _embed(self, service, texts, max_workers):
+        scheduler = EmbeddingScheduler(
+            service, max_workers=max_workers, rate_limiter=TokenBucket(1000, 100), backoff_base=0.001
+        )
+        return scheduler.embed(texts, batch_size=7)
+
+    def test_vectors_stay_aligned_with_texts(self):
+        texts = ['' if i % 5 == 0 else f'text {i}' for i in range(200)]
+
+        vectors = self._embed(FakeEmbeddingService(), texts, max_workers=8)
+
+        self.assertEqual(vectors, [[] if i % 5 == 0 else [float(i)] for i in range(200)])
+
+    def test_quota_errors_are_retried(self):
+        service = FakeEmbeddingService(quota_failures=3)
+        texts = [f'text {i}' for i in range(20)]
+
+        vectors = self._embed(service, texts, max_workers=4)
+
+        self.assertEqual(vectors, [[float(i)] for i in range(20)])
+        self.assertEqual(service.requests, 3 + 3)
+
+    def test_single_text_fallback_backs_off_on_quota_errors(self):
+        service = FakeEmbeddingService(quota_failures=2, reject_batches=True)
+        texts = [f'text {i}' for i in range(3)]
+
+        with self.assertLogs('apps.balance_sheets.embedding_scheduler', 'INFO') as logs:
+            vectors = self._embed(service, texts, max_workers=1)
+
+        self.assertEqual(vectors, [[0.0], [1.0], [2.0]])
+        # The rejected batch, two quota errors on the first text, then one request per text
+        self.assertEqual(service.requests, 1 + 2 + 3)
+        self.assertEqual(sum('retrying' in line for line in logs.output), 2)
+
+
+class BM25IndexTests(TestCase):
+    """Keyword ranking over the ChunkTerm postings."""
+
+    def setUp(self):
+        company = Company.objects.create(name="Reliance Industries Limited")
+        self.balance_sheet = BalanceSheet.objects.create(company=company, pdf_file='balance_sheets/test.pdf', year=2024)
+
+    def _chunks(self, *contents):
+        chunks = PDFChunk.objects.bulk_create([
+            PDFChunk(balance_sheet=self.balance_sheet, content=content, start_page=1, end_page=1)
+            for content in contents
+        ])
+        index_chunks(chunks)
+        return chunks
+
+    def test_unindexed_sheets_return_none(self):
+        PDFChunk.objects.create(balance_sheet=self.balance_sheet, content='Total assets', start_page=1, end_page=1)
+        PDFChunk.objects.filter(balance_sheet=self.balance_sheet).update(token_count=0)
+
+        self.assertIsNone(bm25_index.search('total assets', [self.balance_sheet.id]))
+
+    def test_rare_terms_rank_first(self):
+        chunks = self._chunks(
+            'Total assets grew during the year',
+            'Trade receivables and total assets',
+            'Revenue from operations',
+            'Total revenue and total expenses',
+        )
+
+        results = bm25_index.search('What are the trade receivables?', [self.balance_sheet.id])
+
+        self.assertEqual([chunk_id for chunk_id, _ in results], [chunks[1].id])
+
+        results = bm25_index.search('total assets', [self.balance_sheet.id])
+
+        self.assertEqual({chunk_id for chunk_id, _ in results[:2]}, {chunks[0].id, chunks[1].id})
+        self.assertEqual(results[-1][0], chunks[3].id)
+
+
+class FullTextIndexTests(TestCase):
+    """The FTS5 table follows chunk writes through triggers, bulk writes included."""
+
+    def setUp(self):
+        company = Company.objects.create(name="Reliance Industries Limited")
+        self.balance_sheet = BalanceSheet.objects.create(company=company, pdf_file='balance_sheets/test.pdf', year=2024)
+        self.chunks = PDFChunk.objects.bulk_create([
+            PDFChunk(balance_sheet=self.balance_sheet, content='Trade receivables', start_page=1, end_page=1),
+            PDFChunk(balance_sheet=self.balance_sheet, content='Revenue from operations',
+                     source_title='Statement of Profit and Loss', start_page=1, end_page=1),
+        ])
+
+    def _search(self, query):
+        return [chunk_id for chunk_id, _ in fulltext_index.search(query, [self.balance_sheet.id])]
+
+    def test_search_follows_writes(self):
+        self.assertEqual(self._search('What is the trade receivable?'), [self.chunks[0].id])
+        self.assertEqual(self._search('profit'), [self.chunks[1].id])
+
+        PDFChunk.objects.filter(pk=self.chunks[0].pk).update(content='Inventories')
+        PDFChunk.objects.filter(pk=self.chunks[1].pk).delete()
+
+        self.assertEqual(self._search('receivables'), [])
+        self.assertEqual(self._search('revenue'), [])
+        self.assertEqual(self._search('inventories'), [self.chunks[0].id])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self._search('content: "trade* NEAR('), [self.chunks[0].id])
+
+
+class StubIngestor(BalanceSheetIngestor):
+    """Skips PDF parsing and the Gemini calls; counts how often it ran."""
+
+    runs = 0
+
+    def _extract_financial_data(self, pdf_file, document=None):
+        return {'total_assets': 1000, 'total_equity': 400}, {}
+
+    def _process_pdf_chunks(self, balance_sheet, pdf_file, document=None):
+        self.runs += 1
+        return self._create_chunks_with_embeddings(
+            balance_sheet, [{'content': f'Total assets note {i}'} for i in range(3)] + [{'content': ''}]
+        )
+
+
+@override_settings(INGESTION_HEARTBEAT_INTERVAL=0, INGESTION_MAX_ATTEMPTS=2, GEMINI_API_KEY='')
+class IngestionQueueTests(TestCase):
+    """Jobs are claimed once, recovered from dead workers, and safe to run again."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        company = Company.objects.create(name="Reliance Industries Limited")
+        self.balance_sheet = BalanceSheet(company=company, year=2024)
+        self.balance_sheet.pdf_file.save('test.pdf', ContentFile(b'%PDF-1.4'), save=False)
+        self.balance_sheet.save()
+
+    def _expire(self, job):
+        IngestionJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(hours=2))
+
+    def test_job_is_claimed_once(self):
+        enqueue_ingestion(self.balance_sheet)
+
+        job = claim_next_job('worker-a')
+
+        self.assertEqual((job.status, job.worker, job.attempts), ('RUNNING', 'worker-a', 1))
+        self.assertIsNone(claim_next_job('worker-b'))
+
+    def test_stale_jobs_are_requeued_then_failed(self):
+        enqueue_ingestion(self.balance_sheet)
+
+        self._expire(claim_next_job('worker-a'))
+        self.assertEqual(requeue_stale_jobs(), (1, 0))
+
+        job = claim_next_job('worker-b')
+        self.assertEqual((job.worker, job.attempts), ('worker-b', 2))
+
+        self._expire(job)
+        self.assertEqual(requeue_stale_jobs(), (0, 1))
+        self.assertEqual(IngestionJob.objects.get(id=job.id).status, 'FAILED')
+
+    def test_rerun_replaces_rows(self):
+        enqueue_ingestion(self.balance_sheet)
+        first = claim_next_job('worker-a')
+        self._expire(first)
+        requeue_stale_jobs()
+        second = claim_next_job('worker-b')
+
+        # Both claims run to completion, as when a slow worker is presumed dead
+        ingestor = StubIngestor()
+        with self.assertLogs('apps.balance_sheets.ingestion', 'WARNING') as logs:
+            self.assertTrue(run_job(second, ingestor))
+            self.assertTrue(run_job(first, ingestor))
+
+        self.assertEqual(ingestor.runs, 2)
+        self.assertEqual(FinancialData.objects.filter(balance_sheet=self.balance_sheet).count(), 1)
+        self.assertEqual(PDFChunk.objects.filter(balance_sheet=self.balance_sheet).count(), 3)
+        self.assertEqual(len(fulltext_index.search('total assets', [self.balance_sheet.id])), 3)
+        # SQLite has the FTS5 table, so no BM25 postings are written
+        self.assertFalse(ChunkTerm.objects.exists())
+
+        # The empty chunk is rejected, and reported with the extraction results
+        financial_data = FinancialData.objects.get(balance_sheet=self.balance_sheet)
+        self.assertEqual([row['index'] for row in financial_data.additional_data['rejected_chunks']], [3])
+
+        # Only the current claim records the outcome
+        self.assertIn(f'Job {first.id} was reclaimed by another worker', logs.output[-1])
+        job = IngestionJob.objects.get(id=first.id)
+        self.assertEqual((job.status, job.worker), ('DONE', 'worker-b'))
+
+
+class VectorIndexTests(TestCase):
+    """Shards notice vector changes made without signals, e.g. by another process."""
+
+    def setUp(self):
+        company = Company.objects.create(name="Reliance Industries Limited")
+        self.balance_sheet = BalanceSheet.objects.create(company=company, pdf_file='balance_sheets/test.pdf', year=2024)
+
+    def test_in_place_vector_rewrite_is_picked_up(self):
+        chunks = [
+            PDFChunk(balance_sheet=self.balance_sheet, content=f'chunk {i}', start_page=1, end_page=1)
+            for i in range(2)
+        ]
+        chunks[0].set_vector([1.0, 0.0], 'test-model')
+        chunks[1].set_vector([0.0, 1.0], 'test-model')
+        PDFChunk.objects.bulk_create(chunks)
+        index = VectorIndex()
+
+        self.assertEqual(index.search([1.0, 0.0], [self.balance_sheet.id], top_k=1, model='test-model')[0][0], chunks[0].id)
+
+        # Same row count and ids, as with generate_embeddings --force; bulk_update sends no signal
+        chunks[0].set_vector([0.0, 1.0], 'test-model')
+        chunks[1].set_vector([1.0, 0.0], 'test-model')
+        PDFChunk.objects.bulk_update(chunks, PDFChunk.VECTOR_FIELDS)
+
+        self.assertEqual(index.search([1.0, 0.0], [self.balance_sheet.id], top_k=1, model='test-model')[0][0], chunks[1].id)
+
+
+class JsonEmbeddingMigrationTests(TestCase):
+    """Migration 0008 copies legacy JSON embeddings into the float32 vector column."""
+
+    def test_json_embedding_round_trips(self):
+        company = Company.objects.create(name="Reliance Industries Limited")
+        balance_sheet = BalanceSheet.objects.create(company=company, pdf_file='balance_sheets/test.pdf', year=2024)
+        flat, nested, empty = [
+            PDFChunk.objects.create(balance_sheet=balance_sheet, content=f'chunk {i}', start_page=1, end_page=1, embedding=embedding)
+            for i, embedding in enumerate([[0.5, -1.25, 3.0], [[0.1, 0.2], [0.3]], []])
+        ]
+
+        migration = import_module('apps.balance_sheets.migrations.0008_convert_json_embeddings')
+        migration.convert_json_embeddings(apps, None)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT vector FROM balance_sheets_pdfchunk WHERE id = %s', [flat.id])
+            self.assertEqual(bytes(cursor.fetchone()[0]), np.array([0.5, -1.25, 3.0], dtype='<f4').tobytes())
+
+        flat.refresh_from_db()
+        nested.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual(flat.vector.dtype, np.float32)
+        self.assertEqual(flat.vector.tolist(), [0.5, -1.25, 3.0])
+        np.testing.assert_array_equal(nested.vector, np.array([0.1, 0.2, 0.3], dtype=np.float32))
+        self.assertIsNone(empty.vector)
+
+
+@override_settings(EMBEDDING_MODEL='old-model')
+class EmbeddingModelCutoverTests(TestCase):
+    """Re-embedding stages vectors that serve once the model is switched, and promotion changes nothing."""
+
+    def setUp(self):
+        company = Company.objects.create(name="Reliance Industries Limited")
+        self.balance_sheet = BalanceSheet.objects.create(company=company, pdf_file='balance_sheets/test.pdf', year=2024)
+
+    def _chunk(self, content, vector=None, model='old-model'):
+        chunk = PDFChunk(balance_sheet=self.balance_sheet, content=content, start_page=1, end_page=1)
+        if vector is not None:
+            chunk.set_vector(vector, model)
+        chunk.save()
+        return chunk
+
+    def _stage(self, chunk, vector, model='new-model'):
+        StagedChunkEmbedding.objects.create(chunk=chunk, model=model, embedding_dim=len(vector), vector=vector)
+
+    def test_stale_chunks_skip_current_and_staged(self):
+        stale = self._chunk('old vector', [1.0, 0.0])
+        self._chunk('already on the new model', [1.0, 0.0], model='new-model')
+        staged = self._chunk('staged for the new model', [1.0, 0.0])
+        self._stage(staged, [0.0, 1.0])
+        staged_elsewhere = self._chunk('staged for another model', [1.0, 0.0])
+        self._stage(staged_elsewhere, [0.0, 1.0], model='other-model')
+        self._stage(staged_elsewhere, [0.0, 1.0], model='third-model')
+        unembedded = self._chunk('never embedded')
+        self._chunk('')
+
+        stale_ids = set(ChunkReembedder('new-model').stale_chunks().values_list('id', flat=True))
+
+        self.assertEqual(stale_ids, {stale.id, staged_elsewhere.id, unembedded.id})
+
+    def test_staged_vectors_serve_after_switch_and_survive_promotion(self):
+        first = self._chunk('first', [1.0, 0.0])
+        second = self._chunk('second', [0.0, 1.0])
+        # The new model ranks the chunks the other way round
+        self._stage(first, [0.0, 1.0, 0.0])
+        self._stage(second, [1.0, 0.0, 0.0])
+        index = VectorIndex()
+
+        self.assertEqual(index.search([1.0, 0.0], [self.balance_sheet.id], top_k=1)[0][0], first.id)
+
+        with self.settings(EMBEDDING_MODEL='new-model'):
+            staged_results = index.search([1.0, 0.0, 0.0], [self.balance_sheet.id])
+            self.assertEqual([chunk_id for chunk_id, _ in staged_results], [second.id, first.id])
+
+            self.assertEqual(promote_staged_embeddings('new-model'), 2)
+
+            self.assertFalse(StagedChunkEmbedding.objects.exists())
+            self.assertEqual(PDFChunk.objects.get(id=first.id).embedding_model, 'new-model')
+            self.assertEqual(index.search([1.0, 0.0, 0.0], [self.balance_sheet.id]), staged_results)
+
+
+class WorkerKilled(BaseException):
+    """Stops a command the way a kill would, past its per-page error handling."""
+
+
+class StubBackfillService:
+    """Embeds every text as [chunk number]; dies on request number `crash_on`."""
+
+    def __init__(self, crash_on=None):
+        self.client = object()
+        self.model = 'test-model'
+        self.crash_on = crash_on
+        self.requests = []
+
+    def create_embeddings_batch(self, texts, batch_size=None, max_workers=None):
+        self.requests.append(list(texts))
+        if len(self.requests) == self.crash_on:
+            raise WorkerKilled()
+        return [[float(text.split()[1])] for text in texts]
+
+
+class GenerateEmbeddingsCommandTests(TestCase):
+    """An interrupted backfill resumes after its checkpoint."""
+
+    def setUp(self):
+        company = Company.objects.create(name="Reliance Industries Limited")
+        balance_sheet = BalanceSheet.objects.create(company=company, pdf_file='balance_sheets/test.pdf', year=2024)
+        self.chunks = PDFChunk.objects.bulk_create([
+            PDFChunk(balance_sheet=balance_sheet, content=f'chunk {i}', start_page=1, end_page=1)
+            for i in range(6)
+        ])
+
+    def _run(self, service, *args):
+        stdout = StringIO()
+        command = 'apps.balance_sheets.management.commands.generate_embeddings'
+        with mock.patch(f'{command}.EmbeddingService', return_value=service), mock.patch(f'{command}.tqdm'):
+            call_command('generate_embeddings', '--force', '--no-cache', '--batch-size=2', '--workers=1',
+                         *args, stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def test_rerun_resumes_after_checkpoint(self):
+        with self.assertRaises(WorkerKilled):
+            self._run(StubBackfillService(crash_on=2))
+
+        checkpoint = BackfillCheckpoint.objects.get(name='generate_embeddings:force')
+        self.assertEqual((checkpoint.last_pk, checkpoint.processed), (self.chunks[1].id, 2))
+
+        self.assertIn(f'resuming after chunk {self.chunks[1].id}', self._run(StubBackfillService(), '--dry-run'))
+
+        service = StubBackfillService()
+        self._run(service)
+
+        self.assertEqual(service.requests, [['chunk 2', 'chunk 3'], ['chunk 4', 'chunk 5']])
+        self.assertFalse(BackfillCheckpoint.objects.exists())
+        vectors = PDFChunk.objects.order_by('pk').values_list('vector', flat=True)
+        self.assertEqual([vector.tolist() for vector in vectors], [[float(i)] for i in range(6)])
+
+
+class EmbeddingCacheEvictionTests(TestCase):
+    """Eviction keeps the most recently used entries and skips the scan under the cap."""
+
+    def test_evicts_least_recently_used_over_cap(self):
+        cache = EmbeddingCache(model='test-model', max_entries=3)
+
+        with CaptureQueriesContext(connection) as queries:
+            cache.set_many({f'hash-{i}': [float(i)] for i in range(3)})
+        self.assertFalse(any('ORDER BY' in query['sql'] for query in queries.captured_queries))
+
+        EmbeddingCacheEntry.objects.filter(content_hash='hash-0').update(last_used_at=timezone.now())
+        cache.set_many({'hash-3': [3.0], 'hash-4': [4.0]})
+
+        self.assertEqual(
+            set(EmbeddingCacheEntry.objects.values_list('content_hash', flat=True)), {'hash-0', 'hash-3', 'hash-4'}
+        )
@@ -0,0 +1,177 @@
+"""In-process vector index for RAG retrieval, sharded per balance sheet."""
+from collections import Counter, OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .embedding_service import EmbeddingMatrix, active_embedding_model
+from .fields import to_vector
+from .models import PDFChunk, StagedChunkEmbedding
+
+
+class VectorShard:
+    """Float32 matrix of one balance sheet's chunk embeddings from one model, with cached norms."""
+
+    def __init__(self, balance_sheet_id: int, chunk_ids: np.ndarray, embeddings: EmbeddingMatrix, fingerprint: Tuple):
+        self.balance_sheet_id = balance_sheet_id
+        self.chunk_ids = chunk_ids
+        self.embeddings = embeddings
+        self.fingerprint = fingerprint
+
+    @property
+    def dimension(self) -> int:
+        return self.embeddings.dimension
+
+    @classmethod
+    def build(cls, balance_sheet_id: int, model: str, fingerprint: Tuple) -> 'VectorShard':
+        """
+        Load a balance sheet's vectors for `model` and normalize them once.
+        
+        Vectors come from the chunks themselves and from staged re-embeddings,
+        so a model whose vectors are still staged can serve as soon as it
+        becomes the active one.
+        """
+        vectors = dict(
+            PDFChunk.objects.filter(balance_sheet_id=balance_sheet_id, embedding_model=model, vector__isnull=False)
+            .values_list('id', 'vector')
+        )
+        vectors.update(
+            StagedChunkEmbedding.objects.filter(chunk__balance_sheet_id=balance_sheet_id, model=model)
+            .values_list('chunk_id', 'vector')
+        )
+        rows = sorted((chunk_id, vector) for chunk_id, vector in vectors.items() if vector is not None)
+
+        if not rows:
+            return cls(balance_sheet_id, np.empty(0, dtype=np.int64), EmbeddingMatrix(np.empty((0, 0))), fingerprint)
+
+        # Rows are already limited to one model, so mixed dimensions mean a bad row; keep the dominant one.
+        dimension = Counter(vector.shape[0] for _, vector in rows).most_common(1)[0][0]
+        rows = [(chunk_id, vector) for chunk_id, vector in rows if vector.shape[0] == dimension]
+
+        chunk_ids = np.fromiter((chunk_id for chunk_id, _ in rows), dtype=np.int64, count=len(rows))
+        embeddings = EmbeddingMatrix(np.vstack([vector for _, vector in rows]))
+
+        # Zero vectors can never score; drop them so the normalized matrix is dense.
+        nonzero = embeddings.norms > 0
+        if not nonzero.all():
+            chunk_ids = chunk_ids[nonzero]
+            embeddings = EmbeddingMatrix(embeddings.matrix[nonzero])
+
+        # Normalize eagerly so every search is a plain matrix-vector product.
+        return cls(balance_sheet_id, chunk_ids, embeddings.prepare(), fingerprint)
+
+
+class VectorIndex:
+    """
+    Lazily built, per-process cache of VectorShards keyed by balance_sheet_id.
+
+    Shards are dropped explicitly through `invalidate` (wired to PDFChunk
+    signals) and are also checked against a cheap per-sheet fingerprint of
+    the chunk and staged-embedding tables: row count, highest id and the
+    latest PDFChunk.vector_updated_at. Rows added, removed or rewritten in
+    place by other processes (e.g. generate_embeddings --force), and a
+    switch of the active embedding model, are therefore picked up too.
+    """
+
+    def __init__(self, max_shards: Optional[int] = None):
+        self._max_shards = max_shards
+        self._shards: 'OrderedDict[int, VectorShard]' = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def max_shards(self) -> int:
+        if self._max_shards is not None:
+            return self._max_shards
+        return getattr(settings, 'VECTOR_INDEX_MAX_SHARDS', 256)
+
+    def invalidate(self, balance_sheet_id: int) -> None:
+        """Drop the cached shard for a balance sheet; it is rebuilt on next search."""
+        with self._lock:
+            self._shards.pop(balance_sheet_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._shards.clear()
+
+    def search(self, query_embedding, balance_sheet_ids: Iterable[int], top_k: int = 8,
+               model: Optional[str] = None) -> List[Tuple[int, float]]:
+        """Return up to top_k (chunk_id, cosine similarity) pairs among `model`'s vectors (the active model by default), best first."""
+        query_vector = to_vector(query_embedding)
+        if query_vector is None or top_k <= 0 or not query_vector.any():
+            return []
+
+        id_parts = []
+        score_parts = []
+        for shard in self._get_shards(balance_sheet_ids, model or active_embedding_model()):
+            if shard.dimension != query_vector.shape[0] or not len(shard.chunk_ids):
+                continue
+            id_parts.append(shard.chunk_ids)
+            score_parts.append(shard.embeddings.similarities(query_vector))
+
+        if not score_parts:
+            return []
+
+        chunk_ids = np.concatenate(id_parts)
+        scores = np.concatenate(score_parts)
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        return [(int(chunk_ids[i]), float(scores[i])) for i in top]
+
+    def _get_shards(self, balance_sheet_ids: Iterable[int], model: str) -> List[VectorShard]:
+        balance_sheet_ids = list(dict.fromkeys(balance_sheet_ids))
+        if not balance_sheet_ids:
+            return []
+
+        fingerprints = self._fingerprints(balance_sheet_ids, model)
+        shards = []
+
+        for balance_sheet_id in balance_sheet_ids:
+            fingerprint = fingerprints.get(balance_sheet_id, (model, 0, None, None, 0, None))
+
+            with self._lock:
+                shard = self._shards.get(balance_sheet_id)
+                if shard is not None:
+                    self._shards.move_to_end(balance_sheet_id)
+
+            if shard is None or shard.fingerprint != fingerprint:
+                shard = VectorShard.build(balance_sheet_id, model, fingerprint)
+                with self._lock:
+                    self._shards[balance_sheet_id] = shard
+                    self._shards.move_to_end(balance_sheet_id)
+                    while len(self._shards) > self.max_shards:
+                        self._shards.popitem(last=False)
+
+            shards.append(shard)
+
+        return shards
+
+    def _fingerprints(self, balance_sheet_ids: List[int], model: str) -> Dict[int, Tuple]:
+        """Two aggregate queries telling us whether any sheet's vectors for `model` changed."""
+        rows = (
+            PDFChunk.objects.filter(balance_sheet_id__in=balance_sheet_ids, embedding_model=model, vector__isnull=False)
+            .order_by()
+            .values('balance_sheet_id')
+            .annotate(count=Count('id'), last_id=Max('id'), last_updated=Max('vector_updated_at'))
+        )
+        staged_rows = (
+            StagedChunkEmbedding.objects.filter(chunk__balance_sheet_id__in=balance_sheet_ids, model=model)
+            .order_by()
+            .values('chunk__balance_sheet_id')
+            .annotate(count=Count('id'), last_id=Max('id'))
+        )
+        chunks = {row['balance_sheet_id']: (row['count'], row['last_id'], row['last_updated']) for row in rows}
+        staged = {row['chunk__balance_sheet_id']: (row['count'], row['last_id']) for row in staged_rows}
+        return {
+            balance_sheet_id: (model,) + chunks.get(balance_sheet_id, (0, None, None)) + staged.get(balance_sheet_id, (0, None))
+            for balance_sheet_id in set(chunks) | set(staged)
+        }
+
+
+# Shared by every ChunkRetriever in this worker process.
+vector_index = VectorIndex()
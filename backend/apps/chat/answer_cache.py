@@ -0,0 +1,187 @@
+"""Cache of generated chat answers, invalidated per balance sheet."""
+import hashlib
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from apps.balance_sheets.embedding_service import EmbeddingService, active_embedding_model
+from apps.balance_sheets.fields import VECTOR_DTYPE, to_vector
+from apps.balance_sheets.query_cache import normalize_query, query_embedding_cache
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    Generated answers keyed by (company, balance sheet ids, chunk set
+    version, whether chunks were used, normalized query).
+
+    Every balance sheet has a version stamp (an increasing Unix timestamp)
+    that signals bump when its chunks or FinancialData change; the chunk
+    set version of a question is the digest of the stamps of the sheets it
+    covers, so one bump orphans every answer built from that sheet.
+
+    With CHAT_ANSWER_CACHE_SEMANTIC_THRESHOLD > 0, a miss on the exact
+    query falls back to the most similar cached query for the same sheets
+    (cosine similarity of the query embeddings, which retrieval computes
+    and caches anyway). CHAT_ANSWER_CACHE_ALIAS = None disables the cache.
+    """
+
+    def __init__(self, cache_alias: Optional[str] = None, timeout: Optional[int] = None,
+                 semantic_threshold: Optional[float] = None, semantic_entries: Optional[int] = None):
+        self._cache_alias = cache_alias
+        self._timeout = timeout
+        self._semantic_threshold = semantic_threshold
+        self._semantic_entries = semantic_entries
+
+    @property
+    def cache(self):
+        alias = self._cache_alias or getattr(settings, 'CHAT_ANSWER_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    @property
+    def timeout(self) -> int:
+        if self._timeout is not None:
+            return self._timeout
+        return getattr(settings, 'CHAT_ANSWER_CACHE_TIMEOUT', 86400)
+
+    @property
+    def semantic_threshold(self) -> float:
+        if self._semantic_threshold is not None:
+            return self._semantic_threshold
+        return getattr(settings, 'CHAT_ANSWER_CACHE_SEMANTIC_THRESHOLD', 0.0)
+
+    @property
+    def semantic_entries(self) -> int:
+        if self._semantic_entries is not None:
+            return self._semantic_entries
+        return getattr(settings, 'CHAT_ANSWER_CACHE_SEMANTIC_ENTRIES', 100)
+
+    def _version_key(self, balance_sheet_id) -> str:
+        return f'chat-answer-version:{balance_sheet_id}'
+
+    def versions(self, balance_sheet_ids: Iterable[int]) -> Dict[int, int]:
+        """Version stamp of every sheet, stamping sheets seen for the first time (or evicted)."""
+        cache = self.cache
+        keys = {self._version_key(balance_sheet_id): balance_sheet_id for balance_sheet_id in balance_sheet_ids}
+        found = cache.get_many(list(keys))
+        missing = [key for key in keys if key not in found]
+        if missing:
+            now = int(time.time())
+            for key in missing:
+                cache.add(key, now, None)
+            found.update(cache.get_many(missing))
+        return {balance_sheet_id: found.get(key, 0) for key, balance_sheet_id in keys.items()}
+
+    def bump(self, balance_sheet_id) -> None:
+        """Invalidate every cached answer built from a balance sheet."""
+        cache = self.cache
+        if cache is None:
+            return
+        key = self._version_key(balance_sheet_id)
+        previous = cache.get(key) or 0
+        cache.set(key, max(int(time.time()), previous + 1), None)
+
+    def _scope(self, balance_sheets: List, use_chunks: bool = True) -> Optional[str]:
+        """Key prefix for a set of balance sheets: company, sheet ids, their chunk set version and the context kind."""
+        if not balance_sheets:
+            return None
+        company_id = balance_sheets[0].company_id
+        versions = self.versions(sorted({balance_sheet.pk for balance_sheet in balance_sheets}))
+        # Retrieval only reads vectors of the active model, so switching models changes the chunk set too
+        # Answers grounded in chunks and answers from structured data alone differ for the same question
+        chunk_set = active_embedding_model() + ('|chunks|' if use_chunks else '|data|') + ','.join(
+            f'{balance_sheet_id}:{version}' for balance_sheet_id, version in versions.items()
+        )
+        digest = hashlib.sha256(chunk_set.encode('utf-8')).hexdigest()
+        return f'chat-answer:{company_id}:{digest}'
+
+    def _answer_key(self, scope: str, normalized: str) -> str:
+        return f"{scope}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+    def _query_vector(self, query: str) -> Optional[np.ndarray]:
+        """The query's embedding through the shared query cache, so retrieval reuses it."""
+        embedding_service = EmbeddingService()
+        if not embedding_service.client:
+            return None
+        return query_embedding_cache.get_or_create(query, embedding_service.model, embedding_service.create_embedding)
+
+    def get(self, query: str, balance_sheets: List, use_chunks: bool = True) -> Optional[str]:
+        """Cached answer to a query over these balance sheets, or None."""
+        if self.cache is None:
+            return None
+        try:
+            scope = self._scope(balance_sheets, use_chunks)
+            if scope is None:
+                return None
+
+            normalized = normalize_query(query)
+            answer = self.cache.get(self._answer_key(scope, normalized))
+            if answer is not None or self.semantic_threshold <= 0:
+                return answer
+
+            return self._semantic_get(scope, query)
+        except Exception:
+            logger.exception("Answer cache lookup failed")
+            return None
+
+    def _semantic_get(self, scope: str, query: str) -> Optional[str]:
+        entries = self.cache.get(f'{scope}:queries')
+        if not entries:
+            return None
+
+        query_vector = self._query_vector(query)
+        if query_vector is None or not query_vector.any():
+            return None
+
+        candidates = [(normalized, to_vector(raw)) for normalized, raw in entries]
+        candidates = [(normalized, vector) for normalized, vector in candidates
+                      if vector is not None and vector.shape == query_vector.shape]
+        if not candidates:
+            return None
+
+        matrix = np.stack([vector for _, vector in candidates])
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector)
+        scores = np.divide(matrix @ query_vector, norms, out=np.zeros(len(candidates)), where=norms > 0)
+
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        return self.cache.get(self._answer_key(scope, candidates[best][0]))
+
+    def set(self, query: str, balance_sheets: List, answer: str, use_chunks: bool = True) -> None:
+        """Store a generated answer, and its query embedding when semantic lookup is on."""
+        if self.cache is None or not answer:
+            return
+        try:
+            scope = self._scope(balance_sheets, use_chunks)
+            if scope is None:
+                return
+
+            normalized = normalize_query(query)
+            self.cache.set(self._answer_key(scope, normalized), answer, self.timeout)
+
+            if self.semantic_threshold > 0:
+                self._remember_query(scope, query, normalized)
+        except Exception:
+            logger.exception("Answer cache store failed")
+
+    def _remember_query(self, scope: str, query: str, normalized: str) -> None:
+        query_vector = self._query_vector(query)
+        if query_vector is None:
+            return
+
+        # Read-modify-write without a lock: a concurrent store may drop an entry, which only costs a miss
+        key = f'{scope}:queries'
+        entries: List[Tuple[str, bytes]] = [
+            entry for entry in (self.cache.get(key) or []) if entry[0] != normalized
+        ]
+        entries.append((normalized, query_vector.astype(VECTOR_DTYPE, copy=False).tobytes()))
+        self.cache.set(key, entries[-self.semantic_entries:], self.timeout)
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,84 @@
+"""
+Async chat endpoint for ASGI deployments.
+
+DRF views are synchronous, so under ASGI every request holds a thread
+while Gemini answers. This plain async Django view awaits retrieval,
+embedding and generation instead, so one worker can serve many slow
+chat requests concurrently. It returns the same payload as
+`ChatViewSet.query`.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .gemini_service import GeminiChatService
+from .models import ChatHistory
+from .serializers import ChatQuerySerializer
+from apps.balance_sheets.models import BalanceSheet
+from apps.companies.access import get_access_scope
+
+
+def _authenticate(request):
+    """The JWT user of a request, or None."""
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    return result[0] if result else None
+
+
+@csrf_exempt
+async def chat_query(request):
+    """Send a query and get AI response (async)"""
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided or are invalid.'}, status=401)
+    request.user = user
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'detail': 'JSON parse error.'}, status=400)
+
+    serializer = ChatQuerySerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    company_id = serializer.validated_data['company_id']
+    query = serializer.validated_data['query']
+    selected_ids = serializer.validated_data.get('selected_balance_sheet_ids', [])
+
+    scope = await sync_to_async(get_access_scope)(request)
+    if not scope.can_access(company_id):
+        return JsonResponse({'error': 'You do not have access to this company'}, status=403)
+
+    balance_sheets = BalanceSheet.objects.filter(company_id=company_id)
+    if selected_ids:
+        balance_sheets = balance_sheets.filter(id__in=selected_ids)
+    balance_sheets_list = [bs async for bs in balance_sheets.order_by('-year')]
+
+    response = await GeminiChatService().aanalyze_company_performance(query, balance_sheets_list)
+
+    try:
+        chat_history = await ChatHistory.objects.acreate(
+            user=user,
+            company_id=company_id,
+            query=query,
+            response=response
+        )
+    except Exception:
+        chat_history = None
+
+    return JsonResponse({
+        'query': query,
+        'response': response,
+        'created_at': chat_history.created_at if chat_history else None
+    })
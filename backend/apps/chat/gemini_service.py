@@ -1,7 +1,19 @@
 import google.generativeai as genai
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from apps.balance_sheets.chunk_retriever import ChunkRetriever
 from apps.balance_sheets.models import BalanceSheet, FinancialData
+from .answer_cache import answer_cache
+
+
+NOT_CONFIGURED_MESSAGE = "Gemini API is not configured. Please set GEMINI_API_KEY in settings."
+EMPTY_RESPONSE_MESSAGE = "Sorry, I couldn't generate a response. Please try asking about specific balance sheet metrics."
+
+GENERATION_CONFIG = {
+    "temperature": 0.0,
+    "top_p": 0.7,
+    "top_k": 10,
+}
 
 
 class GeminiChatService:
@@ -20,14 +32,16 @@ class GeminiChatService:
         Orchestrates context building, prompt creation, and response generation.
         """
         if not self.model:
-            return "Gemini API is not configured. Please set GEMINI_API_KEY in settings."
+            return NOT_CONFIGURED_MESSAGE
         
         try:
-            # Build context from RAG chunks or financial data
-            context = self._build_context(query, company_data, use_chunks)
+            # Repeated (or, with semantic lookup, near-identical) questions skip retrieval and generation
+            cached_answer = answer_cache.get(query, company_data, use_chunks)
+            if cached_answer is not None:
+                return cached_answer
             
-            # Create prompt with context
-            prompt = self._create_prompt(query, context)
+            # Build context from RAG chunks or financial data, then the prompt
+            prompt, context = self.prepare_prompt(query, company_data, use_chunks)
             
             # Generate response from LLM
             response = self._generate_response(prompt)
@@ -40,13 +54,138 @@ class GeminiChatService:
             response_text = self._extract_response_text(response)
             
             if response_text:
-                return self._clean_response(response_text)
+                answer = self._clean_response(response_text)
+                answer_cache.set(query, company_data, answer, use_chunks)
+                return answer
+            
+            return EMPTY_RESPONSE_MESSAGE
+        
+        except Exception as e:
+            return f"Error generating analysis: {str(e)}"
+    
+    async def aanalyze_company_performance(self, query, company_data, use_chunks=True):
+        """
+        Async analyze_company_performance for the ASGI chat view: retrieval,
+        embedding and generation are awaited instead of blocking a worker.
+        """
+        if not self.model:
+            return NOT_CONFIGURED_MESSAGE
+        
+        try:
+            cached_answer = await sync_to_async(answer_cache.get, thread_sensitive=False)(query, company_data, use_chunks)
+            if cached_answer is not None:
+                return cached_answer
+            
+            prompt, context = await self.aprepare_prompt(query, company_data, use_chunks)
+            
+            response = await self._agenerate_response(prompt)
+            
+            # Blocked responses are rare; their retries reuse the sync fallbacks in a thread
+            if self._is_response_blocked(response):
+                return await sync_to_async(self._handle_blocked_response, thread_sensitive=False)(query, context)
+            
+            response_text = self._extract_response_text(response)
+            
+            if response_text:
+                answer = self._clean_response(response_text)
+                await sync_to_async(answer_cache.set, thread_sensitive=False)(query, company_data, answer, use_chunks)
+                return answer
             
-            return "Sorry, I couldn't generate a response. Please try asking about specific balance sheet metrics."
+            return EMPTY_RESPONSE_MESSAGE
         
         except Exception as e:
             return f"Error generating analysis: {str(e)}"
     
+    def stream_answer(self, query, company_data, use_chunks=True):
+        """
+        Streaming counterpart of analyze_company_performance.
+        
+        Yields ('token', text) for every piece Gemini generates, then exactly
+        one ('done', final_text) where final_text is what the non-streaming
+        path would have returned (cleaned, or the blocked/error fallback).
+        """
+        if not self.model:
+            yield 'done', NOT_CONFIGURED_MESSAGE
+            return
+        
+        try:
+            cached_answer = answer_cache.get(query, company_data, use_chunks)
+            if cached_answer is not None:
+                yield 'token', cached_answer
+                yield 'done', cached_answer
+                return
+            
+            prompt, context = self.prepare_prompt(query, company_data, use_chunks)
+            pieces = []
+            blocked = False
+            
+            for chunk in self.model.generate_content(prompt, generation_config=GENERATION_CONFIG, stream=True):
+                if self._is_response_blocked(chunk):
+                    blocked = True
+                    break
+                text = self._extract_response_text(chunk)
+                if text:
+                    pieces.append(text)
+                    yield 'token', text
+            
+            yield 'done', self._finish_stream(query, company_data, context, ''.join(pieces), blocked, use_chunks)
+        except Exception as e:
+            yield 'done', f"Error generating analysis: {str(e)}"
+    
+    async def astream_answer(self, query, company_data, use_chunks=True):
+        """
+        Async version of stream_answer for ASGI: the generation stream is
+        awaited on the event loop instead of holding a worker thread.
+        """
+        if not self.model:
+            yield 'done', NOT_CONFIGURED_MESSAGE
+            return
+        
+        try:
+            cached_answer = await sync_to_async(answer_cache.get, thread_sensitive=False)(query, company_data, use_chunks)
+            if cached_answer is not None:
+                yield 'token', cached_answer
+                yield 'done', cached_answer
+                return
+            
+            prompt, context = await self.aprepare_prompt(query, company_data, use_chunks)
+            pieces = []
+            blocked = False
+            
+            response = await self.model.generate_content_async(prompt, generation_config=GENERATION_CONFIG, stream=True)
+            async for chunk in response:
+                if self._is_response_blocked(chunk):
+                    blocked = True
+                    break
+                text = self._extract_response_text(chunk)
+                if text:
+                    pieces.append(text)
+                    yield 'token', text
+            
+            yield 'done', await sync_to_async(self._finish_stream)(query, company_data, context, ''.join(pieces), blocked, use_chunks)
+        except Exception as e:
+            yield 'done', f"Error generating analysis: {str(e)}"
+    
+    def prepare_prompt(self, query, company_data, use_chunks=True):
+        """Retrieve context and build the prompt; returns (prompt, context)."""
+        context = self._build_context(query, company_data, use_chunks)
+        return self._create_prompt(query, context), context
+    
+    async def aprepare_prompt(self, query, company_data, use_chunks=True):
+        """Async prepare_prompt using the async chunk retriever."""
+        context = await self._abuild_context(query, company_data, use_chunks)
+        return self._create_prompt(query, context), context
+    
+    def _finish_stream(self, query, company_data, context, streamed_text, blocked, use_chunks=True):
+        """Final text of a streamed answer, applying the same fallbacks as the blocking path."""
+        if blocked:
+            return self._handle_blocked_response(query, context)
+        if streamed_text:
+            answer = self._clean_response(streamed_text)
+            answer_cache.set(query, company_data, answer, use_chunks)
+            return answer
+        return EMPTY_RESPONSE_MESSAGE
+    
     def _build_context(self, query, company_data, use_chunks):
         """Build context from RAG chunks or structured financial data."""
         if not use_chunks:
@@ -60,6 +199,17 @@ class GeminiChatService:
         
         return self._prepare_financial_context(company_data)
     
+    async def _abuild_context(self, query, company_data, use_chunks):
+        """Async _build_context."""
+        if use_chunks:
+            chunk_retriever = ChunkRetriever()
+            relevant_chunks = await chunk_retriever.aget_relevant_chunks(query, company_data, use_vector_search=True)
+            
+            if relevant_chunks:
+                return chunk_retriever.format_chunks_for_context(relevant_chunks)
+        
+        return await sync_to_async(self._prepare_financial_context)(company_data)
+    
     def _create_prompt(self, query, context):
         """
         Create an ultra-neutral, structured prompt focused purely on data extraction and calculation
@@ -90,11 +240,7 @@ class GeminiChatService:
         try:
             return self.model.generate_content(
                 prompt,
-                generation_config={
-                    "temperature": 0.0,
-                    "top_p": 0.7,
-                    "top_k": 10,
-                }
+                generation_config=GENERATION_CONFIG
             )
         except Exception:
             # Fallback with minimal config
@@ -106,6 +252,22 @@ class GeminiChatService:
             except Exception:
                 return None
     
+    async def _agenerate_response(self, prompt):
+        """Async _generate_response with the same minimal-config fallback."""
+        try:
+            return await self.model.generate_content_async(
+                prompt,
+                generation_config=GENERATION_CONFIG
+            )
+        except Exception:
+            try:
+                return await self.model.generate_content_async(
+                    prompt,
+                    generation_config={"temperature": 0.0}
+                )
+            except Exception:
+                return None
+    
     def _is_response_blocked(self, response):
         """Check if response was blocked by safety filters."""
         if not response:
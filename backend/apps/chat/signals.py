@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.balance_sheets.models import FinancialData, PDFChunk
+from apps.balance_sheets.signals import chunks_changed
+from .answer_cache import answer_cache
+
+
+@receiver(post_save, sender=PDFChunk)
+@receiver(post_delete, sender=PDFChunk)
+@receiver(post_save, sender=FinancialData)
+@receiver(post_delete, sender=FinancialData)
+def invalidate_balance_sheet_answers(sender, instance, **kwargs):
+    """Expire cached chat answers built from the balance sheet whose chunks or financial data changed."""
+    answer_cache.bump(instance.balance_sheet_id)
+
+
+@receiver(chunks_changed)
+def invalidate_answers_after_bulk_write(sender, balance_sheet_id, **kwargs):
+    answer_cache.bump(balance_sheet_id)
+
@@ -0,0 +1,67 @@
+"""Server-Sent Events framing and persistence for streamed chat answers."""
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+from .models import ChatHistory
+
+
+def sse_event(event, data):
+    """One SSE message; data is JSON so newlines in generated text stay inside the frame."""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients send `Accept: text/event-stream`; non-streamed replies (errors) become one 'error' event."""
+
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event('error', data).encode(self.charset)
+
+
+def save_chat_history(user, company_id, query, response):
+    try:
+        return ChatHistory.objects.create(user=user, company_id=company_id, query=query, response=response)
+    except Exception:
+        return None
+
+
+def _done_event(query, response, chat_history):
+    return sse_event('done', {
+        'query': query,
+        'response': response,
+        'created_at': chat_history.created_at if chat_history else None,
+    })
+
+
+def chat_event_stream(service, query, balance_sheets, user, company_id):
+    """
+    SSE events for a streamed answer (WSGI): 'start', one 'token' per
+    generated piece, then 'done' with the final text once ChatHistory
+    has been saved.
+    """
+    yield sse_event('start', {'query': query})
+
+    for kind, text in service.stream_answer(query, balance_sheets):
+        if kind == 'token':
+            yield sse_event('token', {'text': text})
+        else:
+            chat_history = save_chat_history(user, company_id, query, text)
+            yield _done_event(query, text, chat_history)
+
+
+async def achat_event_stream(service, query, balance_sheets, user, company_id):
+    """Async iterator version of chat_event_stream, streamed by the ASGI handler without a thread per client."""
+    yield sse_event('start', {'query': query})
+
+    async for kind, text in service.astream_answer(query, balance_sheets):
+        if kind == 'token':
+            yield sse_event('token', {'text': text})
+        else:
+            chat_history = await sync_to_async(save_chat_history)(user, company_id, query, text)
+            yield _done_event(query, text, chat_history)
@@ -1,3 +1,277 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.balance_sheets.models import BalanceSheet, FinancialData, PDFChunk
+from apps.balance_sheets.signals import chunks_changed
+from apps.companies.models import Company
+from apps.users.models import User
+from .answer_cache import AnswerCache, answer_cache
+from .gemini_service import GeminiChatService
+from .models import ChatHistory
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.candidates = []
+        self.prompt_feedback = None
+
+
+class FakeAsyncStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeModel:
+    """Counts generations and answers with a numbered reply, or streams `pieces` when given."""
+
+    def __init__(self, pieces=None):
+        self.calls = 0
+        self.pieces = pieces
+        self.prompt = None
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        self.prompt = prompt
+        if stream:
+            return [FakeResponse(piece) for piece in self.pieces or [f"Answer {self.calls}"]]
+        return FakeResponse(f"Answer {self.calls}")
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        response = self.generate_content(prompt, generation_config, stream)
+        return FakeAsyncStream(response) if stream else response
+
+
+def parse_events(body):
+    """(event, data) pairs of an SSE body."""
+    events = []
+    for frame in body.split('\n\n'):
+        if frame:
+            event, data = frame.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+@override_settings(CHAT_ANSWER_CACHE_ALIAS='chat_answers', CHAT_ANSWER_CACHE_SEMANTIC_THRESHOLD=0)
+class AnswerCacheTests(TestCase):
+    """Repeated questions are answered from the cache until their balance sheets change."""
+
+    def setUp(self):
+        caches['chat_answers'].clear()
+        self.company = Company.objects.create(name="Reliance Industries Limited")
+        self.balance_sheet = BalanceSheet.objects.create(company=self.company, pdf_file='balance_sheets/test.pdf', year=2023)
+        self.financial_data = FinancialData.objects.create(balance_sheet=self.balance_sheet, total_assets=1000)
+        self.service = GeminiChatService()
+        self.service.model = FakeModel()
+
+    def _ask(self, query, balance_sheets=None, use_chunks=True):
+        return self.service.analyze_company_performance(query, balance_sheets or [self.balance_sheet], use_chunks)
+
+    def test_normalized_repeat_is_served_from_cache(self):
+        self.assertEqual(self._ask("What are total assets?"), "Answer 1")
+        self.assertEqual(self._ask("  what are   TOTAL assets? "), "Answer 1")
+        self.assertEqual(self.service.model.calls, 1)
+
+    def test_selection_is_part_of_the_key(self):
+        other = BalanceSheet.objects.create(company=self.company, pdf_file='balance_sheets/test.pdf', year=2024)
+        self._ask("What are total assets?")
+        self.assertEqual(self._ask("What are total assets?", [self.balance_sheet, other]), "Answer 2")
+
+    def test_context_kind_is_part_of_the_key(self):
+        self._ask("What are total assets?")
+        self.assertEqual(self._ask("What are total assets?", use_chunks=False), "Answer 2")
+        self.assertEqual(self._ask("What are total assets?", use_chunks=False), "Answer 2")
+        self.assertEqual(self._ask("What are total assets?"), "Answer 1")
+
+    def test_financial_data_change_invalidates(self):
+        self._ask("What are total assets?")
+        self.financial_data.total_assets = 2000
+        self.financial_data.save()
+        self.assertEqual(self._ask("What are total assets?"), "Answer 2")
+
+    def test_chunk_changes_invalidate(self):
+        self._ask("What are total assets?")
+        PDFChunk.objects.create(balance_sheet=self.balance_sheet, content="Total assets 1000", start_page=1, end_page=1)
+        self.assertEqual(self._ask("What are total assets?"), "Answer 2")
+
+        chunks_changed.send(sender=PDFChunk, balance_sheet_id=self.balance_sheet.id)
+        self.assertEqual(self._ask("What are total assets?"), "Answer 3")
+
+    def test_semantic_lookup_above_threshold(self):
+        vectors = {
+            'what are total assets?': np.array([1.0, 0.0, 0.0], dtype=np.float32),
+            'total assets please': np.array([0.99, 0.1, 0.0], dtype=np.float32),
+            'what is the revenue?': np.array([0.0, 1.0, 0.0], dtype=np.float32),
+        }
+        cache = AnswerCache(semantic_threshold=0.95)
+        with mock.patch('apps.chat.gemini_service.answer_cache', cache), \
+                mock.patch.object(AnswerCache, '_query_vector', lambda self, query: vectors[query.lower()]):
+            self._ask("What are total assets?")
+            self.assertEqual(self._ask("Total assets please"), "Answer 1")
+            self.assertEqual(self._ask("What is the revenue?"), "Answer 2")
+
+    @override_settings(CHAT_ANSWER_CACHE_ALIAS=None)
+    def test_disabled_without_alias(self):
+        self._ask("What are total assets?")
+        self.assertEqual(self._ask("What are total assets?"), "Answer 2")
+        self.assertIsNone(answer_cache.get("What are total assets?", [self.balance_sheet]))
+
+
+class ChatQueryStreamTests(TestCase):
+    """query_stream sends start, token and done events and saves the answer once it is complete."""
+
+    PIECES = ["As a financial analyst, I note that ", "total assets were ₹1,000 crore."]
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Reliance Industries Limited")
+        self.balance_sheet = BalanceSheet.objects.create(company=self.company, pdf_file='balance_sheets/test.pdf', year=2023)
+        FinancialData.objects.create(balance_sheet=self.balance_sheet, total_assets=1000)
+        self.user = User.objects.create_user(username='analyst', password='secret', role='ANALYST')
+        self.service = GeminiChatService()
+        self.service.model = FakeModel(self.PIECES)
+        patcher = mock.patch('apps.chat.views.GeminiChatService', lambda: self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('chat-query-stream')
+        self.body = {'company_id': self.company.id, 'query': "What are total assets?"}
+
+    def test_events_and_history(self):
+        response = self.client.post(self.url, self.body, format='json', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        frames = iter(response.streaming_content)
+        self.assertEqual(parse_events(next(frames).decode()), [('start', {'query': "What are total assets?"})])
+        for piece in self.PIECES:
+            self.assertEqual(parse_events(next(frames).decode()), [('token', {'text': piece})])
+        self.assertFalse(ChatHistory.objects.exists())
+
+        [(event, data)] = parse_events(next(frames).decode())
+        self.assertEqual(event, 'done')
+        self.assertEqual(data['response'], "I note that total assets were ₹1,000 crore.")
+        self.assertEqual(data['response'], self.service._clean_response(''.join(self.PIECES)))
+        self.assertIsNotNone(data['created_at'])
+        self.assertEqual(list(frames), [])
+
+        history = ChatHistory.objects.get()
+        self.assertEqual((history.user, history.company, history.response), (self.user, self.company, data['response']))
+
+    def test_forbidden_is_one_error_event(self):
+        ceo = User.objects.create_user(username='ceo', password='secret', role='CEO')
+        self.client.force_authenticate(ceo)
+
+        response = self.client.post(self.url, self.body, format='json', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(response['Content-Type'].startswith('text/event-stream'))
+        self.assertEqual(parse_events(response.content.decode()), [('error', {'error': 'You do not have access to this company'})])
+        self.assertEqual(self.service.model.calls, 0)
+
+    @override_settings(CHAT_ANSWER_CACHE_ALIAS='chat_answers', CHAT_ANSWER_CACHE_SEMANTIC_THRESHOLD=0)
+    def test_cached_answer_short_circuits(self):
+        caches['chat_answers'].clear()
+        self.service.model = FakeModel()
+        cached = self.service.analyze_company_performance("What are total assets?", [self.balance_sheet])
+
+        response = self.client.post(self.url, self.body, format='json', HTTP_ACCEPT='text/event-stream')
+        events = parse_events(b''.join(response.streaming_content).decode())
+        self.assertEqual([event for event, data in events], ['start', 'token', 'done'])
+        self.assertEqual(events[1][1], {'text': cached})
+        self.assertEqual(events[2][1]['response'], cached)
+        self.assertEqual(self.service.model.calls, 1)
+
+    async def test_asgi_streams_from_async_iterator(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}', 'Accept': 'text/event-stream'}
+        with mock.patch('apps.chat.views.chat_event_stream') as sync_stream:
+            response = await AsyncClient().post(self.url, self.body, content_type='application/json', headers=headers)
+            frames = [frame async for frame in response.streaming_content]
+        sync_stream.assert_not_called()
+        self.assertTrue(response.is_async)
+
+        events = parse_events(b''.join(frames).decode())
+        self.assertEqual([event for event, data in events], ['start', 'token', 'token', 'done'])
+        self.assertEqual(events[-1][1]['response'], "I note that total assets were ₹1,000 crore.")
+        self.assertEqual(await ChatHistory.objects.filter(response=events[-1][1]['response']).acount(), 1)
+
+
+class AsyncChatQueryTests(TestCase):
+    """The async chat endpoint authenticates, validates and answers like /api/chat/query/."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Reliance Industries Limited")
+        self.balance_sheet = BalanceSheet.objects.create(company=self.company, pdf_file='balance_sheets/test.pdf', year=2023)
+        FinancialData.objects.create(balance_sheet=self.balance_sheet, total_assets=1000)
+        PDFChunk.objects.create(balance_sheet=self.balance_sheet, content="Total assets stood at 1000 crore", start_page=1, end_page=1)
+        self.user = User.objects.create_user(username='analyst', password='secret', role='ANALYST')
+        self.url = reverse('chat-async-query')
+        self.body = {'company_id': self.company.id, 'query': "What are total assets?"}
+        self.client = AsyncClient()
+
+    def _headers(self, user=None, token=None):
+        return {'Authorization': f'Bearer {token or AccessToken.for_user(user or self.user)}'}
+
+    async def _post(self, body, **headers):
+        return await self.client.post(self.url, body, content_type='application/json', headers=self._headers(**headers))
+
+    async def test_only_post(self):
+        response = await self.client.get(self.url, headers=self._headers())
+        self.assertEqual(response.status_code, 405)
+
+    async def test_requires_valid_jwt(self):
+        response = await self.client.post(self.url, self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        response = await self._post(self.body, token='not-a-token')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_rejects_bad_body(self):
+        response = await self.client.post(self.url, '{not json', content_type='application/json', headers=self._headers())
+        self.assertEqual(response.status_code, 400)
+        response = await self._post({'query': "What are total assets?"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('company_id', response.json())
+
+    async def test_ceo_without_access_is_forbidden(self):
+        ceo = await User.objects.acreate(username='ceo', role='CEO')
+        response = await self._post(self.body, user=ceo)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(await ChatHistory.objects.aexists())
+
+    async def test_same_payload_as_sync_endpoint(self):
+        async_service, sync_service = GeminiChatService(), GeminiChatService()
+        async_service.model, sync_service.model = FakeModel(), FakeModel()
+
+        with mock.patch('apps.chat.async_views.GeminiChatService', lambda: async_service):
+            response = await self._post(self.body)
+        self.assertEqual(response.status_code, 200)
+
+        api_client = APIClient()
+        await sync_to_async(api_client.force_authenticate)(self.user)
+        with mock.patch('apps.chat.views.GeminiChatService', lambda: sync_service):
+            expected = await sync_to_async(api_client.post)(reverse('chat-query'), self.body, format='json')
+
+        payload = response.json()
+        self.assertEqual(set(payload), set(expected.json()))
+        self.assertEqual(payload['query'], expected.json()['query'])
+        self.assertEqual(payload['response'], expected.json()['response'])
+        self.assertEqual(payload['response'], "Answer 1")
+        # Retrieval found the chunk on both paths
+        self.assertIn("Total assets stood at 1000 crore", async_service.model.prompt)
+        self.assertEqual(async_service.model.prompt, sync_service.model.prompt)
+
+        history = await ChatHistory.objects.select_related('user').order_by('id').afirst()
+        self.assertEqual((history.user, history.company_id, history.response), (self.user, self.company.id, "Answer 1"))
+        self.assertEqual(payload['created_at'], json.loads(json.dumps(history.created_at, cls=DjangoJSONEncoder)))
@@ -1,11 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import ChatViewSet
 
 router = DefaultRouter()
 router.register(r'chat', ChatViewSet, basename='chat')
 
 urlpatterns = [
+    path('chat/async/query/', async_views.chat_query, name='chat-async-query'),
     path('', include(router.urls)),
 ]
 
@@ -2,10 +2,15 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from .models import ChatHistory
 from .serializers import ChatHistorySerializer, ChatQuerySerializer
 from .gemini_service import GeminiChatService
+from .streaming import EventStreamRenderer, achat_event_stream, chat_event_stream
 from apps.balance_sheets.models import BalanceSheet
+from apps.companies.access import get_access_scope
 
 
 class ChatViewSet(viewsets.ModelViewSet):
@@ -33,12 +38,10 @@ class ChatViewSet(viewsets.ModelViewSet):
         query = serializer.validated_data['query']
         selected_ids = serializer.validated_data.get('selected_balance_sheet_ids', [])
         
-        # Get company balance sheets (filter by selection if provided)
-        balance_sheets = BalanceSheet.objects.filter(company_id=company_id)
-        if selected_ids:
-            balance_sheets = balance_sheets.filter(id__in=selected_ids)
-        balance_sheets = balance_sheets.order_by('-year')
-        balance_sheets_list = list(balance_sheets)
+        if not get_access_scope(request).can_access(company_id):
+            return Response({'error': 'You do not have access to this company'}, status=status.HTTP_403_FORBIDDEN)
+        
+        balance_sheets_list = self._get_balance_sheets(company_id, selected_ids)
         
         # Generate AI response
         gemini_service = GeminiChatService()
@@ -63,6 +66,44 @@ class ChatViewSet(viewsets.ModelViewSet):
             'created_at': chat_history.created_at if chat_history else None
         }, status=status.HTTP_200_OK)
     
+    @action(detail=False, methods=['post'], renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def query_stream(self, request):
+        """
+        Send a query and stream the AI response as Server-Sent Events.
+        
+        Under ASGI the events come from an async iterator, so an open stream
+        waits on Gemini without occupying a worker thread.
+        """
+        serializer = ChatQuerySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        company_id = serializer.validated_data['company_id']
+        query = serializer.validated_data['query']
+        selected_ids = serializer.validated_data.get('selected_balance_sheet_ids', [])
+        
+        if not get_access_scope(request).can_access(company_id):
+            return Response({'error': 'You do not have access to this company'}, status=status.HTTP_403_FORBIDDEN)
+        
+        balance_sheets_list = self._get_balance_sheets(company_id, selected_ids)
+        gemini_service = GeminiChatService()
+        
+        if isinstance(request._request, ASGIRequest):
+            events = achat_event_stream(gemini_service, query, balance_sheets_list, request.user, company_id)
+        else:
+            events = chat_event_stream(gemini_service, query, balance_sheets_list, request.user, company_id)
+        
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+        return response
+    
+    def _get_balance_sheets(self, company_id, selected_ids):
+        """Company balance sheets, filtered by selection if provided, newest first."""
+        balance_sheets = BalanceSheet.objects.filter(company_id=company_id)
+        if selected_ids:
+            balance_sheets = balance_sheets.filter(id__in=selected_ids)
+        return list(balance_sheets.order_by('-year'))
+    
     @action(detail=False, methods=['get'])
     def history(self, request):
         """Get chat history for a company"""
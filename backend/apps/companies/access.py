@@ -0,0 +1,86 @@
+"""Which companies a user may see, resolved once per request."""
+from typing import FrozenSet, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import CompanyAccess
+
+# Roles that see every company; CEOs are limited to their CompanyAccess rows.
+UNRESTRICTED_ROLES = ('GROUP_OWNER', 'ANALYST')
+
+
+class AccessScope:
+    """The set of company ids a user may access, or None for every company."""
+
+    def __init__(self, user_id, company_ids: Optional[FrozenSet[int]] = None):
+        self.user_id = user_id
+        self.company_ids = company_ids
+
+    @property
+    def unrestricted(self) -> bool:
+        return self.company_ids is None
+
+    def can_access(self, company_id) -> bool:
+        if self.unrestricted:
+            return True
+        try:
+            return int(company_id) in self.company_ids
+        except (TypeError, ValueError):
+            return False
+
+    def filter(self, queryset, field: str = 'company_id'):
+        """Restrict a queryset to accessible companies through `field`."""
+        if self.unrestricted:
+            return queryset
+        return queryset.filter(**{f'{field}__in': sorted(self.company_ids)})
+
+
+def _cache():
+    alias = getattr(settings, 'ACCESS_SCOPE_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _cache_key(user_id) -> str:
+    return f'access-scope:{user_id}'
+
+
+def load_access_scope(user) -> AccessScope:
+    """Build a user's scope: one CompanyAccess query for CEOs, none otherwise."""
+    if user.role in UNRESTRICTED_ROLES:
+        return AccessScope(user.pk)
+    if user.role != 'CEO':
+        return AccessScope(user.pk, frozenset())
+
+    cache = _cache()
+    if cache is not None:
+        company_ids = cache.get(_cache_key(user.pk))
+        if company_ids is not None:
+            return AccessScope(user.pk, frozenset(company_ids))
+
+    company_ids = list(CompanyAccess.objects.filter(user=user).values_list('company_id', flat=True))
+    if cache is not None:
+        cache.set(_cache_key(user.pk), company_ids, getattr(settings, 'ACCESS_SCOPE_CACHE_TIMEOUT', 300))
+    return AccessScope(user.pk, frozenset(company_ids))
+
+
+def get_access_scope(request) -> AccessScope:
+    """
+    The requesting user's AccessScope, memoized on the request.
+
+    Stored on the underlying HttpRequest so DRF views, permissions and
+    plain Django views handling the same request share one lookup.
+    """
+    http_request = getattr(request, '_request', request)
+    scope = getattr(http_request, '_access_scope', None)
+    if scope is None or scope.user_id != request.user.pk:
+        scope = load_access_scope(request.user)
+        http_request._access_scope = scope
+    return scope
+
+
+def invalidate_access_scope(user_id) -> None:
+    """Forget a user's cached scope after their CompanyAccess rows change."""
+    cache = _cache()
+    if cache is not None:
+        cache.delete(_cache_key(user_id))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:28
+
+from django.db import migrations, models
+
+
+def build_tree_paths(apps, schema_editor):
+    """Compute the materialized path of every existing company, top-level companies first."""
+    Company = apps.get_model('companies', 'Company')
+    parents = dict(Company.objects.values_list('id', 'parent_company_id'))
+
+    children = {}
+    for company_id, parent_id in parents.items():
+        children.setdefault(parent_id, []).append(company_id)
+
+    paths = {}
+    pending = [(company_id, '/') for company_id in children.get(None, [])]
+    while pending:
+        company_id, parent_path = pending.pop()
+        paths[company_id] = f"{parent_path}{company_id}/"
+        pending.extend((child_id, paths[company_id]) for child_id in children.get(company_id, []))
+
+    companies = [Company(id=company_id, tree_path=path) for company_id, path in paths.items()]
+    Company.objects.bulk_update(companies, ['tree_path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='tree_path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_tree_paths, migrations.RunPython.noop),
+    ]
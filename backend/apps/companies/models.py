@@ -1,4 +1,7 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Length, Substr
 from django.conf import settings
 
 
@@ -13,6 +16,9 @@ class Company(models.Model):
         blank=True,
         related_name='subsidiaries'
     )
+    # Materialized ancestor path such as "/1/4/9/" (root id first, own id last),
+    # maintained by save() so subtree and ancestor lookups are single queries
+    tree_path = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -22,6 +28,69 @@ class Company(models.Model):
     
     def __str__(self):
         return self.name
+    
+    def is_ancestor_of(self, company):
+        """True if `company` is this company or sits anywhere below it."""
+        return bool(self.tree_path) and company.tree_path.startswith(self.tree_path)
+    
+    def clean(self):
+        if self.pk and self.parent_company and self.is_ancestor_of(self.parent_company):
+            raise ValidationError({'parent_company': "A company cannot be moved under itself or one of its subsidiaries."})
+    
+    def save(self, *args, **kwargs):
+        """Save and keep `tree_path` of this company and, on reparenting, of its whole subtree."""
+        old_path = ''
+        if self.pk is not None:
+            old_path = Company.objects.filter(pk=self.pk).values_list('tree_path', flat=True).first() or ''
+        
+        parent_path = ''
+        if self.parent_company_id is not None:
+            parent_path = Company.objects.filter(pk=self.parent_company_id).values_list('tree_path', flat=True).first() or ''
+            if old_path and parent_path.startswith(old_path):
+                raise ValidationError("A company cannot be moved under itself or one of its subsidiaries.")
+        
+        with transaction.atomic():
+            if self.pk is None:
+                super().save(*args, **kwargs)
+                self.tree_path = f"{parent_path or '/'}{self.pk}/"
+                Company.objects.filter(pk=self.pk).update(tree_path=self.tree_path)
+                return
+            
+            # Always write the path from the database state, never a stale in-memory copy
+            self.tree_path = f"{parent_path or '/'}{self.pk}/"
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'tree_path'}
+            super().save(*args, **kwargs)
+            
+            if old_path and old_path != self.tree_path:
+                # Reparented: rewrite the prefix of every descendant in one UPDATE
+                Company.objects.filter(tree_path__startswith=old_path).update(
+                    tree_path=Concat(Value(self.tree_path), Substr('tree_path', len(old_path) + 1))
+                )
+    
+    @property
+    def depth(self):
+        """0 for a top-level company, 1 for its subsidiaries, and so on."""
+        return self.tree_path.count('/') - 2
+    
+    def get_ancestor_ids(self):
+        return [int(part) for part in self.tree_path.strip('/').split('/')[:-1] if part]
+    
+    def get_descendants(self, include_self=False):
+        """All subsidiaries at any depth, as one indexed prefix query on `tree_path`."""
+        if not self.tree_path:
+            return Company.objects.filter(pk=self.pk) if include_self else Company.objects.none()
+        descendants = Company.objects.filter(tree_path__startswith=self.tree_path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+    
+    def get_ancestors(self, include_self=False):
+        """Parent, grandparent, ... up to the top-level company, root first."""
+        ids = self.get_ancestor_ids()
+        if include_self:
+            ids.append(self.pk)
+        return Company.objects.filter(pk__in=ids).order_by(Length('tree_path'))
 
 
 class CompanyAccess(models.Model):
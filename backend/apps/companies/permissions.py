@@ -1,5 +1,5 @@
 from rest_framework import permissions
-from apps.companies.models import CompanyAccess
+from apps.companies.access import get_access_scope
 
 
 class HasCompanyAccess(permissions.BasePermission):
@@ -12,21 +12,8 @@ class HasCompanyAccess(permissions.BasePermission):
         return True
     
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        
-        # Group owners can see all companies
-        if user.role == 'GROUP_OWNER':
-            return True
-        
-        # Analysts can see all companies
-        if user.role == 'ANALYST':
-            return True
-        
-        # CEOs can only see their assigned companies
-        if user.role == 'CEO':
-            return CompanyAccess.objects.filter(user=user, company=obj).exists()
-        
-        return False
+        # Group owners and analysts see all companies; CEOs only their assigned ones
+        return get_access_scope(request).can_access(obj.pk)
 
 
 class CanUploadBalanceSheet(permissions.BasePermission):
@@ -7,6 +7,11 @@ class CompanySerializer(serializers.ModelSerializer):
         model = Company
         fields = ['id', 'name', 'parent_company', 'created_at']
         read_only_fields = ['created_at']
+    
+    def validate_parent_company(self, value):
+        if value and self.instance and self.instance.is_ancestor_of(value):
+            raise serializers.ValidationError("A company cannot be moved under itself or one of its subsidiaries.")
+        return value
 
 
 class CompanyAccessSerializer(serializers.ModelSerializer):
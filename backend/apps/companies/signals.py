@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .access import invalidate_access_scope
+from .models import CompanyAccess
+
+
+@receiver(post_save, sender=CompanyAccess)
+@receiver(post_delete, sender=CompanyAccess)
+def invalidate_user_access_scope(sender, instance, **kwargs):
+    """Drop the cached access scope of a user whose company grants changed."""
+    invalidate_access_scope(instance.user_id)
@@ -1,3 +1,139 @@
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.balance_sheets.group_analytics import group_analytics
+from apps.balance_sheets.models import BalanceSheet, FinancialData
+from apps.users.models import User
+from .models import Company, CompanyAccess
+
+
+class CompanyTreePathTests(TestCase):
+    """tree_path follows moves of a company and its whole subtree."""
+
+    def setUp(self):
+        self.group = Company.objects.create(name="Reliance Industries Limited")
+        self.retail = Company.objects.create(name="Reliance Retail", parent_company=self.group)
+        self.jio = Company.objects.create(name="Jio Platforms", parent_company=self.group)
+        self.stores = Company.objects.create(name="Reliance Stores", parent_company=self.retail)
+        self.outlet = Company.objects.create(name="Reliance Outlet", parent_company=self.stores)
+
+    def _names(self, queryset):
+        return [company.name for company in queryset]
+
+    def test_reparenting_rewrites_descendant_paths(self):
+        self.stores.parent_company = self.jio
+        self.stores.save()
+
+        self.outlet.refresh_from_db()
+        self.assertEqual(self.outlet.tree_path, f"/{self.group.pk}/{self.jio.pk}/{self.stores.pk}/{self.outlet.pk}/")
+        self.assertEqual(self.outlet.depth, 3)
+
+        self.assertEqual(sorted(self._names(self.jio.get_descendants())), ["Reliance Outlet", "Reliance Stores"])
+        self.assertFalse(self.retail.get_descendants().exists())
+        self.assertEqual(
+            self._names(self.outlet.get_ancestors()),
+            ["Reliance Industries Limited", "Jio Platforms", "Reliance Stores"],
+        )
+
+    def test_moving_to_top_level(self):
+        self.retail.parent_company = None
+        self.retail.save()
+
+        self.outlet.refresh_from_db()
+        self.assertEqual(self._names(self.outlet.get_ancestors()), ["Reliance Retail", "Reliance Stores"])
+        self.assertEqual(self._names(self.group.get_descendants()), ["Jio Platforms"])
+
+    def test_cannot_move_under_own_descendant(self):
+        self.retail.parent_company = self.outlet
+
+        with self.assertRaises(ValidationError):
+            self.retail.clean()
+        with self.assertRaises(ValidationError):
+            self.retail.save()
+
+        self.outlet.refresh_from_db()
+        self.assertEqual(self.outlet.tree_path, f"/{self.group.pk}/{self.retail.pk}/{self.stores.pk}/{self.outlet.pk}/")
+
+
+class GroupAnalyticsTests(TestCase):
+    """group_analytics consolidates a group's latest figures per period and respects CEO access."""
+
+    FIGURES = {
+        # company: {year: (revenue, sales, total_assets, current_assets, current_liabilities, total_liabilities, total_equity)}
+        'parent': {2022: (100, None, 1000, 400, 200, 500, 500), 2023: (150, None, 1200, 500, 250, 600, 600)},
+        'child': {2023: (10, None, 200, 50, 50, 100, 100)},
+        'grandchild': {2022: (0, 50, 500, 100, 100, 300, 200), 2023: (None, 90, 800, 300, 150, 400, 400)},
+    }
+
+    def setUp(self):
+        self.parent = Company.objects.create(name="Reliance Industries Limited")
+        self.child = Company.objects.create(name="Reliance Retail", parent_company=self.parent)
+        self.grandchild = Company.objects.create(name="Reliance Stores", parent_company=self.child)
+        for name, figures in self.FIGURES.items():
+            self._add_figures(getattr(self, name), figures)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='owner', password='secret', role='GROUP_OWNER'))
+        self.url = reverse('company-group-analytics', args=[self.parent.pk])
+
+    def _add_figures(self, company, figures):
+        for year, (revenue, sales, assets, current_assets, current_liab, liabilities, equity) in figures.items():
+            balance_sheet = BalanceSheet.objects.create(company=company, pdf_file='balance_sheets/test.pdf', year=year)
+            FinancialData.objects.create(
+                balance_sheet=balance_sheet, revenue=revenue, sales=sales, total_assets=assets,
+                current_assets=current_assets, current_liabilities=current_liab,
+                total_liabilities=liabilities, total_equity=equity,
+            )
+
+    def test_consolidated_series(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        consolidated = response.data['consolidated']
+        first, latest = consolidated['analytics']
+
+        self.assertEqual([(p['year'], p['companies_count']) for p in (first, latest)], [(2022, 2), (2023, 3)])
+        # Revenue 0 (2022) and missing (2023) both fall back to sales before summing
+        self.assertEqual((first['revenue'], latest['revenue']), (150.0, 250.0))
+        self.assertEqual((first['total_assets'], latest['total_assets']), (1500.0, 2200.0))
+        self.assertAlmostEqual(first['current_ratio'], 500 / 300)
+        self.assertAlmostEqual(first['debt_to_equity'], 800 / 700)
+        self.assertAlmostEqual(latest['current_ratio'], 850 / 450)
+        self.assertAlmostEqual(latest['debt_to_equity'], 1.0)
+        self.assertAlmostEqual(latest['growth']['assets'], 700 / 1500 * 100)
+        self.assertAlmostEqual(latest['growth']['revenue'], 100 / 150 * 100)
+        self.assertAlmostEqual(consolidated['kpis']['revenue_cagr'], 100 / 150 * 100)
+        self.assertEqual(consolidated['periods_count'], 2)
+
+        companies = {company['id']: company for company in response.data['companies']}
+        self.assertEqual(set(companies), {self.parent.pk, self.child.pk, self.grandchild.pk})
+        self.assertEqual([p['revenue'] for p in companies[self.grandchild.pk]['analytics']], [50.0, 90.0])
+        self.assertEqual(companies[self.child.pk]['periods_count'], 1)
+
+    def test_query_count_does_not_grow_with_the_group(self):
+        with self.assertNumQueries(2):
+            group_analytics([self.parent, self.child, self.grandchild])
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+        for index in range(3):
+            company = Company.objects.create(name=f"Reliance Outlet {index}", parent_company=self.grandchild)
+            self._add_figures(company, self.FIGURES['child'])
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['companies']), 6)
+        self.assertEqual(len(large), len(small))
+
+    def test_ceo_sees_only_granted_companies(self):
+        ceo = User.objects.create_user(username='ceo', password='secret', role='CEO')
+        CompanyAccess.objects.create(user=ceo, company=self.parent)
+        CompanyAccess.objects.create(user=ceo, company=self.grandchild)
+        self.client.force_authenticate(ceo)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([company['id'] for company in response.data['companies']], [self.parent.pk, self.grandchild.pk])
+        latest = response.data['consolidated']['analytics'][-1]
+        self.assertEqual((latest['companies_count'], latest['revenue']), (2, 240.0))
@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from .models import Company, CompanyAccess
 from .serializers import CompanySerializer, CompanyAccessSerializer, CompanyWithSubsidiariesSerializer
 from .permissions import HasCompanyAccess, CanCreateCompany
+from .access import get_access_scope
 
 
 class CompanyViewSet(viewsets.ModelViewSet):
@@ -12,22 +13,8 @@ class CompanyViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        user = self.request.user
-        
-        # Group owners see all companies
-        if user.role == 'GROUP_OWNER':
-            return Company.objects.all()
-        
-        # Analysts see all companies
-        if user.role == 'ANALYST':
-            return Company.objects.all()
-        
-        # CEOs see only their assigned companies
-        if user.role == 'CEO':
-            accessible_companies = CompanyAccess.objects.filter(user=user).values_list('company_id', flat=True)
-            return Company.objects.filter(id__in=accessible_companies)
-        
-        return Company.objects.none()
+        # Group owners and analysts see all companies; CEOs only their assigned ones
+        return get_access_scope(self.request).filter(Company.objects.all(), 'id')
     
     def get_serializer_class(self):
         if self.action == 'retrieve' and 'subsidiaries' in self.request.query_params:
@@ -45,10 +32,29 @@ class CompanyViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def subsidiaries(self, request, pk=None):
         company = self.get_object()
-        subsidiaries = company.subsidiaries.all()
+        # ?all=true returns subsidiaries at every depth, not just direct ones
+        if request.query_params.get('all') in ('1', 'true', 'True'):
+            subsidiaries = company.get_descendants()
+        else:
+            subsidiaries = company.subsidiaries.all()
         serializer = CompanySerializer(subsidiaries, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def group_analytics(self, request, pk=None):
+        """Per-company and consolidated analytics for a company and all its subsidiaries."""
+        from apps.balance_sheets.group_analytics import group_analytics
+        
+        company = self.get_object()
+        companies = company.get_descendants(include_self=True)
+        
+        # CEOs only see the parts of the group they have access to
+        companies = get_access_scope(request).filter(companies, 'id')
+        
+        data = group_analytics(list(companies))
+        data['company'] = CompanySerializer(company).data
+        return Response(data)
+    
     @action(detail=False, methods=['post'])
     def assign_access(self, request):
         """Assign company access to a user (for CEOs)"""
@@ -173,3 +173,90 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # Gemini API configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+
+# RAG vector index: max balance-sheet shards kept in memory per worker process
+VECTOR_INDEX_MAX_SHARDS = int(os.getenv('VECTOR_INDEX_MAX_SHARDS', '256'))
+
+# Embedding batching: texts per embed request and approximate token budget per request
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '100'))
+EMBEDDING_BATCH_TOKEN_BUDGET = int(os.getenv('EMBEDDING_BATCH_TOKEN_BUDGET', '20000'))
+
+# Persistent content-hash embedding cache: LRU-evicted beyond this many entries
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '50000'))
+
+# Query embedding cache: per-process TTL/LRU, optionally shared through a Django cache alias
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '1024'))
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv('QUERY_EMBEDDING_CACHE_TTL', '3600'))
+QUERY_EMBEDDING_CACHE_ALIAS = os.getenv('QUERY_EMBEDDING_CACHE_ALIAS') or None
+
+# Background ingestion queue (python manage.py run_ingestion_worker)
+INGESTION_POLL_INTERVAL = float(os.getenv('INGESTION_POLL_INTERVAL', '5'))
+INGESTION_JOB_TIMEOUT = int(os.getenv('INGESTION_JOB_TIMEOUT', '3600'))
+INGESTION_MAX_ATTEMPTS = int(os.getenv('INGESTION_MAX_ATTEMPTS', '3'))
+# Running jobs refresh started_at this often (seconds), so only jobs of dead workers reach INGESTION_JOB_TIMEOUT
+INGESTION_HEARTBEAT_INTERVAL = float(os.getenv('INGESTION_HEARTBEAT_INTERVAL', '60'))
+
+# PDF page extraction: process-pool size (0 = one per CPU) and minimum pages before parallelizing
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', '0'))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '50'))
+
+# Rows per INSERT when bulk-creating PDF chunks during ingestion
+CHUNK_BULK_CREATE_BATCH_SIZE = int(os.getenv('CHUNK_BULK_CREATE_BATCH_SIZE', '500'))
+
+# Caches. 'analytics' holds analytics_summary results. Writes by the ingestion worker
+# only invalidate it in the web processes when they share it: set ANALYTICS_CACHE_LOCATION
+# to a directory for a file-based cache (or ANALYTICS_CACHE_BACKEND/LOCATION to Redis or
+# Memcached in production). Unset, it is in-memory and per process.
+_analytics_cache_location = os.getenv('ANALYTICS_CACHE_LOCATION') or None
+_chat_answer_cache_location = os.getenv('CHAT_ANSWER_CACHE_LOCATION') or None
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analytics': {
+        'BACKEND': os.getenv('ANALYTICS_CACHE_BACKEND') or (
+            'django.core.cache.backends.filebased.FileBasedCache' if _analytics_cache_location
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': _analytics_cache_location or 'analytics',
+    },
+    # Generated chat answers (see CHAT_ANSWER_CACHE_ALIAS); file-based when CHAT_ANSWER_CACHE_LOCATION is set
+    'chat_answers': {
+        'BACKEND': (
+            'django.core.cache.backends.filebased.FileBasedCache' if _chat_answer_cache_location
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': _chat_answer_cache_location or 'chat_answers',
+    },
+}
+ANALYTICS_CACHE_ALIAS = os.getenv('ANALYTICS_CACHE_ALIAS', 'analytics')
+ANALYTICS_CACHE_TIMEOUT = int(os.getenv('ANALYTICS_CACHE_TIMEOUT', '3600'))
+
+# Per-user cache of accessible company ids (CEOs). Unset = resolve once per request only;
+# set to a cache alias shared by all processes (e.g. 'analytics') to reuse across requests
+ACCESS_SCOPE_CACHE_ALIAS = os.getenv('ACCESS_SCOPE_CACHE_ALIAS') or None
+ACCESS_SCOPE_CACHE_TIMEOUT = int(os.getenv('ACCESS_SCOPE_CACHE_TIMEOUT', '300'))
+
+# Chat answer cache keyed by (company, balance sheets, chunk set version, normalized query).
+# Off unless an alias is set (e.g. 'chat_answers'); a semantic threshold > 0 (cosine, e.g. 0.95)
+# also reuses answers to near-identical questions about the same balance sheets
+CHAT_ANSWER_CACHE_ALIAS = os.getenv('CHAT_ANSWER_CACHE_ALIAS') or None
+CHAT_ANSWER_CACHE_TIMEOUT = int(os.getenv('CHAT_ANSWER_CACHE_TIMEOUT', '86400'))
+CHAT_ANSWER_CACHE_SEMANTIC_THRESHOLD = float(os.getenv('CHAT_ANSWER_CACHE_SEMANTIC_THRESHOLD', '0'))
+CHAT_ANSWER_CACHE_SEMANTIC_ENTRIES = int(os.getenv('CHAT_ANSWER_CACHE_SEMANTIC_ENTRIES', '100'))
+
+# Embedding request scheduling: concurrent requests per embedding call, shared per-process
+# rate limit (requests/minute, burst), and exponential backoff on quota errors (seconds)
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv('EMBEDDING_MAX_CONCURRENCY', '4'))
+EMBEDDING_REQUESTS_PER_MINUTE = float(os.getenv('EMBEDDING_REQUESTS_PER_MINUTE', '300'))
+EMBEDDING_RATE_LIMIT_BURST = float(os.getenv('EMBEDDING_RATE_LIMIT_BURST', '5'))
+EMBEDDING_MAX_RETRIES = int(os.getenv('EMBEDDING_MAX_RETRIES', '5'))
+EMBEDDING_BACKOFF_BASE = float(os.getenv('EMBEDDING_BACKOFF_BASE', '1.0'))
+EMBEDDING_BACKOFF_MAX = float(os.getenv('EMBEDDING_BACKOFF_MAX', '60'))
+
+# Active embedding model for retrieval and new chunks. To switch models, stage vectors with
+# `manage.py reembed_chunks --model NEW`, then change this setting (see that command)
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-004')
+
+# Tests always run against in-memory caches (see config/test_runner.py)
+TEST_RUNNER = 'config.test_runner.LocMemCacheTestRunner'
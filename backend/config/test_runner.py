@@ -0,0 +1,27 @@
+"""
+Test runner that points every cache alias at process-local memory.
+
+Cache-backed features (analytics summaries, chat answers, access scopes)
+are invalidated from model signals, so nearly every test writes to a
+cache; with this runner no test ever reaches an on-disk or shared cache,
+whatever CACHES the environment configures.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default-tests'},
+    'analytics': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'analytics-tests'},
+    'chat_answers': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'chat-answers-tests'},
+}
+
+
+class LocMemCacheTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_settings = override_settings(CACHES=TEST_CACHES)
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        super().teardown_test_environment(**kwargs)